@@ -37,7 +37,8 @@ def create_app(config_class=Config):
     login_manager.init_app(app)
     
     # Gắn SocketIO (QUAN TRỌNG: Đây là cổng giao tiếp với connectMQTT.py)
-    socketio.init_app(app, async_mode='eventlet') 
+    socketio.init_app(app, async_mode='eventlet',
+                      message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')) 
     
     # XÓA: mqtt.init_app(app)
 
@@ -45,6 +46,19 @@ def create_app(config_class=Config):
     with app.app_context():
         from app import models
 
+    from app.services import model_cache
+    model_cache.configure(maxsize=app.config['MODEL_CACHE_SIZE'], ttl=app.config['MODEL_CACHE_TTL'])
+    from app.services.reading_buffer import reading_buffer
+    reading_buffer.configure(capacity=app.config['READING_BUFFER_CAPACITY'],
+                             max_bytes=app.config['READING_BUFFER_MAX_BYTES'],
+                             settle_seconds=app.config['READING_BUFFER_SETTLE_SECONDS'])
+    from app.services.replay_window import replay_window
+    replay_window.configure(size=app.config['REPLAY_WINDOW_EVENTS'], max_users=app.config['REPLAY_WINDOW_USERS'])
+    from app.services.partitions import reading_partitions
+    reading_partitions.configure(directory=app.config['READINGS_PARTITION_DIR'],
+                                 months=app.config['READINGS_PARTITION_MONTHS'],
+                                 max_attached=app.config['READINGS_PARTITION_MAX_ATTACHED'])
+
     # Đăng ký Blueprints
     from app.controllers.auth_controller import auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -71,10 +85,83 @@ def register_commands(app):
     @app.cli.command("create-db")
     def create_db():
         """Tạo các bảng trong cơ sở dữ liệu."""
+        from app.services.query_plans import ensure_indexes, ensure_columns
+        from app.models import notification_model  # đăng ký bảng cho create_all
         with app.app_context():
             db.create_all()
+            for column in ensure_columns():
+                print(f"Đã thêm cột {column}")
+            ensure_indexes()
         print("Đã tạo cơ sở dữ liệu!")
 
+    @app.cli.command("check-query-plans")
+    def check_query_plans_cmd():
+        """Kiểm tra EXPLAIN QUERY PLAN của các truy vấn nóng, lỗi nếu có truy vấn quét toàn bảng."""
+        from app.services.query_plans import check_query_plans
+        with app.app_context():
+            results = check_query_plans()
+        failed = []
+        for name, (steps, bad) in results.items():
+            print(f"{'❌' if bad else '✅'} {name}")
+            for step in steps:
+                print(f"     {step}")
+            if bad:
+                failed.append(name)
+        if failed:
+            raise click.ClickException(f"{len(failed)} truy vấn quét toàn bảng: {', '.join(failed)}")
+        print("Tất cả truy vấn đều dùng index.")
+
+    @app.cli.command("rollup-data")
+    @click.option("--interval", default=0, type=int, help="Chạy lặp lại sau mỗi N giây (0 = chạy một lần).")
+    @click.option("--no-retention", is_flag=True, help="Không xóa dữ liệu cũ.")
+    def rollup_data(interval, no_retention):
+        """Tổng hợp DataReadings vào các bảng 1m/1h/1d và áp dụng chính sách lưu giữ."""
+        import time
+        from app.services.rollup import update_rollups, apply_retention
+        with app.app_context():
+            while True:
+                written = update_rollups()
+                print(f"Đã tổng hợp: {written}")
+                if not no_retention:
+                    print(f"Đã xóa dữ liệu cũ: {apply_retention()}")
+                if interval <= 0:
+                    break
+                time.sleep(interval)
+
+    @app.cli.command("migrate-frames")
+    @click.option("--batch", default=5000, type=int, help="Số dòng DataReadings mỗi lô (mỗi lô một transaction).")
+    @click.option("--delete", "remove", is_flag=True, help="Xóa các dòng DataReadings đã chuyển.")
+    def migrate_frames(batch, remove):
+        """Chuyển DataReadings sang DataFrames (một dòng mỗi frame); chạy lại được."""
+        from app.services.frame_store import migrate_readings_to_frames
+        from app.services.partitions import raw_sources
+        with app.app_context():
+            db.create_all()
+            frames = rows = 0
+            # Phân vùng theo thời gian: chuyển trong từng file phân vùng
+            for source in raw_sources():
+                f, r = migrate_readings_to_frames(batch_size=batch, remove=remove, source=source)
+                frames, rows = frames + f, rows + r
+        print(f"Đã chuyển {rows} dòng DataReadings thành {frames} frame"
+              f"{' (đã xóa dòng cũ)' if remove else ''}.")
+
+    @app.cli.command("partition-readings")
+    @click.option("--batch", default=5000, type=int, help="Số dòng mỗi lô (mỗi lô một transaction).")
+    @click.option("--delete", "remove", is_flag=True,
+                  help="Xóa các dòng đã chuyển khỏi DB chính (không có thì chỉ sao chép; chạy lại được, không chép trùng).")
+    def partition_readings(batch, remove):
+        """Chuyển DataReadings/DataFrames từ DB chính vào các file phân vùng theo tháng."""
+        from app.services.partitions import reading_partitions, move_to_partitions, PartitionMoveError
+        if not reading_partitions.enabled:
+            raise click.ClickException("Chưa cấu hình READINGS_PARTITION_DIR.")
+        with app.app_context():
+            try:
+                moved = move_to_partitions(batch_size=batch, remove=remove)
+            except PartitionMoveError as e:
+                raise click.ClickException(str(e))
+        print(f"Đã chuyển vào {reading_partitions.directory}: {moved}"
+              f"{' (đã xóa khỏi DB chính)' if remove else ''}.")
+
     @app.cli.command("create-admin")
     @click.argument("username")
     @click.argument("email")
@@ -1,14 +1,21 @@
 # File: app/controllers/user_controller.py
 import os
 import json # <--- THÊM MỚI
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, Response, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models.user_model import Users
-from app.models.sensor_model import DataReadings, SensorConfig
+from app.models.sensor_model import SensorConfig
 from app.models.alert_model import AlertEvent
+from app.models.config_model import ConfigVersion
 from app.forms import RegistrationForm, EditUserForm
 from app.decorators import admin_required
+from app.services.rollup import get_series, SeriesRangeError
+from app.services.readings_query import fetch_readings_page, InvalidCursor
+from app.services import series_codec
+from app.services.model_cache import get_user, get_sensor_configs, invalidate_user, cache_stats
+from app.services.reading_buffer import reading_buffer
 
 user_bp = Blueprint('user', __name__)
 
@@ -26,6 +33,20 @@ def dashboard():
     users_pagination = Users.query.paginate(page=page, per_page=5)
     return render_template('users/index.html', title='Quản lý người dùng', users=users_pagination)
 
+def _alert_rules(cfg):
+    """Quy tắc cảnh báo nâng cao của một cảm biến từ JSON form (bỏ trống/sai -> None)."""
+    def number(key, cast=float):
+        try:
+            value = cast(cfg.get(key))
+        except (TypeError, ValueError):
+            return None
+        return value if value > 0 else None
+    return {
+        'hysteresis': number('hysteresis'),
+        'debounce': number('debounce', int),
+        'max_rate': number('max_rate'),
+    }
+
 @user_bp.route('/admin/create_user', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -76,6 +97,7 @@ def create_user():
                     unit = cfg.get('unit', '')
                     min_val = cfg.get('min') # Có thể là None
                     max_val = cfg.get('max') # Có thể là None
+                    rules = _alert_rules(cfg)
                 else:
                     # Logic mặc định (nếu không có JSON hoặc JSON thiếu)
                     # Fallback về logic tách chuỗi sensor_names_str cũ
@@ -83,6 +105,7 @@ def create_user():
                     unit = ""
                     min_val = None
                     max_val = None
+                    rules = {}
                     
                     # Logic cũ: lấy tên từ chuỗi phân cách phẩy (backup)
                     sensor_names_old = []
@@ -98,11 +121,15 @@ def create_user():
                     name=name,
                     unit=unit,
                     min_val=min_val,
-                    max_val=max_val
+                    max_val=max_val,
+                    **rules
                 )
                 db.session.add(new_config)
 
+            # Báo cho collector nạp lại topic/ngưỡng
+            ConfigVersion.bump()
             db.session.commit()
+            invalidate_user(user.id_user)
             flash(f'Đã tạo tài khoản {form.username.data} và cấu hình {count} cảm biến!', 'success')
             return redirect(url_for('user.dashboard'))
         except Exception as e:
@@ -163,12 +190,14 @@ def edit_user(user_id):
                     unit = cfg.get('unit', '')
                     min_val = cfg.get('min')
                     max_val = cfg.get('max')
+                    rules = _alert_rules(cfg)
                 else:
                     # Nếu người dùng giảm số lượng rồi tăng lại, hoặc không nhập chi tiết
                     name = f"Thông số {i}"
                     unit = ""
                     min_val = None
                     max_val = None
+                    rules = {}
 
                 new_config = SensorConfig(
                     user_id=user.id_user,
@@ -176,11 +205,15 @@ def edit_user(user_id):
                     name=name,
                     unit=unit,
                     min_val=min_val,
-                    max_val=max_val
+                    max_val=max_val,
+                    **rules
                 )
                 db.session.add(new_config)
 
+            # Báo cho collector nạp lại topic/ngưỡng
+            ConfigVersion.bump()
             db.session.commit()
+            invalidate_user(user.id_user)
             flash(f'Đã cập nhật thông tin!', 'success')
             return redirect(url_for('user.dashboard'))
         except Exception as e:
@@ -206,7 +239,10 @@ def edit_user(user_id):
                 'name': c.name,
                 'unit': c.unit,
                 'min': c.min_val,
-                'max': c.max_val
+                'max': c.max_val,
+                'hysteresis': c.hysteresis,
+                'debounce': c.debounce,
+                'max_rate': c.max_rate
             })
         
         return render_template('users/edit.html', title='Chỉnh sửa người dùng', form=form, user=user, current_configs=config_list)
@@ -224,7 +260,9 @@ def delete_user(user_id):
     try:
         username = user.username
         db.session.delete(user)
+        ConfigVersion.bump()
         db.session.commit()
+        invalidate_user(user_id)
         flash(f'Đã xóa người dùng {username}!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -239,29 +277,20 @@ def follow_data(user_id):
         flash("Bạn không có quyền truy cập trang này.", "danger")
         return redirect(url_for('user.follow_data', user_id=int(current_user.get_id())))
 
-    user = Users.query.get_or_404(user_id)
+    user = get_user(user_id)
+    if user is None:
+        abort(404)
     target_topic = user.sub_topic 
 
-    # 2. Lấy CẤU HÌNH CẢM BIẾN (SensorConfig)
-    sensor_configs = SensorConfig.query.filter_by(user_id=user.id_user)\
-                                       .order_by(SensorConfig.sensor_index)\
-                                       .all()
-    
-    configs_data = []
-    for cfg in sensor_configs:
-        configs_data.append({
-            'index': cfg.sensor_index,
-            'name': cfg.name,
-            'unit': cfg.unit,
-            'min': cfg.min_val,
-            'max': cfg.max_val
-        })
+    # 2. Lấy CẤU HÌNH CẢM BIẾN (SensorConfig) - qua cache, chỉ đổi khi admin sửa user
+    configs_data = get_sensor_configs(user.id_user)
 
-    # 3. Lấy DỮ LIỆU LỊCH SỬ (DataReadings)
-    data_list = DataReadings.query.filter_by(user_id=user.id_user)\
-                                .order_by(DataReadings.timestamp.desc())\
-                                .limit(50)\
-                                .all()
+    # 3. Lấy DỮ LIỆU LỊCH SỬ (DataReadings/DataFrames) - từ bộ đệm RAM nếu đủ, không thì DB
+    page = reading_buffer.latest(user.id_user, 50, sensor_count=user.sensor_count)
+    if page is not None:
+        data_list = page[0]
+    else:
+        data_list = fetch_readings_page(user.id_user, 50, sensor_count=user.sensor_count)[0]
     
     # 4. Lấy LỊCH SỬ CẢNH BÁO (AlertEvent) - MỚI THÊM
     alert_list = AlertEvent.query.filter_by(user_id=user.id_user)\
@@ -282,20 +311,58 @@ def get_monitor_data_api(user_id):
     if not current_user.is_admin() and current_user.get_id() != str(user_id):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
     
-    user = Users.query.get_or_404(user_id)
+    user = get_user(user_id)
+    if user is None:
+        abort(404)
+
+    # Giới hạn kích thước trang phía server
+    max_page = current_app.config['MONITOR_API_MAX_PAGE_SIZE']
     limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(limit, max_page))
+
+    try:
+        start = _parse_time_arg('from')
+        end = _parse_time_arg('to')
+    except (ValueError, OverflowError, OSError):
+        # Epoch quá lớn: fromtimestamp báo OverflowError/OSError
+        return jsonify({'status': 'error', 'message': 'Tham số from/to không hợp lệ'}), 400
+    sensor_index = request.args.get('sensor_index', type=int)
+    cursor = request.args.get('cursor')
+
+    # Lấy dữ liệu đo (tuple cột, phân trang keyset). Trang đầu lấy từ bộ đệm RAM
+    # nếu bộ đệm phủ đủ khoảng thời gian; dòng chưa ghi DB có id = None.
+    page = None
+    if not cursor:
+        page = reading_buffer.latest(user.id_user, limit, start=start, end=end,
+                                     sensor_index=sensor_index, sensor_count=user.sensor_count)
+    if page is not None:
+        readings, next_cursor = page
+    else:
+        try:
+            readings, next_cursor = fetch_readings_page(user.id_user, limit, start=start, end=end,
+                                                        sensor_index=sensor_index, cursor=cursor,
+                                                        sensor_count=user.sensor_count)
+        except InvalidCursor:
+            return jsonify({'status': 'error', 'message': 'Cursor không hợp lệ'}), 400
+
+    # Định dạng cột / nhị phân cho biểu đồ (chỉ dữ liệu đo, không kèm cảnh báo)
+    fmt = series_codec.negotiate_format(request.args.get('format'), request.accept_mimetypes)
+    if fmt != series_codec.FORMAT_JSON:
+        return _columnar_response(fmt, readings, next_cursor, limit)
     
-    # Lấy dữ liệu đo
-    readings = DataReadings.query.filter_by(user_id=user.id_user)\
-                                .order_by(DataReadings.timestamp.desc())\
-                                .limit(limit)\
-                                .all()
-    
-    # Lấy cảnh báo
-    alerts = AlertEvent.query.filter_by(user_id=user.id_user)\
-                             .order_by(AlertEvent.timestamp.desc())\
-                             .limit(limit)\
-                             .all()
+    # Lấy cảnh báo (chỉ ở trang đầu, cùng bộ lọc)
+    alerts = []
+    if not cursor:
+        alert_query = AlertEvent.query.filter_by(user_id=user.id_user)
+        if sensor_index is not None:
+            alert_query = alert_query.filter(AlertEvent.sensor_index == sensor_index)
+        if start is not None:
+            alert_query = alert_query.filter(AlertEvent.timestamp >= start)
+        if end is not None:
+            alert_query = alert_query.filter(AlertEvent.timestamp < end)
+        alerts = alert_query.order_by(AlertEvent.timestamp.desc())\
+                            .limit(limit)\
+                            .all()
     
     result_readings = []
     for item in readings:
@@ -313,13 +380,112 @@ def get_monitor_data_api(user_id):
             'sensor_index': item.sensor_index,
             'value': item.value,
             'timestamp': item.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'status': 'sent' if item.sent else 'pending'
+            'status': 'sent' if item.sent else 'pending',
+            'peak_value': item.peak_value,
+            'sample_count': item.sample_count,
+            'closed_at': item.closed_at.strftime('%Y-%m-%d %H:%M:%S') if item.closed_at else None
         })
         
     return jsonify({
         'status': 'success',
+        'limit': limit,
+        'next_cursor': next_cursor,
         'readings_count': len(result_readings),
         'readings': result_readings,
         'alerts_count': len(result_alerts),
         'alerts': result_alerts
-    })
\ No newline at end of file
+    })
+
+def _columnar_response(fmt, readings, next_cursor, limit):
+    series = series_codec.to_columns(readings)
+    if fmt == series_codec.FORMAT_F32:
+        payload = series_codec.encode_f32(series)
+        mimetype = series_codec.MIME_F32
+    else:
+        payload = series_codec.encode_columnar(series, {'limit': limit, 'next_cursor': next_cursor})
+        mimetype = series_codec.MIME_COLUMNAR
+
+    payload, compressed = series_codec.maybe_gzip(
+        payload, request.headers.get('Accept-Encoding', ''),
+        current_app.config['MONITOR_API_GZIP_MIN_BYTES'])
+
+    response = Response(payload, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def _parse_time_arg(name, default=None):
+    """
+    Đọc tham số thời gian từ query string: ISO 8601 hoặc epoch mili-giây.
+    Thời điểm có múi giờ (...Z, +07:00) được đổi về giờ địa phương naive như DB.
+    """
+    raw = request.args.get(name)
+    if not raw:
+        return default
+    if raw.isdigit():
+        return datetime.fromtimestamp(int(raw) / 1000.0)
+    value = datetime.fromisoformat(raw.replace('Z', '+00:00') if raw.endswith('Z') else raw)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+@user_bp.route('/api/v1/monitor/<int:user_id>/series', methods=['GET'])
+@login_required
+def get_monitor_series_api(user_id):
+    """
+    Chuỗi dữ liệu cho biểu đồ trong khoảng [from, to). Độ phân giải
+    (raw/1m/1h/1d) được tự chọn theo độ dài khoảng thời gian, hoặc chỉ định
+    bằng tham số `resolution`.
+    """
+    if not current_user.is_admin() and current_user.get_id() != str(user_id):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+    user = get_user(user_id)
+    if user is None:
+        abort(404)
+    try:
+        end = _parse_time_arg('to', datetime.now())
+        start = _parse_time_arg('from', end - timedelta(hours=1))
+    except (ValueError, OverflowError, OSError):
+        # Epoch quá lớn: fromtimestamp báo OverflowError/OSError
+        return jsonify({'status': 'error', 'message': 'Tham số from/to không hợp lệ'}), 400
+    if start >= end:
+        return jsonify({'status': 'error', 'message': 'from phải nhỏ hơn to'}), 400
+
+    sensor_index = request.args.get('sensor_index', type=int)
+    try:
+        resolution, points = get_series(user.id_user, start, end,
+                                        sensor_index=sensor_index,
+                                        resolution=request.args.get('resolution'))
+    except SeriesRangeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify({
+        'status': 'success',
+        'resolution': resolution,
+        'from': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'to': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'points_count': len(points),
+        'points': [{
+            'timestamp': p.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'sensor_index': p.sensor_index,
+            'min': p.min,
+            'max': p.max,
+            'avg': p.avg,
+            'count': p.count,
+            'last': p.last
+        } for p in points]
+    })
+
+@user_bp.route('/api/v1/live/stats', methods=['GET'])
+@login_required
+@admin_required
+def get_live_stats_api():
+    """Bộ đếm sự kiện realtime: nhận từ collector so với đã phát xuống trình duyệt."""
+    from app.events import live_coalescer
+    from app.services.replay_window import replay_window
+    return jsonify({'status': 'success', 'coalescer': live_coalescer.stats(), 'model_cache': cache_stats(),
+                    'reading_buffer': reading_buffer.stats(), 'replay_window': replay_window.stats()})
@@ -1,18 +1,136 @@
 # File: app/events.py
-from flask_socketio import emit
+import hmac
+from flask import current_app, request
+from flask_login import current_user
+from flask_socketio import join_room
 from app import socketio
+from app.services.live_coalescer import LiveCoalescer
+from app.services.reading_buffer import reading_buffer
+from app.services.replay_window import replay_window
+
+# Namespace riêng cho các tiến trình collector (connectMQTT.py, connectIoT.py)
+COLLECTOR_NAMESPACE = '/collector'
+
+
+def user_room(user_id):
+    """Room chứa các trình duyệt đang xem dữ liệu của user_id."""
+    return f"user_{user_id}"
+
+
+def can_view(user_id):
+    """Chỉ Admin hoặc chính chủ được xem dữ liệu (giống follow_data)."""
+    if not current_user.is_authenticated:
+        return False
+    return current_user.is_admin() or current_user.get_id() == str(user_id)
+
+
+def _emit_update(user_id, data):
+    # Gửi sự kiện 'update_monitor' xuống cho file index.html xử lý
+    socketio.emit('update_monitor', data, to=user_room(user_id), namespace='/')
+
+
+# Gộp cập nhật realtime: chỉ frame mới nhất mỗi thiết bị, delta, giới hạn tần suất
+live_coalescer = LiveCoalescer(_emit_update, sleep_fn=socketio.sleep)
+
+
+def _ensure_coalescer_started():
+    if live_coalescer.mark_started():
+        cfg = current_app.config
+        live_coalescer.rate_hz = cfg['LIVE_UPDATE_HZ']
+        live_coalescer.rate_per_user = cfg['LIVE_UPDATE_HZ_PER_USER']
+        live_coalescer.keyframe_seconds = cfg['LIVE_KEYFRAME_SECONDS']
+        socketio.start_background_task(live_coalescer.run_forever)
+
 
 @socketio.on('connect')
 def handle_connect():
     print('>>> Client Web đã kết nối vào SocketIO!')
 
-@socketio.on('sensor_data_update')
+@socketio.on('join_monitor')
+def handle_join_monitor(data):
+    """
+    Trình duyệt (monitor/index.html) gửi sau khi kết nối để vào room
+    của user đang xem. Chỉ nhận được dữ liệu của room đã được cấp quyền.
+    """
+    try:
+        user_id = int((data or {}).get('user_id'))
+    except (TypeError, ValueError):
+        return {'status': 'error', 'message': 'user_id không hợp lệ'}
+
+    if not can_view(user_id):
+        return {'status': 'error', 'message': 'Unauthorized'}
+
+    join_room(user_room(user_id))
+    replay_window.track(user_id)
+    return {'status': 'ok'}
+
+@socketio.on('resume_monitor')
+def handle_resume_monitor(data):
+    """
+    Trình duyệt kết nối lại: vào lại room và nhận trong một lô các sự kiện
+    bị lỡ sau (stream, seq) cuối cùng đã thấy, cùng keyframes (giá trị mới
+    nhất của mỗi thiết bị) để sửa các delta / frame gộp đã lỡ. reset=True
+    nghĩa là cửa sổ phát lại không còn đủ, trình duyệt phải tải lại trang.
+    """
+    data = data or {}
+    try:
+        user_id = int(data.get('user_id'))
+        seq = int(data.get('seq'))
+    except (TypeError, ValueError):
+        return {'status': 'error', 'message': 'user_id/seq không hợp lệ'}
+
+    if not can_view(user_id):
+        return {'status': 'error', 'message': 'Unauthorized'}
+
+    join_room(user_room(user_id))
+    replay_window.track(user_id)
+    events = replay_window.since(user_id, data.get('stream'), seq)
+    if events is None:
+        return {'status': 'ok', 'reset': True, 'events': []}
+    return {'status': 'ok', 'reset': False, 'events': events, 'keyframes': live_coalescer.keyframes(user_id)}
+
+# ============================
+# NAMESPACE CHO COLLECTOR
+# ============================
+@socketio.on('connect', namespace=COLLECTOR_NAMESPACE)
+def handle_collector_connect(auth=None):
+    token = (auth or {}).get('token') or ''
+    if not hmac.compare_digest(token, current_app.config['COLLECTOR_TOKEN']):
+        print(f"⛔ Collector bị từ chối (sai token): {request.remote_addr}")
+        return False
+    print(f'>>> Collector đã kết nối: {request.remote_addr}')
+
+@socketio.on('sensor_data_update', namespace=COLLECTOR_NAMESPACE)
 def handle_sensor_update(data):
     """
-    Hàm này chạy khi connectIoT.py gửi tín hiệu 'sensor_data_update' lên.
-    Nhiệm vụ: Đẩy (broadcast) dữ liệu đó xuống cho tất cả trình duyệt.
+    Hàm này chạy khi collector gửi tín hiệu 'sensor_data_update' lên.
+    Nhiệm vụ: Đưa vào bộ gộp; bộ gộp sẽ đẩy xuống room của user tương ứng.
     """
-    print(f"⚡ [Server Nhận] Dữ liệu từ {data.get('ip')}: {data.get('tem')}°C - {data.get('hum')}%")
-    
-    # Gửi sự kiện 'update_monitor' xuống cho file index.html xử lý
-    emit('update_monitor', data, broadcast=True)
\ No newline at end of file
+    if data.get('user_id') is None:
+        return
+
+    # Bộ đệm dữ liệu gần nhất nhận mọi frame (trước khi gộp)
+    reading_buffer.feed(data)
+    # Cửa sổ phát lại giữ frame đầy đủ cho trình duyệt kết nối lại
+    replay_window.record(data['user_id'], 'update_monitor', data)
+    _ensure_coalescer_started()
+    live_coalescer.submit(data)
+
+@socketio.on('new_alert', namespace=COLLECTOR_NAMESPACE)
+def handle_new_alert(data):
+    user_id = data.get('user_id')
+    if user_id is None:
+        return
+    reading_buffer.sequence(data)
+    replay_window.record(user_id, 'new_alert', data)
+    socketio.emit('new_alert', data, to=user_room(user_id), namespace='/')
+
+@socketio.on('alert_closed', namespace=COLLECTOR_NAMESPACE)
+def handle_alert_closed(data):
+    """Đợt cảnh báo kết thúc (giá trị đã trở lại bình thường)."""
+    user_id = data.get('user_id')
+    if user_id is None:
+        return
+    reading_buffer.sequence(data)
+    replay_window.record(user_id, 'alert_closed', data)
+    socketio.emit('alert_closed', data, to=user_room(user_id), namespace='/')
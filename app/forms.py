@@ -48,6 +48,14 @@ class BaseUserForm(FlaskForm):
         if not '@' in email.data: 
              raise ValidationError('Email thiếu @.')
 
+    def validate_sub_topic(self, sub_topic):
+        # Cho phép wildcard MQTT ('+' một cấp, '#' cuối cùng) nhưng phải đúng cú pháp
+        from collector.topic_trie import validate_filter
+        try:
+            validate_filter(sub_topic.data)
+        except ValueError as e:
+            raise ValidationError(f'Topic không hợp lệ: {e}')
+
     def _is_duplicate(self, field_name, value, original_value=None):
         """
         Hàm kiểm tra trùng lặp trong DB.
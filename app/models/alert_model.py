@@ -4,6 +4,15 @@ from datetime import datetime
 
 class AlertEvent(db.Model):
     __tablename__ = "alert_events"
+    __table_args__ = (
+        db.Index('ix_alert_events_user_ts', 'user_id', 'timestamp'),
+        db.Index('ix_alert_events_user_sensor_ts', 'user_id', 'sensor_index', 'timestamp'),
+        # Index một phần: chỉ chứa cảnh báo chưa gửi (reportByEmail).
+        # Câu truy vấn phải lọc bằng `sent == false()` để SQLite dùng được index này.
+        db.Index('ix_alert_events_unsent', 'sent', 'timestamp', sqlite_where=db.text('sent = 0')),
+        # Collector cập nhật dòng của đợt cảnh báo khi đóng đợt
+        db.Index('ix_alert_events_episode', 'episode_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -25,5 +34,15 @@ class AlertEvent(db.Model):
     # Thời điểm của dữ liệu cảm biến (nếu khác với created_at)
     timestamp = db.Column(db.DateTime, default=datetime.now)
 
+    # --- ĐỢT CẢNH BÁO ---
+    # Mỗi dòng là một đợt: ghi khi vượt ngưỡng (value = giá trị mở đợt),
+    # cập nhật một lần khi giá trị trở lại bình thường.
+    episode_id = db.Column(db.String(32), nullable=True)
+    peak_value = db.Column(db.Float, nullable=True)
+    last_value = db.Column(db.Float, nullable=True)
+    sample_count = db.Column(db.Integer, nullable=True)
+    # NULL = đợt cảnh báo đang diễn ra
+    closed_at = db.Column(db.DateTime, nullable=True)
+
     def __repr__(self):
         return f"<Alert u={self.user_id} s={self.sensor_index} v={self.value}>"
\ No newline at end of file
@@ -0,0 +1,34 @@
+# File: app/models/config_model.py
+from app import db
+from datetime import datetime
+
+class ConfigVersion(db.Model):
+    """
+    Bộ đếm phiên bản cấu hình (topic, ngưỡng cảm biến). Chỉ có một dòng (id=1).
+    Mỗi lần admin tạo/sửa/xóa user thì tăng version; collector so sánh version
+    để nạp lại bảng định tuyến topic mà không cần khởi động lại.
+    """
+    __tablename__ = 'config_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    @classmethod
+    def current(cls):
+        # Luôn đọc từ DB (không lấy bản cache trong identity map của session)
+        version = db.session.scalar(db.select(cls.version).where(cls.id == 1))
+        return version or 0
+
+    @classmethod
+    def bump(cls):
+        """Tăng version trong session hiện tại (commit cùng thay đổi của người gọi)."""
+        row = db.session.get(cls, 1)
+        if row is None:
+            row = cls(id=1, version=0)
+            db.session.add(row)
+        row.version = (row.version or 0) + 1
+        return row.version
+
+    def __repr__(self):
+        return f'<ConfigVersion {self.version}>'
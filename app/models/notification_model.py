@@ -0,0 +1,16 @@
+# File: app/models/notification_model.py
+from app import db
+
+class NotificationCooldown(db.Model):
+    """
+    Lần gửi email cảnh báo gần nhất của từng (user, cảm biến). Lưu trong DB
+    để thời gian chờ (cooldown) không bị mất khi dịch vụ email khởi động lại.
+    """
+    __tablename__ = 'notification_cooldowns'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    sensor_index = db.Column(db.Integer, primary_key=True)
+    last_sent_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<Cooldown u={self.user_id} s={self.sensor_index} {self.last_sent_at}>'
@@ -0,0 +1,80 @@
+# File: app/models/rollup_model.py
+from sqlalchemy.orm import declared_attr
+from app import db
+
+
+class RollupMixin:
+    """
+    Các cột chung của bảng tổng hợp (rollup) DataReadings theo khung thời gian.
+    Mỗi dòng là một bucket của một cảm biến: (user_id, sensor_index, bucket).
+    """
+    user_id = db.Column(db.Integer, primary_key=True)
+    sensor_index = db.Column(db.Integer, primary_key=True)
+
+    # Thời điểm bắt đầu của bucket (đã làm tròn xuống theo độ phân giải)
+    bucket = db.Column(db.DateTime, primary_key=True)
+
+    min_val = db.Column(db.Float, nullable=False)
+    max_val = db.Column(db.Float, nullable=False)
+    # Lưu tổng thay vì trung bình để gộp các bucket chính xác
+    sum_val = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    # Giá trị cuối cùng trong bucket và thời điểm của nó
+    last_val = db.Column(db.Float, nullable=False)
+    last_ts = db.Column(db.DateTime, nullable=False)
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        return (
+            # Biểu đồ: chuỗi của một user theo khoảng thời gian
+            db.Index(f'ix_{cls.__tablename__}_user_bucket', 'user_id', 'bucket'),
+            # Rollup cấp kế tiếp / xóa dữ liệu cũ theo khoảng thời gian
+            db.Index(f'ix_{cls.__tablename__}_bucket', 'bucket'),
+        )
+
+    @property
+    def avg_val(self):
+        return self.sum_val / self.count if self.count else None
+
+    def __repr__(self):
+        return f'<{type(self).__name__} u={self.user_id} s={self.sensor_index} {self.bucket}>'
+
+
+class ReadingRollup1m(RollupMixin, db.Model):
+    __tablename__ = 'data_rollup_1m'
+
+
+class ReadingRollup1h(RollupMixin, db.Model):
+    __tablename__ = 'data_rollup_1h'
+
+
+class ReadingRollup1d(RollupMixin, db.Model):
+    __tablename__ = 'data_rollup_1d'
+
+
+class RollupState(db.Model):
+    """Mốc (watermark) đã tổng hợp xong của từng độ phân giải."""
+    __tablename__ = 'rollup_state'
+
+    resolution = db.Column(db.String(8), primary_key=True)
+    # Mọi dữ liệu nguồn có timestamp < watermark đã được tổng hợp
+    watermark = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<RollupState {self.resolution} {self.watermark}>'
+
+
+class RollupCursor(db.Model):
+    """
+    Khóa chính lớn nhất của bảng dữ liệu thô (theo từng nơi lưu: DB chính /
+    file phân vùng) đã được xét ở lần tổng hợp trước: dòng có id lớn hơn mà
+    timestamp < watermark là dữ liệu đến trễ.
+    """
+    __tablename__ = 'rollup_cursor'
+
+    source = db.Column(db.String(64), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<RollupCursor {self.source} {self.last_id}>'
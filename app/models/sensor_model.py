@@ -4,6 +4,9 @@ from datetime import datetime
 
 class SensorConfig(db.Model):
     __tablename__ = 'sensor_configs'
+    __table_args__ = (
+        db.Index('ix_sensor_configs_user_sensor', 'user_id', 'sensor_index'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id_user'), nullable=False)
@@ -21,11 +24,26 @@ class SensorConfig(db.Model):
     min_val = db.Column(db.Float, nullable=True)
     max_val = db.Column(db.Float, nullable=True)
 
+    # Quy tắc cảnh báo nâng cao (bỏ trống = tắt)
+    # Vùng trễ: đang cảnh báo thì chỉ hết khi quay lại trong [Min + h, Max - h]
+    hysteresis = db.Column(db.Float, nullable=True)
+    # Số mẫu vượt ngưỡng liên tiếp trước khi cảnh báo
+    debounce = db.Column(db.Integer, nullable=True)
+    # Tốc độ thay đổi tối đa (đơn vị/giây)
+    max_rate = db.Column(db.Float, nullable=True)
+
     def __repr__(self):
         return f'<Config {self.name}>'
 
 class DataReadings(db.Model):
     __tablename__ = 'data_readings'
+    __table_args__ = (
+        # Trang theo dõi / API: dữ liệu mới nhất của một user (và của từng cảm biến)
+        db.Index('ix_data_readings_user_ts', 'user_id', 'timestamp'),
+        db.Index('ix_data_readings_user_sensor_ts', 'user_id', 'sensor_index', 'timestamp'),
+        # Rollup / xóa dữ liệu cũ theo khoảng thời gian
+        db.Index('ix_data_readings_ts', 'timestamp'),
+    )
     
     id_reading = db.Column(db.Integer, primary_key=True)
     
@@ -43,4 +61,30 @@ class DataReadings(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
     def __repr__(self):
-        return f'<Data User:{self.user_id} | Idx:{self.sensor_index} | Val:{self.value}>'
\ No newline at end of file
+        return f'<Data User:{self.user_id} | Idx:{self.sensor_index} | Val:{self.value}>'
+
+class DataFrames(db.Model):
+    """
+    Lưu dạng "hàng rộng": một dòng cho mỗi frame nhận được, mọi giá trị của
+    frame nằm trong một BLOB (xem app/services/frame_store.py), thay vì một
+    dòng DataReadings cho mỗi cảm biến. Dùng khi READINGS_STORAGE = 'frames'/'both'.
+    """
+    __tablename__ = 'data_frames'
+    __table_args__ = (
+        db.Index('ix_data_frames_user_ts', 'user_id', 'timestamp'),
+        db.Index('ix_data_frames_ts', 'timestamp'),
+    )
+
+    id_frame = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id_user'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    # Số cảm biến trong frame (cảm biến 1..sensor_count)
+    sensor_count = db.Column(db.Integer, nullable=False)
+    # Kiểu mã hóa của BLOB: 0 = float32, 1 = thanh ghi uint16 (giá trị = thanh ghi / 10)
+    encoding = db.Column(db.SmallInteger, nullable=False, default=0)
+    # Các giá trị little-endian nối liền nhau, cảm biến 1 trước
+    values = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<Frame User:{self.user_id} | {self.sensor_count} cảm biến | {self.timestamp}>'
@@ -4,7 +4,9 @@ from flask_login import UserMixin
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Users.query.get(int(user_id))
+    # Chạy ở mọi request đã đăng nhập: lấy qua cache thay vì SELECT mỗi lần
+    from app.services.model_cache import get_user
+    return get_user(int(user_id))
 
 class Users(db.Model, UserMixin):
     __tablename__ = 'users' 
@@ -0,0 +1,2 @@
+# File: app/services/__init__.py
+# Các dịch vụ phía Web dùng chung cho controllers, events và lệnh CLI.
@@ -0,0 +1,81 @@
+# File: app/services/bus_listener.py
+import socket
+from urllib.parse import urlparse
+
+from app import socketio
+from collector.event_bus import decode_event, bind_unix_socket, REDIS_CHANNEL
+
+
+def _dispatch(app, handlers, raw):
+    try:
+        event, data = decode_event(raw, app.config['COLLECTOR_TOKEN'])
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ [Bus] Bỏ sự kiện lỗi định dạng: {e}")
+        return
+    handler = handlers.get(event)
+    if handler is None:
+        return
+    with app.app_context():
+        try:
+            handler(data)
+        except Exception as e:
+            print(f"❌ [Bus] Lỗi xử lý '{event}': {e}")
+
+
+def _unix_listener(app, handlers, path):
+    # Với eventlet cần socket "green" để recv không chặn cả hub
+    if socketio.async_mode == 'eventlet':
+        from eventlet.green import socket as green_socket
+        sock_mod = green_socket
+    else:
+        sock_mod = socket
+
+    try:
+        sock = bind_unix_socket(path, sock_mod)
+    except (RuntimeError, OSError) as e:
+        print(f"❌ [Bus] Không nghe được tại unix://{path}: {e}")
+        return
+    # Tăng buffer nhận để chịu được các đợt dữ liệu dồn dập
+    try: sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    except OSError: pass
+    print(f"📥 [Bus] Đang nghe sự kiện collector tại unix://{path}")
+
+    while True:
+        raw = sock.recv(65536)
+        _dispatch(app, handlers, raw)
+
+
+def _redis_listener(app, handlers, url):
+    import redis  # phụ thuộc tùy chọn
+    pubsub = redis.Redis.from_url(url).pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(REDIS_CHANNEL)
+    print(f"📥 [Bus] Đang nghe sự kiện collector trên {url} ({REDIS_CHANNEL})")
+
+    while True:
+        msg = pubsub.get_message(timeout=0)
+        if msg is None:
+            socketio.sleep(0.01)
+            continue
+        _dispatch(app, handlers, msg['data'])
+
+
+def start_bus_listener(app):
+    """
+    Chạy trong tiến trình Web Server (run.py): nhận sự kiện từ bus và
+    chuyển cho cùng các hàm xử lý của namespace /collector.
+    URL http(s):// nghĩa là collector gửi thẳng qua SocketIO, không cần listener.
+    """
+    from app.events import handle_sensor_update, handle_new_alert, handle_alert_closed
+    handlers = {
+        'sensor_data_update': handle_sensor_update,
+        'new_alert': handle_new_alert,
+        'alert_closed': handle_alert_closed,
+    }
+
+    url = app.config['EVENT_BUS_URL']
+    scheme = urlparse(url).scheme
+    if scheme == 'unix':
+        return socketio.start_background_task(_unix_listener, app, handlers, url[len('unix://'):])
+    if scheme in ('redis', 'rediss'):
+        return socketio.start_background_task(_redis_listener, app, handlers, url)
+    return None
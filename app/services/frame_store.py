@@ -0,0 +1,210 @@
+# File: app/services/frame_store.py
+from collections import namedtuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, func, delete
+
+from app import db
+from app.models.sensor_model import DataReadings, DataFrames
+
+# Kiểu mã hóa BLOB của DataFrames.values
+ENCODING_F32 = 0  # float32, dùng cho giá trị bất kỳ (NaN = thiếu cảm biến)
+ENCODING_U16 = 1  # thanh ghi Modbus uint16 thô, giá trị = thanh ghi / REGISTER_SCALE
+REGISTER_SCALE = 10.0
+_DTYPES = {ENCODING_F32: np.dtype('<f4'), ENCODING_U16: np.dtype('<u2')}
+
+# Id của một giá trị trong frame (phân trang keyset như id_reading): id_frame * FRAME_ID_SPAN + sensor_index
+FRAME_ID_SPAN = 1024
+
+STORAGE_MODES = ('rows', 'frames', 'both')
+
+FrameRow = namedtuple('FrameRow', 'id_frame timestamp sensor_count encoding values')
+
+
+def storage_mode():
+    return current_app.config['READINGS_STORAGE']
+
+
+def reads_frames():
+    """Web/rollup đọc dữ liệu thô từ data_frames (chỉ khi collector không còn ghi data_readings)."""
+    return storage_mode() == 'frames'
+
+
+def frame_row(user_id, timestamp, registers=None, values=None):
+    """
+    Dict một dòng DataFrames để insert. Ưu tiên `registers` (uint16 thô, 2
+    byte/giá trị, không mất chính xác); `values` bất kỳ thì lưu float32.
+    """
+    if registers is not None:
+        blob = np.asarray(registers, dtype=_DTYPES[ENCODING_U16]).tobytes()
+        encoding, count = ENCODING_U16, len(registers)
+    else:
+        blob = np.asarray(values, dtype=_DTYPES[ENCODING_F32]).tobytes()
+        encoding, count = ENCODING_F32, len(values)
+    return {'user_id': user_id, 'timestamp': timestamp, 'sensor_count': count,
+            'encoding': encoding, 'values': blob}
+
+
+def frame_select():
+    m = DataFrames
+    return select(m.id_frame, m.timestamp, m.sensor_count, m.encoding, m.values)
+
+
+def unpack_frames(frames):
+    """
+    Giải mã nhiều frame một lượt (np.frombuffer trên các BLOB nối liền, theo
+    nhóm cùng kiểu mã hóa/số cảm biến). Trả về ma trận float64
+    [số frame, số cảm biến lớn nhất]; ô NaN = frame không có cảm biến đó.
+    """
+    groups = {}
+    for i, f in enumerate(frames):
+        groups.setdefault((f.encoding, f.sensor_count), []).append(i)
+    blocks = {}
+    for (encoding, count), rows in groups.items():
+        blob = b''.join(frames[i].values for i in rows)
+        block = np.frombuffer(blob, dtype=_DTYPES[encoding]).reshape(len(rows), count)
+        blocks[encoding, count] = block / REGISTER_SCALE if encoding == ENCODING_U16 else block.astype(np.float64)
+    if len(blocks) == 1:
+        return next(iter(blocks.values()))  # trường hợp thường gặp: mọi frame cùng dạng
+
+    width = max((f.sensor_count for f in frames), default=0)
+    out = np.full((len(frames), width), np.nan)
+    for key, rows in groups.items():
+        out[rows, :key[1]] = blocks[key]
+    return out
+
+
+def frames_to_series(frames, sensor_index=None):
+    """
+    Frame (thời gian tăng dần) -> {sensor_index: (epoch-ms int64[], giá trị float64[])},
+    cùng dạng với series_codec.to_columns để mã hóa columnar/f32.
+    """
+    if not frames:
+        return {}
+    matrix = unpack_frames(frames)
+    epoch_ms = np.array([f.timestamp.timestamp() * 1000 for f in frames]).astype(np.int64)
+    indexes = range(1, matrix.shape[1] + 1) if sensor_index is None else [sensor_index]
+    series = {}
+    for idx in indexes:
+        if idx > matrix.shape[1]:
+            continue
+        values = matrix[:, idx - 1]
+        keep = ~np.isnan(values)
+        if keep.any():
+            series[idx] = (epoch_ms[keep], values[keep])
+    return series
+
+
+def explode_frames(frames, sensor_index=None, before=None, limit=None):
+    """
+    Frame (mới -> cũ) -> list (id, sensor_index, value, timestamp) mới -> cũ,
+    trong cùng frame cảm biến lớn trước, khớp thứ tự (timestamp, id) giảm dần.
+    before: chỉ lấy giá trị có (timestamp, id) < before; limit: dừng khi đủ số giá trị.
+    """
+    if not frames:
+        return []
+    matrix = unpack_frames(frames).tolist()
+    out = []
+    for f, values in zip(frames, matrix):
+        base = f.id_frame * FRAME_ID_SPAN
+        indexes = range(f.sensor_count, 0, -1) if sensor_index is None else [sensor_index]
+        for idx in indexes:
+            if idx > f.sensor_count:
+                continue
+            value = values[idx - 1]
+            if value != value:  # bỏ NaN
+                continue
+            if before is not None and (f.timestamp, base + idx) >= before:
+                continue
+            out.append((base + idx, idx, value, f.timestamp))
+            if limit is not None and len(out) >= limit:
+                return out
+    return out
+
+
+def first_frame_time(source=None):
+    return (source or db.session).scalar(select(func.min(DataFrames.timestamp)))
+
+
+def iter_frame_values(start, end, chunk=5000, source=None):
+    """
+    (user_id, sensor_index, timestamp, value) của mọi frame trong [start, end), theo thời gian (rollup).
+    source: session/kết nối để đọc (mặc định db.session; phân vùng: partitions.raw_sources).
+    """
+    m = DataFrames
+    stmt = select(m.user_id, m.id_frame, m.timestamp, m.sensor_count, m.encoding, m.values)\
+        .where(m.timestamp >= start, m.timestamp < end)\
+        .order_by(m.timestamp)
+    for part in (source or db.session).execute(stmt).yield_per(chunk).partitions():
+        frames = [FrameRow(*r[1:]) for r in part]
+        for r, values in zip(part, unpack_frames(frames).tolist()):
+            for idx in range(1, r.sensor_count + 1):
+                value = values[idx - 1]
+                if value == value:
+                    yield r.user_id, idx, r.timestamp, value
+
+
+def _encode_group(user_id, timestamp, by_sensor):
+    """Một frame từ {sensor_index: value}; uint16 nếu mọi giá trị là thanh ghi / 10 và đủ cảm biến."""
+    count = max(by_sensor)
+    if len(by_sensor) == count:
+        registers = [round(by_sensor[i] * REGISTER_SCALE) for i in range(1, count + 1)]
+        if all(0 <= r <= 0xFFFF and r / REGISTER_SCALE == by_sensor[i + 1]
+               for i, r in enumerate(registers)):
+            return frame_row(user_id, timestamp, registers=registers)
+    return frame_row(user_id, timestamp, values=[by_sensor.get(i, np.nan) for i in range(1, count + 1)])
+
+
+def migrate_readings_to_frames(batch_size=5000, remove=False, source=None):
+    """
+    Chuyển DataReadings sang DataFrames: các dòng cùng (user_id, timestamp) thành
+    một frame. Chỉ chuyển (user_id, timestamp) chưa có frame, nên chạy lại được
+    và chạy được cả sau khi collector đã ở 'both' (frame mới nhất đã có nhưng
+    lịch sử cũ hơn thì chưa). remove=True xóa các dòng đã chuyển hoặc đã có
+    frame (cùng transaction với lô frame). source: session/kết nối (mặc định
+    db.session; mỗi phân vùng chuyển riêng). Trả về (số frame, số dòng) đã chuyển.
+    """
+    source = source or db.session
+    r, f = DataReadings, DataFrames
+    total_frames = total_rows = 0
+    user_ids = source.scalars(select(r.user_id).distinct()).all()
+    for user_id in user_ids:
+        last = None
+        while True:
+            stmt = select(r.timestamp, r.sensor_index, r.value).where(r.user_id == user_id)
+            if last is not None:
+                stmt = stmt.where(r.timestamp > last)
+            rows = source.execute(stmt.order_by(r.timestamp).limit(batch_size)).all()
+            if not rows:
+                break
+            # Lô đầy: frame cuối có thể còn cảm biến ở lô sau, để dành cho lô sau
+            if len(rows) == batch_size and rows[0].timestamp != rows[-1].timestamp:
+                cut = len(rows)
+                while rows[cut - 1].timestamp == rows[-1].timestamp:
+                    cut -= 1
+                rows = rows[:cut]
+
+            groups = {}
+            for ts, sensor_index, value in rows:
+                groups.setdefault(ts, {})[sensor_index] = value
+            # Frame đã có (collector chạy 'both', hoặc lần chạy trước): bỏ qua
+            existing = set(source.scalars(
+                select(f.timestamp).where(f.user_id == user_id,
+                                          f.timestamp >= rows[0].timestamp,
+                                          f.timestamp <= rows[-1].timestamp)))
+            new = {ts: by_sensor for ts, by_sensor in groups.items() if ts not in existing}
+            frames = [_encode_group(user_id, ts, by_sensor) for ts, by_sensor in new.items()]
+            if frames:
+                source.execute(f.__table__.insert(), frames)
+            if remove:
+                cond = [r.user_id == user_id, r.timestamp <= rows[-1].timestamp]
+                if last is not None:
+                    cond.append(r.timestamp > last)
+                source.execute(delete(r).where(*cond))
+            source.commit()
+
+            total_frames += len(frames)
+            total_rows += sum(len(by_sensor) for by_sensor in new.values())
+            last = rows[-1].timestamp
+    return total_frames, total_rows
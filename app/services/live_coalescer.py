@@ -0,0 +1,157 @@
+# File: app/services/live_coalescer.py
+import threading
+import time
+
+
+class LiveCoalescer:
+    """
+    Gộp các cập nhật realtime trước khi phát xuống trình duyệt.
+
+    Chỉ giữ frame mới nhất cho mỗi (user_id, device); mỗi room (user) được
+    flush tối đa `rate_hz` lần/giây và chỉ gửi các cảm biến có giá trị thay
+    đổi so với lần gửi trước (delta). Cứ `keyframe_seconds` giây thì gửi lại
+    frame đầy đủ để trình duyệt mới vào room có đủ giá trị; trình duyệt kết
+    nối lại nhận ngay keyframes() trong phản hồi resume_monitor.
+    """
+
+    def __init__(self, emit_fn, rate_hz=1.0, rate_per_user=None, keyframe_seconds=30.0,
+                 sleep_fn=time.sleep):
+        self.emit_fn = emit_fn
+        self.rate_hz = rate_hz
+        self.rate_per_user = rate_per_user or {}
+        self.keyframe_seconds = keyframe_seconds
+        self.sleep_fn = sleep_fn
+
+        self._lock = threading.Lock()
+        self._pending = {}      # (user_id, device) -> frame mới nhất chưa gửi
+        self._last_values = {}  # (user_id, device) -> {sensor_index: value} đã gửi
+        self._last_full = {}    # (user_id, device) -> thời điểm gửi frame đầy đủ
+        self._last_frame = {}   # (user_id, device) -> frame cuối cùng đã gửi (bản gốc)
+        self._devices = {}      # user_id -> các key (user_id, device) đã nhận
+        self._next_flush = {}   # user_id -> thời điểm được flush tiếp theo
+        self._started = False
+
+        # Bộ đếm
+        self.received = 0
+        self.emitted = 0
+        self.coalesced = 0   # frame bị thay thế bởi frame mới hơn trước khi gửi
+        self.suppressed = 0  # frame không có giá trị nào thay đổi
+
+    def interval_for(self, user_id):
+        hz = self.rate_per_user.get(user_id, self.rate_hz)
+        return 1.0 / hz if hz > 0 else 0.0
+
+    def submit(self, data):
+        user_id = data.get('user_id')
+        if user_id is None:
+            return
+        key = (user_id, data.get('device_id') or data.get('topic'))
+        with self._lock:
+            self.received += 1
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = data
+            self._devices.setdefault(user_id, set()).add(key)
+
+    def flush(self, now=None):
+        """Gửi các frame đang chờ của những room đã tới hạn. Trả về số sự kiện đã phát."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = {}
+            for key in list(self._pending):
+                user_id = key[0]
+                if self._next_flush.get(user_id, 0.0) <= now:
+                    due[key] = self._pending.pop(key)
+            for user_id in {k[0] for k in due}:
+                self._next_flush[user_id] = now + self.interval_for(user_id)
+
+        sent = 0
+        for key, data in due.items():
+            out = self._delta(key, data, now)
+            if out is None:
+                with self._lock:
+                    self.suppressed += 1
+                continue
+            self.emit_fn(key[0], out)
+            sent += 1
+
+        with self._lock:
+            self.emitted += sent
+        return sent
+
+    def _delta(self, key, data, now):
+        readings = data.get('data') or []
+        last = self._last_values.get(key)
+        full = last is None or now - self._last_full.get(key, 0.0) >= self.keyframe_seconds
+
+        if full:
+            changed = readings
+        else:
+            changed = [r for r in readings if last.get(r.get('index')) != r.get('value')]
+            if not changed:
+                return None
+
+        values = dict(last or {})
+        for r in changed:
+            values[r.get('index')] = r.get('value')
+        self._last_values[key] = values
+        self._last_frame[key] = data
+        if full:
+            self._last_full[key] = now
+
+        out = dict(data)
+        out['data'] = changed
+        out['delta'] = not full
+        return out
+
+    def keyframes(self, user_id):
+        """
+        Frame đầy đủ (giá trị mới nhất đã gửi + đang chờ) của từng thiết bị của
+        user, không mang seq: trình duyệt vừa kết nối lại có thể đã lỡ delta,
+        hoặc bỏ frame gộp có seq thấp hơn sự kiện đã thấy (frame chờ flush
+        trong khi cảnh báo được phát ngay).
+        """
+        with self._lock:
+            frames = []
+            for key in self._devices.get(user_id, ()):
+                base = self._pending.get(key) or self._last_frame.get(key)
+                if base is None:
+                    continue
+                values = dict(self._last_values.get(key) or {})
+                for r in (self._pending.get(key) or {}).get('data') or ():
+                    values[r.get('index')] = r.get('value')
+                out = {k: v for k, v in base.items() if k not in ('seq', 'stream')}
+                out['data'] = [{'index': i, 'value': v} for i, v in values.items()]
+                out['delta'] = False
+                frames.append(out)
+            return frames
+
+    def run_forever(self):
+        """Vòng lặp flush (chạy trong background task của SocketIO)."""
+        tick = min([self.interval_for(None)] +
+                   [self.interval_for(u) for u in self.rate_per_user]) or 0.05
+        while True:
+            self.sleep_fn(tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ [Live] Lỗi flush: {e}")
+
+    def mark_started(self):
+        """Trả về True đúng một lần (cho lần khởi động background task đầu tiên)."""
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'emitted': self.emitted,
+                'coalesced': self.coalesced,
+                'suppressed': self.suppressed,
+                'pending': len(self._pending),
+                'ratio': round(self.emitted / self.received, 4) if self.received else None,
+            }
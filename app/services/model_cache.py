@@ -0,0 +1,147 @@
+# File: app/services/model_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache key -> value có thời hạn (`ttl` giây) và giới hạn số phần tử
+    (`maxsize`, bỏ phần tử dùng lâu nhất - LRU). ttl <= 0 hoặc maxsize <= 0 = tắt.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, hạn dùng)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Xóa một khóa, hoặc toàn bộ cache nếu không truyền khóa."""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# Mỗi tiến trình Web có cache riêng: xóa cache chỉ có hiệu lực trong tiến trình
+# gọi, các tiến trình khác thấy thay đổi sau tối đa TTL giây.
+user_cache = TTLCache()
+sensor_config_cache = TTLCache()
+
+
+def configure(maxsize=1024, ttl=60.0):
+    for cache in (user_cache, sensor_config_cache):
+        cache.maxsize = maxsize
+        cache.ttl = ttl
+        cache.invalidate()
+        cache.hits = cache.misses = cache.evictions = 0
+
+
+def _user_columns(user_id):
+    user = db.session.get(Users, user_id)
+    if user is None:
+        return None
+    return {attr.key: getattr(user, attr.key) for attr in Users.__mapper__.column_attrs}
+
+
+def get_user(user_id):
+    """
+    Users theo id (Flask-Login load_user, trang theo dõi). Cache giữ bản sao các
+    cột (không giữ đối tượng ORM giữa các request/luồng); khi trúng cache, đối
+    tượng được gắn vào session hiện tại bằng merge(load=False), không cần SELECT,
+    và vẫn lazy-load được quan hệ như bình thường.
+    """
+    columns = user_cache.get_or_load(user_id, lambda: _user_columns(user_id))
+    if columns is None:
+        return None
+    user = Users(**columns)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def get_sensor_configs(user_id):
+    """Cấu hình cảm biến của user dạng list dict (chỉ đọc), như trang theo dõi cần."""
+    def load():
+        configs = db.session.execute(
+            db.select(SensorConfig.sensor_index, SensorConfig.name, SensorConfig.unit,
+                      SensorConfig.min_val, SensorConfig.max_val)
+            .where(SensorConfig.user_id == user_id)
+            .order_by(SensorConfig.sensor_index)
+        ).all()
+        return [{'index': c.sensor_index, 'name': c.name, 'unit': c.unit,
+                 'min': c.min_val, 'max': c.max_val} for c in configs]
+    return sensor_config_cache.get_or_load(user_id, load)
+
+
+def invalidate_user(user_id=None):
+    """Gọi sau khi tạo/sửa/xóa user (hoặc cấu hình cảm biến). None = xóa hết."""
+    if user_id is None:
+        user_cache.invalidate()
+        sensor_config_cache.invalidate()
+    else:
+        user_cache.invalidate(user_id)
+        sensor_config_cache.invalidate(user_id)
+
+
+def cache_stats():
+    return {'users': user_cache.stats(), 'sensor_configs': sensor_config_cache.stats()}
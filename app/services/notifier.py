@@ -0,0 +1,430 @@
+# File: app/services/notifier.py
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, false, delete, insert, and_, bindparam
+
+from app import db
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig
+from app.models.alert_model import AlertEvent
+from app.models.config_model import ConfigVersion
+from app.models.notification_model import NotificationCooldown
+
+# Một cảnh báo chờ gửi. alert_id có khi lấy từ DB (quét định kỳ); sự kiện từ
+# collector chỉ biết episode_id. enqueued_at: time.monotonic() lúc vào hàng đợi.
+PendingAlert = namedtuple('PendingAlert', 'alert_id episode_id user_id sensor_index value timestamp enqueued_at')
+
+# Thông tin liên hệ của user: sensors = {sensor_index: (tên, đơn vị)}
+Contact = namedtuple('Contact', 'email fullname sensors')
+
+
+class ContactCache:
+    """
+    Cache email/tên user và tên/đơn vị cảm biến cho dịch vụ email. Hết hạn sau
+    `ttl` giây hoặc ngay khi ConfigVersion đổi (admin sửa user/cảm biến).
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._contacts = {}  # user_id -> (Contact | None, thời điểm nạp)
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, user_ids):
+        version = ConfigVersion.current()
+        if version != self._version:
+            self._contacts.clear()
+            self._version = version
+
+        now = time.monotonic()
+        result, missing = {}, []
+        for user_id in set(user_ids):
+            entry = self._contacts.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                result[user_id] = entry[0]
+                self.hits += 1
+            else:
+                missing.append(user_id)
+        if missing:
+            self.misses += len(missing)
+            loaded = self._load(missing)
+            for user_id in missing:
+                contact = loaded.get(user_id)
+                self._contacts[user_id] = (contact, now)
+                result[user_id] = contact
+        return result
+
+    @staticmethod
+    def _load(user_ids):
+        """Một truy vấn cho user, một truy vấn cho cảm biến của cả lô user."""
+        users = db.session.execute(
+            select(Users.id_user, Users.email, Users.fullname).where(Users.id_user.in_(user_ids))
+        ).all()
+        sensors = {}
+        for row in db.session.execute(
+                select(SensorConfig.user_id, SensorConfig.sensor_index, SensorConfig.name, SensorConfig.unit)
+                .where(SensorConfig.user_id.in_(user_ids))):
+            sensors.setdefault(row.user_id, {})[row.sensor_index] = (row.name, row.unit)
+        return {u.id_user: Contact(u.email, u.fullname, sensors.get(u.id_user, {})) for u in users}
+
+
+class CooldownStore:
+    """
+    Lần gửi gần nhất của từng (user, cảm biến), lưu trong bảng
+    notification_cooldowns để khởi động lại không gửi lặp email.
+    """
+
+    def __init__(self, minutes):
+        self.window = timedelta(minutes=minutes)
+        self._last = {}
+        self._dirty = {}
+
+    def load(self):
+        NotificationCooldown.__table__.create(bind=db.engine, checkfirst=True)
+        since = datetime.now() - self.window
+        rows = db.session.execute(
+            select(NotificationCooldown.user_id, NotificationCooldown.sensor_index, NotificationCooldown.last_sent_at)
+            .where(NotificationCooldown.last_sent_at >= since)
+        ).all()
+        self._last = {(r.user_id, r.sensor_index): r.last_sent_at for r in rows}
+        return len(self._last)
+
+    def active(self, key, now):
+        last = self._last.get(key)
+        return last is not None and now - last < self.window
+
+    def mark(self, key, now):
+        self._last[key] = now
+        self._dirty[key] = now
+
+    def write(self):
+        """Ghi các dòng đã đổi trong session hiện tại (người gọi commit)."""
+        if not self._dirty:
+            return
+        table = NotificationCooldown.__table__
+        rows = [{'user_id': u, 'sensor_index': s, 'last_sent_at': t} for (u, s), t in self._dirty.items()]
+        keys = [{'_u': r['user_id'], '_s': r['sensor_index']} for r in rows]
+        db.session.execute(delete(table).where(and_(table.c.user_id == bindparam('_u'),
+                                                    table.c.sensor_index == bindparam('_s'))), keys)
+        db.session.execute(insert(table), rows)
+        self._dirty.clear()
+
+    def discard_pending(self):
+        self._dirty.clear()
+
+
+class Notifier:
+    """
+    Dịch vụ email hướng sự kiện (thay vòng quét DB 10 giây của reportByEmail cũ).
+
+    Collector báo 'alert_committed' ngay sau khi dòng AlertEvent được commit;
+    sự kiện vào hàng đợi có giới hạn và được xử lý theo lô: một truy vấn xác
+    nhận cảnh báo còn chưa gửi, thông tin liên hệ lấy từ ContactCache, gửi
+    email qua `transport(to, subject, body) -> bool` (gửi song song nếu transport
+    có send_many, VD: SMTPPool), rồi đánh dấu sent và ghi cooldown trong một
+    commit cho cả lô. `digest_window` gom cảnh báo của mỗi user thành một email.
+    Quét DB chậm (`sweep_interval`) vẫn chạy để thử lại email gửi lỗi và nhặt
+    cảnh báo bị lỡ sự kiện.
+    """
+
+    def __init__(self, transport, cooldown_minutes=5, batch_size=100, batch_interval=0.2,
+                 max_queue=10000, sweep_interval=60.0, stats_interval=60.0, contact_ttl=300.0,
+                 digest_window=None):
+        self.transport = transport
+        self.cooldown_minutes = cooldown_minutes
+        self.cooldown = CooldownStore(cooldown_minutes)
+        self.contacts = ContactCache(contact_ttl)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        # Số giây gom mọi cảnh báo của một user thành một email digest (None = gửi từng cảnh báo)
+        self.digest_window = digest_window
+        self.sweep_interval = sweep_interval
+        self.stats_interval = stats_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Khóa của cảnh báo đang nằm trong hàng đợi (tránh gửi trùng sự kiện + quét)
+        self._inflight = set()
+        self._stop = threading.Event()
+
+        # Số liệu theo dõi
+        self.received = 0
+        self.dropped = 0
+        self.sent = 0
+        self.emails = 0
+        self.failed = 0
+        self.skipped_cooldown = 0
+        self.no_email = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        # Độ trễ gửi: từ thời điểm ghi nhận cảnh báo tới lúc email gửi xong
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._latency_total_ms = 0.0
+
+    @staticmethod
+    def _key(item):
+        return item.episode_id or ('id', item.alert_id)
+
+    def submit(self, item):
+        """Đưa một PendingAlert vào hàng đợi; không chặn, bỏ qua nếu đã có."""
+        key = self._key(item)
+        with self._lock:
+            if key in self._inflight:
+                return False
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                # Cảnh báo vẫn sent=False trong DB: lần quét sau sẽ nhặt lại
+                self.dropped += 1
+                return False
+            self._inflight.add(key)
+            self.received += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def on_event(self, event, data):
+        """Hàm nhận sự kiện từ bus (collector.event_bus.listen)."""
+        if event != 'alert_committed':
+            return
+        try:
+            timestamp = datetime.fromisoformat(data['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            timestamp = None
+        self.submit(PendingAlert(None, data.get('episode_id'), data.get('user_id'), data.get('sensor_index'),
+                                 data.get('value'), timestamp, time.monotonic()))
+
+    def sweep(self, limit=1000):
+        """Quét DB tìm cảnh báo chưa gửi (dùng index một phần ix_alert_events_unsent)."""
+        rows = db.session.execute(
+            select(AlertEvent.id, AlertEvent.episode_id, AlertEvent.user_id, AlertEvent.sensor_index,
+                   AlertEvent.value, AlertEvent.timestamp)
+            .where(AlertEvent.sent == false())
+            .order_by(AlertEvent.timestamp.asc()).limit(limit)
+        ).all()
+        db.session.commit()
+        now = time.monotonic()
+        return sum(self.submit(PendingAlert(r.id, r.episode_id, r.user_id, r.sensor_index,
+                                            r.value, r.timestamp, now)) for r in rows)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            done = self.sent
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "received": self.received,
+                "dropped": self.dropped,
+                "sent": self.sent,
+                "emails": self.emails,
+                "failed": self.failed,
+                "skipped_cooldown": self.skipped_cooldown,
+                "no_email": self.no_email,
+                "batches": self.batches,
+                "last_latency_ms": round(self.last_latency_ms, 2),
+                "avg_latency_ms": round(self._latency_total_ms / done, 2) if done else 0.0,
+                "max_latency_ms": round(self.max_latency_ms, 2),
+                "contact_cache_hits": self.contacts.hits,
+                "contact_cache_misses": self.contacts.misses,
+            }
+
+    # ------------------------------------------------------------------
+    # Vòng xử lý (chạy trong app context)
+    # ------------------------------------------------------------------
+    def run_forever(self):
+        print(f"🍃 [Notifier] Nạp {self.cooldown.load()} cooldown còn hiệu lực")
+        self.sweep()
+        next_sweep = time.monotonic() + self.sweep_interval
+        next_stats = time.monotonic() + self.stats_interval
+
+        while not self._stop.is_set():
+            batch = self._next_batch(timeout=1.0)
+            if batch:
+                self.process(batch)
+
+            now = time.monotonic()
+            if now >= next_sweep:
+                next_sweep = now + self.sweep_interval
+                try:
+                    found = self.sweep()
+                    if found: print(f"🔎 [Notifier] Quét DB: {found} cảnh báo chưa gửi")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ [Notifier] Lỗi quét DB: {e}")
+            if now >= next_stats:
+                next_stats = now + self.stats_interval
+                s = self.stats()
+                if s["received"]:
+                    print(f"📊 [Notifier] {s}")
+
+        print(f"🛑 [Notifier] Dừng: {self.stats()}")
+
+    def _next_batch(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        # Chờ thêm một chút để gom các cảnh báo đến cùng lúc vào một lô
+        deadline = time.monotonic() + (self.digest_window or self.batch_interval)
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process(self, batch):
+        try:
+            self._process(batch)
+        except Exception as e:
+            db.session.rollback()
+            self.cooldown.discard_pending()
+            print(f"❌ [Notifier] Lỗi xử lý lô {len(batch)} cảnh báo: {e}")
+        finally:
+            with self._lock:
+                for item in batch:
+                    self._inflight.discard(self._key(item))
+
+    def _process(self, batch):
+        batch = self._still_unsent(batch)
+        contacts = self.contacts.get_many([item.user_id for item in batch])
+        now = datetime.now()
+        done = []
+        # Nhóm thư cần gửi: theo (user, cảm biến), hoặc theo user khi gửi digest
+        outgoing = {}
+        reserved = set()
+        skipped = no_email = 0
+
+        for item in batch:
+            key = (item.user_id, item.sensor_index)
+            contact = contacts.get(item.user_id)
+
+            if self.cooldown.active(key, now) or (not self.digest_window and key in reserved):
+                # Vẫn đánh dấu đã xử lý, nếu không lần quét sau lại lấy ra
+                skipped += 1
+                done.append(item)
+            elif contact is None or not contact.email:
+                print(f"   ⚠️ User {item.user_id} không có email. Đánh dấu đã xử lý.")
+                no_email += 1
+                done.append(item)
+            else:
+                reserved.add(key)
+                outgoing.setdefault(item.user_id if self.digest_window else key, []).append(item)
+
+        groups = list(outgoing.values())
+        results = self._send_all([self.compose(contacts[items[0].user_id], items) for items in groups])
+        sent_at = datetime.now()
+        sent = emails = failed = 0
+        for items, ok in zip(groups, results):
+            if not ok:
+                # Giữ sent=False: lần quét sau sẽ thử lại
+                failed += len(items)
+                continue
+            emails += 1
+            sent += len(items)
+            for item in items:
+                self.cooldown.mark((item.user_id, item.sensor_index), sent_at)
+                self._record_latency(item, sent_at)
+                done.append(item)
+
+        # Một commit cho cả lô: đánh dấu sent + cooldown
+        table = AlertEvent.__table__
+        done_ids = [{'_id': item.alert_id} for item in done if item.alert_id is not None]
+        done_episodes = [{'_episode': item.episode_id} for item in done if item.alert_id is None]
+        if done_ids:
+            db.session.execute(table.update().where(table.c.id == bindparam('_id')).values(sent=True), done_ids)
+        if done_episodes:
+            db.session.execute(table.update().where(table.c.episode_id == bindparam('_episode')).values(sent=True),
+                               done_episodes)
+        self.cooldown.write()
+        db.session.commit()
+
+        with self._lock:
+            self.batches += 1
+            self.sent += sent
+            self.emails += emails
+            self.failed += failed
+            self.skipped_cooldown += skipped
+            self.no_email += no_email
+
+    def _send_all(self, messages):
+        """Transport có send_many (SMTPPool) thì gửi song song, không thì lần lượt."""
+        if not messages:
+            return []
+        send_many = getattr(self.transport, 'send_many', None)
+        if send_many is not None:
+            return send_many(messages)
+        return [self.transport(*m) for m in messages]
+
+    def _still_unsent(self, batch):
+        """
+        Một truy vấn cho cả lô: bỏ cảnh báo đã được gửi (VD: quét DB xử lý trước
+        sự kiện) và bổ sung id/giá trị từ DB cho cảnh báo đến từ sự kiện.
+        """
+        episodes = [item.episode_id for item in batch if item.alert_id is None and item.episode_id]
+        ids = [item.alert_id for item in batch if item.alert_id is not None]
+        by_episode, unsent_ids = {}, set()
+        if episodes:
+            for row in db.session.execute(
+                    select(AlertEvent.episode_id, AlertEvent.sent).where(AlertEvent.episode_id.in_(episodes))):
+                by_episode[row.episode_id] = row.sent
+        if ids:
+            unsent_ids = set(db.session.scalars(
+                select(AlertEvent.id).where(AlertEvent.id.in_(ids), AlertEvent.sent == false())))
+
+        result = []
+        for item in batch:
+            if item.alert_id is not None:
+                if item.alert_id in unsent_ids:
+                    result.append(item)
+            elif by_episode.get(item.episode_id) is False:
+                result.append(item)
+        return result
+
+    def _record_latency(self, item, now):
+        if item.timestamp is not None:
+            latency_ms = (now - item.timestamp).total_seconds() * 1000
+        else:
+            latency_ms = (time.monotonic() - item.enqueued_at) * 1000
+        with self._lock:
+            self.last_latency_ms = latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            self._latency_total_ms += latency_ms
+
+    def compose(self, contact, items):
+        """Trả về (email, tiêu đề, nội dung): một cảnh báo, hoặc digest nhiều cảnh báo của user."""
+        sensors = [contact.sensors.get(item.sensor_index, (f"Sensor {item.sensor_index}", "")) for item in items]
+        if len(items) == 1:
+            (sensor_name, unit), item = sensors[0], items[0]
+            print(f"   📧 Gửi cảnh báo {sensor_name} = {item.value} tới {contact.email}")
+            subject = f"[CẢNH BÁO] {sensor_name} vượt ngưỡng an toàn!"
+            body = (
+                f"Xin chào {contact.fullname},\n\n"
+                f"Hệ thống phát hiện thông số vượt ngưỡng sau {self.cooldown_minutes} phút kiểm tra:\n"
+                f"- Cảm biến: {sensor_name}\n"
+                f"- Giá trị đo được: {item.value} {unit or ''}\n"
+                f"- Thời gian ghi nhận: {item.timestamp}\n\n"
+                f"Vui lòng kiểm tra thiết bị ngay."
+            )
+            return contact.email, subject, body
+
+        print(f"   📧 Gửi digest {len(items)} cảnh báo tới {contact.email}")
+        subject = f"[CẢNH BÁO] {len(items)} cảnh báo vượt ngưỡng an toàn!"
+        lines = [f"- {item.timestamp} | {name}: {item.value} {unit or ''}"
+                 for item, (name, unit) in zip(items, sensors)]
+        body = (
+            f"Xin chào {contact.fullname},\n\n"
+            f"Hệ thống phát hiện {len(items)} cảnh báo vượt ngưỡng trong {self.digest_window:g} giây qua:\n"
+            + "\n".join(lines) +
+            "\n\nVui lòng kiểm tra thiết bị ngay."
+        )
+        return contact.email, subject, body
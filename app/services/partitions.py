@@ -0,0 +1,307 @@
+# File: app/services/partitions.py
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, delete, MetaData, Table, Column, Integer, String
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.sensor_model import DataReadings, DataFrames
+
+# Bảng dữ liệu thô được chuyển sang file phân vùng
+PARTITIONED_TABLES = (DataReadings.__table__, DataFrames.__table__)
+
+_FILE_RE = re.compile(r'^readings_(\d{4})_(\d{2})\.db$')
+
+# Một file phân vùng: dữ liệu có timestamp trong [start, end)
+Partition = namedtuple('Partition', 'start end path alias')
+
+# Nhật ký của move_to_partitions, nằm trong từng file phân vùng: khoảng id
+# (của DB chính) đã chép vào file, ghi cùng transaction với các dòng được chép
+_move_metadata = MetaData()
+partition_moves = Table(
+    'partition_moves', _move_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('table_name', String(64), nullable=False),
+    Column('first_id', Integer, nullable=False),
+    Column('last_id', Integer, nullable=False),
+    Column('row_count', Integer, nullable=False),
+)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _month_index(ts):
+    return ts.year * 12 + ts.month - 1
+
+
+def _from_month_index(index):
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class ReadingPartitions:
+    """
+    Lưu DataReadings/DataFrames trong các file SQLite theo khoảng thời gian
+    (`months` tháng mỗi file, VD readings_2026_10.db) thay vì trong app.db:
+    collector ghi dữ liệu chỉ khóa file phân vùng, không tranh khóa ghi với
+    các thao tác của admin trên app.db; xóa dữ liệu cũ = xóa cả file.
+
+    Phân vùng được ATTACH vào kết nối của engine chính khi cần (tối đa
+    `max_attached` mỗi kết nối, DETACH phân vùng dùng lâu nhất) và câu lệnh
+    dùng chung model nhờ schema_translate_map {None: alias}.
+    `directory` = None: tắt, dữ liệu thô nằm trong app.db như cũ.
+    """
+
+    def __init__(self, directory=None, months=1, max_attached=8):
+        self.directory = directory
+        self.months = months
+        self.max_attached = max_attached
+        self._create_lock = threading.Lock()
+
+    def configure(self, directory=None, months=1, max_attached=8):
+        self.directory = directory
+        self.months = max(1, int(months))
+        self.max_attached = max(1, int(max_attached))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    # ------------------------------------------------------------------
+    # Tên / khoảng thời gian
+    # ------------------------------------------------------------------
+    def _partition(self, start):
+        end = _from_month_index(_month_index(start) + self.months)
+        name = f"readings_{start.year:04d}_{start.month:02d}"
+        return Partition(start, end, os.path.join(self.directory, name + '.db'), 'p_' + name[9:])
+
+    def partition_for(self, ts):
+        """Phân vùng chứa thời điểm ts (theo cấu hình `months` hiện tại)."""
+        index = _month_index(ts)
+        return self._partition(_from_month_index(index - index % self.months))
+
+    def list(self, start=None, end=None, newest_first=False):
+        """Các phân vùng đang có file, giao với [start, end), theo thời gian."""
+        if not self.enabled:
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            match = _FILE_RE.match(name)
+            if match is None:
+                continue
+            p = self._partition(datetime(int(match.group(1)), int(match.group(2)), 1))
+            if (start is None or p.end > start) and (end is None or p.start < end):
+                found.append(p)
+        found.sort(key=lambda p: p.start, reverse=newest_first)
+        return found
+
+    def split(self, rows):
+        """Chia các dict dòng (có 'timestamp') theo phân vùng: {Partition: [dòng]}."""
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.partition_for(row['timestamp']), []).append(row)
+        return groups
+
+    # ------------------------------------------------------------------
+    # ATTACH / DETACH trên kết nối
+    # ------------------------------------------------------------------
+    def attach(self, conn, partitions, create=False):
+        """
+        ATTACH các phân vùng vào kết nối (gọi ngoài transaction). create=True
+        tạo file + bảng nếu chưa có (đường ghi); đường đọc chỉ dùng file có sẵn.
+        """
+        raw = conn.connection.driver_connection
+        # alias -> inode của file lúc ATTACH (trên kết nối DBAPI, còn giữ khi về pool)
+        attached = conn.connection.info.setdefault('reading_partitions', OrderedDict())
+        for p in partitions:
+            inode = _inode(p.path)
+            if p.alias in attached:
+                if attached[p.alias] == inode:
+                    attached.move_to_end(p.alias)
+                    continue
+                # File đã bị xóa/tạo lại (hết hạn, tiến trình khác) khi vẫn còn ATTACH
+                raw.execute(f"DETACH DATABASE {p.alias}")
+                del attached[p.alias]
+            while len(attached) >= self.max_attached:
+                old, _ = attached.popitem(last=False)
+                raw.execute(f"DETACH DATABASE {old}")
+            raw.execute(f"ATTACH DATABASE ? AS {p.alias}", (p.path,))
+            if create and inode is None:
+                self._create(conn, raw, p)
+            attached[p.alias] = _inode(p.path)
+
+    def _create(self, conn, raw, p):
+        with self._create_lock:
+            raw.execute(f"PRAGMA {p.alias}.journal_mode=WAL")
+            conn.execution_options(schema_translate_map={None: p.alias})
+            try:
+                db.metadata.create_all(conn, tables=list(PARTITIONED_TABLES))
+                conn.commit()
+            except OperationalError as e:
+                # Tiến trình collector khác vừa tạo cùng phân vùng
+                conn.rollback()
+                if 'already exists' not in str(e):
+                    raise
+            finally:
+                conn.execution_options(schema_translate_map=None)
+        print(f"🗂️ [Partition] Tạo phân vùng {p.path}")
+
+    @staticmethod
+    def options(partition):
+        """execution_options để chạy câu lệnh của model trên phân vùng."""
+        return {'schema_translate_map': {None: partition.alias}}
+
+    # ------------------------------------------------------------------
+    # Hết hạn
+    # ------------------------------------------------------------------
+    def drop_before(self, cutoff):
+        """Xóa nguyên file các phân vùng kết thúc trước `cutoff` (O(1) mỗi phân vùng). Trả về số file."""
+        dropped = 0
+        for p in self.list(end=cutoff):
+            if p.end > cutoff:
+                continue
+            try:
+                for suffix in ('', '-wal', '-shm', '-journal'):
+                    try:
+                        os.remove(p.path + suffix)
+                    except FileNotFoundError:
+                        pass
+            except OSError as e:
+                # Windows: file còn được ATTACH trên kết nối khác (PermissionError), xóa lại ở lần sau
+                print(f"⚠️ [Partition] Chưa xóa được {p.path}, thử lại lần sau: {e}")
+                continue
+            dropped += 1
+            print(f"🗑️ [Partition] Xóa phân vùng hết hạn {p.path}")
+        return dropped
+
+
+# Cấu hình trong create_app (READINGS_PARTITION_*)
+reading_partitions = ReadingPartitions()
+
+
+def raw_sources(start=None, end=None, newest_first=False):
+    """
+    Nơi đọc dữ liệu thô cho khoảng [start, end): db.session khi không phân
+    vùng, hoặc lần lượt từng phân vùng (một kết nối, ATTACH + translate map
+    tới phân vùng hiện tại). Mỗi phần tử chỉ dùng trong lượt lặp của nó.
+    """
+    for _, source in keyed_raw_sources(start, end, newest_first):
+        yield source
+
+
+def keyed_raw_sources(start=None, end=None, newest_first=False):
+    """Như raw_sources nhưng kèm tên nơi lưu: ('main', ...) hoặc (tên file phân vùng, ...)."""
+    if not reading_partitions.enabled:
+        yield 'main', db.session
+        return
+    with db.engine.connect() as conn:
+        for p in reading_partitions.list(start, end, newest_first):
+            reading_partitions.attach(conn, [p])
+            yield os.path.basename(p.path), conn.execution_options(**reading_partitions.options(p))
+
+
+class PartitionMoveError(RuntimeError):
+    pass
+
+
+def _copied_ids(conn, p, table, first, last):
+    """Các khoảng id [first_id, last_id] của DB chính đã chép vào phân vùng p (giao với [first, last])."""
+    m = partition_moves
+    conn.execution_options(**reading_partitions.options(p))
+    try:
+        _move_metadata.create_all(conn)
+        return conn.execute(select(m.c.first_id, m.c.last_id).where(
+            m.c.table_name == table.name, m.c.last_id >= first, m.c.first_id <= last)).all()
+    finally:
+        conn.execution_options(schema_translate_map=None)
+
+
+def move_to_partitions(batch_size=5000, remove=False):
+    """
+    Chuyển DataReadings/DataFrames đang nằm trong DB chính vào các file phân
+    vùng. Dòng được chèn với id mới của phân vùng: collector có thể đã ghi vào
+    phân vùng tháng hiện tại và id ở đó bắt đầu lại từ 1.
+
+    Mỗi lô: chép vào từng phân vùng kèm một dòng partition_moves (khoảng id
+    nguồn, số dòng) trong cùng file, commit; kiểm tra lại số dòng đã chép;
+    remove=True mới xóa khoảng id đó khỏi DB chính (commit riêng) rồi bỏ
+    nhật ký. Commit trên nhiều file ATTACH (WAL) không nguyên tử giữa các file
+    nên mọi bước đều chạy lại được: dòng có id nằm trong khoảng đã ghi nhật ký
+    của phân vùng thì bỏ qua, không chèn hai lần (kể cả khi chạy lại không có
+    remove).
+    Trả về {bảng: số dòng đã chèn}.
+    """
+    # Đọc/xóa bảng của DB chính dù tên bảng trùng với phân vùng đã ATTACH
+    main = {'schema_translate_map': {None: 'main'}}
+    moved = {}
+    for table in PARTITIONED_TABLES:
+        pk = table.primary_key.columns.values()[0]
+        total = 0
+        last = None
+        while True:
+            stmt = select(table).order_by(pk).limit(batch_size)
+            if last is not None:
+                stmt = stmt.where(pk > last)
+            with db.engine.connect() as conn:
+                rows = [dict(r._mapping) for r in conn.execute(stmt, execution_options=main)]
+                if not rows:
+                    break
+                first_id, last_id = rows[0][pk.name], rows[-1][pk.name]
+                groups = reading_partitions.split(rows)
+                reading_partitions.attach(conn, groups, create=True)
+
+                # 1. Chép phần chưa có trong nhật ký của từng phân vùng
+                inserted = 0
+                for p, part in groups.items():
+                    copied = _copied_ids(conn, p, table, first_id, last_id)
+                    part = [r for r in part if not any(a <= r[pk.name] <= b for a, b in copied)]
+                    if not part:
+                        continue
+                    options = reading_partitions.options(p)
+                    result = conn.execute(table.insert(), [{k: v for k, v in r.items() if k != pk.name} for r in part],
+                                          execution_options=options)
+                    if result.rowcount != len(part):
+                        conn.rollback()
+                        raise PartitionMoveError(f"{table.name}: chỉ chèn được {result.rowcount}/{len(part)} dòng vào {p.path}")
+                    conn.execute(partition_moves.insert().values(
+                        table_name=table.name, first_id=part[0][pk.name], last_id=part[-1][pk.name], row_count=len(part)),
+                        execution_options=options)
+                    inserted += len(part)
+                conn.commit()
+
+                # 2. Kiểm tra sau commit: mọi dòng của lô nằm trong nhật ký của phân vùng đích
+                for p, part in groups.items():
+                    copied = _copied_ids(conn, p, table, first_id, last_id)
+                    missing = sum(1 for r in part if not any(a <= r[pk.name] <= b for a, b in copied))
+                    if missing:
+                        raise PartitionMoveError(f"{table.name}: {missing} dòng id {first_id}..{last_id} "
+                                                 f"chưa có trong {p.path}")
+
+                # 3. Xóa đúng khoảng id đã chép khỏi DB chính
+                if remove:
+                    result = conn.execute(delete(table).where(pk >= first_id, pk <= last_id), execution_options=main)
+                    if result.rowcount != len(rows):
+                        # DB chính thay đổi giữa lúc đọc và xóa: không xóa gì, lô này làm lại sau
+                        conn.rollback()
+                        raise PartitionMoveError(f"{table.name}: xóa {result.rowcount} dòng khác số đã chép {len(rows)}")
+                    conn.commit()
+                    # Mọi id <= last_id đã rời DB chính và có thể được cấp lại: bỏ nhật ký của chúng
+                    m = partition_moves
+                    for p in groups:
+                        conn.execute(delete(m).where(m.c.table_name == table.name, m.c.last_id <= last_id),
+                                     execution_options=reading_partitions.options(p))
+                    conn.commit()
+            total += inserted
+            last = last_id
+        moved[table.name] = total
+    return moved
@@ -0,0 +1,120 @@
+# File: app/services/query_plans.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, false, tuple_, inspect, text
+
+from app import db
+from app.models.sensor_model import DataReadings, DataFrames, SensorConfig
+from app.models.alert_model import AlertEvent
+from app.models.rollup_model import ReadingRollup1m
+
+
+def hot_queries():
+    """Các truy vấn chạy thường xuyên nhất (trang theo dõi, API, email, rollup)."""
+    now = datetime.now()
+    start = now - timedelta(hours=1)
+    return {
+        'follow_data: sensor configs':
+            select(SensorConfig).where(SensorConfig.user_id == 1)
+            .order_by(SensorConfig.sensor_index),
+        'follow_data/api: latest readings':
+            select(DataReadings).where(DataReadings.user_id == 1)
+            .order_by(DataReadings.timestamp.desc()).limit(50),
+        'api: latest readings of one sensor':
+            select(DataReadings).where(DataReadings.user_id == 1, DataReadings.sensor_index == 1)
+            .order_by(DataReadings.timestamp.desc()).limit(50),
+        'api: keyset page after cursor':
+            select(DataReadings.id_reading, DataReadings.sensor_index, DataReadings.value, DataReadings.timestamp)
+            .where(DataReadings.user_id == 1,
+                   tuple_(DataReadings.timestamp, DataReadings.id_reading) < tuple_(start, 1000))
+            .order_by(DataReadings.timestamp.desc(), DataReadings.id_reading.desc()).limit(51),
+        'follow_data/api: latest alerts':
+            select(AlertEvent).where(AlertEvent.user_id == 1)
+            .order_by(AlertEvent.timestamp.desc()).limit(20),
+        'collector: close alert episode':
+            select(AlertEvent.id).where(AlertEvent.episode_id == 'x'),
+        'reportByEmail: pending alerts':
+            select(AlertEvent).where(AlertEvent.sent == false())
+            .order_by(AlertEvent.timestamp.asc()),
+        'series: raw range':
+            select(DataReadings.timestamp, DataReadings.sensor_index, DataReadings.value)
+            .where(DataReadings.user_id == 1, DataReadings.timestamp >= start, DataReadings.timestamp < now)
+            .order_by(DataReadings.timestamp),
+        'series: 1m rollup range':
+            select(ReadingRollup1m.bucket, ReadingRollup1m.sensor_index, ReadingRollup1m.last_val)
+            .where(ReadingRollup1m.user_id == 1, ReadingRollup1m.bucket >= start, ReadingRollup1m.bucket < now)
+            .order_by(ReadingRollup1m.bucket),
+        'rollup: raw source window':
+            select(DataReadings.user_id, DataReadings.sensor_index, DataReadings.timestamp, DataReadings.value)
+            .where(DataReadings.timestamp >= start, DataReadings.timestamp < now)
+            .order_by(DataReadings.timestamp),
+        'api (frames): latest frames':
+            select(DataFrames.id_frame, DataFrames.values).where(DataFrames.user_id == 1)
+            .order_by(DataFrames.timestamp.desc(), DataFrames.id_frame.desc()).limit(8),
+        'series (frames): raw range':
+            select(DataFrames.timestamp, DataFrames.values)
+            .where(DataFrames.user_id == 1, DataFrames.timestamp >= start, DataFrames.timestamp < now)
+            .order_by(DataFrames.timestamp),
+        'rollup (frames): raw source window':
+            select(DataFrames.user_id, DataFrames.timestamp, DataFrames.values)
+            .where(DataFrames.timestamp >= start, DataFrames.timestamp < now)
+            .order_by(DataFrames.timestamp),
+    }
+
+
+def explain(stmt):
+    """Chạy EXPLAIN QUERY PLAN (SQLite) và trả về danh sách dòng mô tả kế hoạch."""
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def is_bad_step(detail):
+    """Quét toàn bảng/toàn index, hoặc phải sắp xếp bằng B-tree tạm."""
+    return detail.startswith('SCAN ') or 'TEMP B-TREE' in detail
+
+
+def check_query_plans():
+    """Trả về dict {tên truy vấn: (danh sách bước, có bước xấu hay không)}."""
+    results = {}
+    for name, stmt in hot_queries().items():
+        try:
+            steps = explain(stmt)
+        except Exception as e:
+            results[name] = ([f"LỖI: {e.__class__.__name__}: {e}"], True)
+            continue
+        results[name] = (steps, any(is_bad_step(s) for s in steps))
+    return results
+
+
+def ensure_indexes():
+    """
+    db.create_all() bỏ qua bảng đã tồn tại nên không thêm index mới cho DB cũ;
+    hàm này tạo các index còn thiếu.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def ensure_columns():
+    """
+    Tương tự ensure_indexes cho cột: thêm (ALTER TABLE ... ADD COLUMN) các cột
+    nullable mới của model vào bảng đã tồn tại trong DB cũ.
+    """
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+                added.append(f"{table.name}.{column.name}")
+    return added
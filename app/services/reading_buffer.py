@@ -0,0 +1,366 @@
+# File: app/services/reading_buffer.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.readings_query import ReadingRow, encode_cursor, fetch_readings_page
+
+_EPOCH = datetime(1970, 1, 1)
+_MICRO = timedelta(microseconds=1)
+# Cursor "mọi dòng có timestamp <= t" khi không biết id_reading của dòng cuối trang
+_MAX_ID = 2 ** 63 - 1
+# Mỗi mẫu: thời gian (int64 µs) + giá trị (float64) + id_reading (int64)
+ROW_BYTES = 24
+
+
+def to_micros(dt):
+    """datetime (naive, giờ địa phương như DB) -> số µs, chính xác tuyệt đối để so với DB."""
+    if dt.tzinfo is not None:
+        # Thời điểm có múi giờ: đổi về giờ địa phương naive như DB
+        dt = dt.astimezone().replace(tzinfo=None)
+    return (dt - _EPOCH) // _MICRO
+
+
+def from_micros(us):
+    return _EPOCH + timedelta(microseconds=int(us))
+
+
+class SensorRing:
+    """
+    Vòng đệm cố định `capacity` mẫu gần nhất của một cảm biến, dạng mảng NumPy
+    (thời gian tăng dần). id = -1 khi mẫu đến từ sự kiện realtime (chưa biết id DB).
+    Mọi mẫu có thời gian > `floor` đều nằm trong ring; floor = None nghĩa là
+    ring giữ toàn bộ lịch sử.
+    """
+    __slots__ = ('times', 'values', 'ids', 'start', 'size', 'floor')
+
+    def __init__(self, capacity, floor=None):
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.start = 0
+        self.size = 0
+        self.floor = floor
+
+    @property
+    def capacity(self):
+        return len(self.times)
+
+    def last_time(self):
+        if not self.size:
+            return None
+        return int(self.times[(self.start + self.size - 1) % self.capacity])
+
+    def raise_floor(self, t):
+        if t is not None and (self.floor is None or t > self.floor):
+            self.floor = t
+
+    def append(self, t, value, id_reading=-1):
+        """Thêm mẫu mới nhất; bỏ qua mẫu trùng/cũ hơn mẫu cuối (sự kiện lặp, đến trễ)."""
+        if self.size and t <= self.last_time():
+            return False
+        cap = self.capacity
+        if self.size == cap:
+            self.raise_floor(int(self.times[self.start]))
+            i = self.start
+            self.start = (self.start + 1) % cap
+        else:
+            i = (self.start + self.size) % cap
+            self.size += 1
+        self.times[i] = t
+        self.values[i] = value
+        self.ids[i] = id_reading
+        return True
+
+    def ordered(self):
+        """(times, values, ids) tăng dần theo thời gian."""
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.times[self.start:end], self.values[self.start:end], self.ids[self.start:end]
+        k = end - self.capacity
+        return (np.concatenate([self.times[self.start:], self.times[:k]]),
+                np.concatenate([self.values[self.start:], self.values[:k]]),
+                np.concatenate([self.ids[self.start:], self.ids[:k]]))
+
+    def prepend(self, times, values, ids):
+        """Ghép các mẫu cũ hơn (nạp từ DB, tăng dần) vào trước các mẫu đang có."""
+        cur_t, cur_v, cur_i = self.ordered()
+        if self.size:
+            keep = times < cur_t[0]
+            times, values, ids = times[keep], values[keep], ids[keep]
+        all_t = np.concatenate([times, cur_t])
+        all_v = np.concatenate([values, cur_v])
+        all_i = np.concatenate([ids, cur_i])
+        cap = self.capacity
+        if len(all_t) > cap:
+            self.raise_floor(int(all_t[-cap - 1]))
+            all_t, all_v, all_i = all_t[-cap:], all_v[-cap:], all_i[-cap:]
+        n = len(all_t)
+        self.times[:n] = all_t
+        self.values[:n] = all_v
+        self.ids[:n] = all_i
+        self.start = 0
+        self.size = n
+
+
+class _UserBuffer:
+    __slots__ = ('rings', 'created', 'first_live', 'warmed', 'floor', 'stream', 'seq')
+
+    def __init__(self):
+        self.rings = {}          # sensor_index -> SensorRing
+        self.created = time.monotonic()
+        self.first_live = None   # thời gian (µs) của mẫu realtime đầu tiên nhận được
+        self.warmed = False
+        self.floor = None        # floor từ lần nạp DB, cho ring tạo về sau
+        self.stream = None       # (stream, seq) của sự kiện realtime cuối cùng (LiveSequencer)
+        self.seq = None
+
+
+class ReadingBuffer:
+    """
+    Dữ liệu đo gần nhất của các user đang được xem, giữ trong tiến trình Web.
+
+    Bắt đầu theo dõi một user ở lần đọc đầu tiên (follow_data / API): từ đó mọi
+    'sensor_data_update' của user được ghi vào SensorRing của từng cảm biến.
+    Sau `settle_seconds` (đủ để luồng ghi của collector commit các frame trước
+    đó), lần đọc kế tiếp nạp phần cũ hơn từ DB bằng một truy vấn. Từ đó các
+    truy vấn "mới nhất" được trả lời từ bộ nhớ nếu ring phủ đủ khoảng cần lấy,
+    không thì trả None để người gọi đọc DB như cũ.
+
+    Ring chỉ đúng khi không lỡ frame nào: bus sự kiện bỏ sự kiện khi buffer
+    đầy. Mọi sự kiện của user (frame, cảnh báo) mang (stream, seq) liên tiếp
+    của LiveSequencer; thiếu một số, đổi stream (collector khởi động lại) hay
+    không có seq thì bỏ bộ đệm của user, lần đọc sau nạp lại từ DB.
+
+    Bộ nhớ giới hạn bởi `max_bytes`; vượt thì bỏ user được đọc lâu nhất (LRU).
+    """
+
+    def __init__(self, capacity=512, max_bytes=64 * 1024 * 1024, settle_seconds=2.0):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+        self._users = OrderedDict()  # user_id -> _UserBuffer, cuối = đọc gần nhất
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        # Số liệu theo dõi
+        self.hits = 0
+        self.misses = 0
+        self.fed = 0
+        self.warms = 0
+        self.evictions = 0
+        self.gaps = 0
+
+    def configure(self, capacity=512, max_bytes=64 * 1024 * 1024, settle_seconds=2.0):
+        with self._lock:
+            self.capacity = capacity
+            self.max_bytes = max_bytes
+            self.settle_seconds = settle_seconds
+            self._users.clear()
+            self._bytes = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0 and self.max_bytes > 0
+
+    # ------------------------------------------------------------------
+    # Nhận dữ liệu realtime
+    # ------------------------------------------------------------------
+    def feed(self, data):
+        """Từ handle_sensor_update: {'user_id', 'ts' (ISO), 'data': [{'index', 'value'}]}."""
+        user_id = data.get('user_id')
+        with self._lock:
+            buf = self._users.get(user_id)
+            if buf is None or not self._advance(user_id, buf, data):
+                return
+            try:
+                t = to_micros(datetime.fromisoformat(data['ts']))
+            except (KeyError, TypeError, ValueError):
+                # Collector cũ không gửi thời gian chính xác: không ghép được với DB
+                self._drop(user_id)
+                return
+            if buf.first_live is None:
+                buf.first_live = t
+            for reading in data.get('data') or ():
+                ring = self._ring(buf, reading.get('index'))
+                if ring is not None:
+                    ring.append(t, reading.get('value'))
+            self.fed += 1
+
+    def sequence(self, data):
+        """Sự kiện realtime khác của user (new_alert, alert_closed): chỉ theo dõi seq."""
+        with self._lock:
+            buf = self._users.get(data.get('user_id'))
+            if buf is not None:
+                self._advance(data.get('user_id'), buf, data)
+
+    def _advance(self, user_id, buf, data):
+        """True nếu sự kiện nối tiếp sự kiện trước của user; lỡ sự kiện thì bỏ bộ đệm của user."""
+        seq, stream = data.get('seq'), data.get('stream')
+        if seq is None or (buf.seq is not None and (stream != buf.stream or seq != buf.seq + 1)):
+            self._drop(user_id)
+            self.gaps += 1
+            return False
+        buf.stream, buf.seq = stream, seq
+        return True
+
+    def _ring(self, buf, sensor_index):
+        ring = buf.rings.get(sensor_index)
+        if ring is None and sensor_index is not None:
+            ring = buf.rings[sensor_index] = SensorRing(self.capacity, buf.floor)
+            self._bytes += self.capacity * ROW_BYTES
+            self._evict()
+        return ring
+
+    def _drop(self, user_id):
+        buf = self._users.pop(user_id, None)
+        if buf is not None:
+            self._bytes -= len(buf.rings) * self.capacity * ROW_BYTES
+
+    def _evict(self):
+        # Luôn giữ user đọc gần nhất (cuối OrderedDict)
+        while self._bytes > self.max_bytes and len(self._users) > 1:
+            user_id = next(iter(self._users))
+            self._drop(user_id)
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
+    def latest(self, user_id, limit, start=None, end=None, sensor_index=None, sensor_count=1):
+        """
+        Trang đầu (mới -> cũ) như fetch_readings_page: (list[ReadingRow], next_cursor),
+        hoặc None nếu bộ đệm chưa phủ khoảng cần lấy.
+        sensor_count: số cảm biến của user, để lần nạp DB lấy đủ `capacity` mẫu mỗi cảm biến.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            buf = self._users.get(user_id)
+            if buf is None:
+                self._users[user_id] = _UserBuffer()
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            need_warm = not buf.warmed and time.monotonic() - buf.created >= self.settle_seconds
+            boundary = buf.first_live
+            per_frame = max(sensor_count or 1, len(buf.rings))
+            want = self.capacity * per_frame
+        if need_warm:
+            self._warm(user_id, boundary, want, per_frame)
+
+        with self._lock:
+            buf = self._users.get(user_id)
+            page = self._page(buf, limit, start, end, sensor_index) if buf is not None and buf.warmed else None
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return page
+
+    def _warm(self, user_id, boundary, want, sensor_count):
+        """Nạp phần lịch sử cũ hơn mẫu realtime đầu tiên bằng một truy vấn (index user_id, timestamp)."""
+        end = from_micros(boundary) if boundary is not None else None
+        rows = fetch_readings_page(user_id, want, end=end, sensor_count=sensor_count)[0]
+
+        per_sensor = {}
+        for r in reversed(rows):
+            per_sensor.setdefault(r.sensor_index, []).append((to_micros(r.timestamp), r.value, r.id_reading))
+        # Đủ `want` dòng thì DB có thể còn dòng cũ hơn: chỉ phủ từ dòng cũ nhất trở lên
+        floor = to_micros(rows[-1].timestamp) if len(rows) >= want else None
+
+        with self._lock:
+            buf = self._users.get(user_id)
+            if buf is None or buf.warmed:
+                return
+            buf.floor = floor
+            for ring in buf.rings.values():
+                ring.raise_floor(floor)
+            for sensor_index, samples in per_sensor.items():
+                t, v, i = (np.array(col) for col in zip(*samples))
+                self._ring(buf, sensor_index).prepend(t.astype(np.int64), v.astype(np.float64), i.astype(np.int64))
+            buf.warmed = True
+            self.warms += 1
+
+    def _page(self, buf, limit, start, end, sensor_index):
+        rings = [(idx, ring) for idx, ring in buf.rings.items() if sensor_index is None or idx == sensor_index]
+        floors = [ring.floor for _, ring in rings if ring.floor is not None]
+        if sensor_index is not None and not rings and buf.floor is not None:
+            floors.append(buf.floor)
+        floor = max(floors) if floors else None
+        start_us = to_micros(start) if start is not None else None
+        end_us = to_micros(end) if end is not None else None
+
+        parts_t, parts_v, parts_i, parts_s = [], [], [], []
+        for idx, ring in rings:
+            times, values, ids = ring.ordered()
+            lo = 0
+            if floor is not None:
+                lo = np.searchsorted(times, floor, side='right')
+            if start_us is not None:
+                lo = max(lo, np.searchsorted(times, start_us, side='left'))
+            hi = np.searchsorted(times, end_us, side='left') if end_us is not None else len(times)
+            if hi > lo:
+                parts_t.append(times[lo:hi])
+                parts_v.append(values[lo:hi])
+                parts_i.append(ids[lo:hi])
+                parts_s.append(np.full(hi - lo, idx, dtype=np.int64))
+
+        # Khoảng cần lấy bắt đầu dưới floor: chỉ đủ nếu có hơn `limit` dòng phía trên floor
+        window_covered = floor is None or (start_us is not None and start_us > floor)
+        count = sum(len(p) for p in parts_t)
+        if not window_covered and count <= limit:
+            return None
+        if not count:
+            return [], None
+
+        times = np.concatenate(parts_t)
+        sensors = np.concatenate(parts_s)
+        # Cùng thứ tự với DB: timestamp giảm dần, rồi id (= thứ tự cảm biến trong frame) giảm dần
+        order = np.lexsort((sensors, times))[::-1][:limit + 1]
+        values = np.concatenate(parts_v)[order]
+        ids = np.concatenate(parts_i)[order]
+        times, sensors = times[order], sensors[order]
+
+        next_cursor = None
+        n = len(order)
+        if n > limit:
+            n = limit
+            if ids[n - 1] >= 0:
+                next_cursor = encode_cursor(from_micros(times[n - 1]), int(ids[n - 1]))
+            else:
+                # Không biết id: cắt trang ở ranh giới thời gian, trang sau lấy mọi dòng <= ranh giới
+                boundary = times[n]
+                while n and times[n - 1] == boundary:
+                    n -= 1
+                if not n:
+                    return None
+                next_cursor = encode_cursor(from_micros(boundary), _MAX_ID)
+
+        rows = [ReadingRow(i if i >= 0 else None, s, v, _EPOCH + timedelta(microseconds=t))
+                for i, s, v, t in zip(ids[:n].tolist(), sensors[:n].tolist(),
+                                      values[:n].tolist(), times[:n].tolist())]
+        return rows, next_cursor
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'users': len(self._users),
+                'rings': sum(len(b.rings) for b in self._users.values()),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'fed': self.fed,
+                'warms': self.warms,
+                'evictions': self.evictions,
+                'gaps': self.gaps,
+            }
+
+
+reading_buffer = ReadingBuffer()
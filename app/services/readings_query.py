@@ -0,0 +1,119 @@
+# File: app/services/readings_query.py
+import base64
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, tuple_
+
+from app.models.sensor_model import DataReadings, DataFrames
+from app.services import frame_store
+from app.services.partitions import raw_sources
+
+# Một dòng dữ liệu đọc dạng tuple cột (không tạo ORM object)
+ReadingRow = namedtuple('ReadingRow', 'id_reading sensor_index value timestamp')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, id_reading):
+    """Cursor mờ (opaque) cho phân trang keyset theo (timestamp, id_reading)."""
+    raw = f"{timestamp.isoformat()}|{id_reading}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ts, id_reading = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(ts), int(id_reading)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def fetch_readings_page(user_id, limit, start=None, end=None, sensor_index=None, cursor=None,
+                        sensor_count=None):
+    """
+    Lấy một trang dữ liệu mới nhất -> cũ nhất của user.
+
+    Phân trang keyset: trang sau bắt đầu ngay sau (timestamp, id_reading) của
+    dòng cuối trang trước, nên dùng thẳng index (user_id[, sensor_index], timestamp)
+    thay vì OFFSET -> các trang cũ không chậm dần khi bảng lớn lên.
+    sensor_count (số cảm biến của user) chỉ dùng khi đọc DataFrames.
+    Khi phân vùng theo thời gian, đọc lần lượt phân vùng mới -> cũ tới khi đủ
+    trang (các phân vùng không giao nhau nên cursor vẫn đúng).
+    Trả về (list[ReadingRow], next_cursor hoặc None).
+    """
+    cur = decode_cursor(cursor) if cursor else None
+    upper = end
+    if cur is not None and (upper is None or cur[0] < upper):
+        upper = cur[0] + timedelta(microseconds=1)
+    fetch = _frames_page if frame_store.reads_frames() else _rows_page
+
+    # Lấy dư 1 dòng để biết còn trang sau hay không
+    rows = []
+    for source in raw_sources(start, upper, newest_first=True):
+        rows += fetch(source, user_id, limit + 1 - len(rows), start, end, sensor_index, cur, sensor_count)
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id_reading)
+    return rows, next_cursor
+
+
+def _rows_page(source, user_id, n, start, end, sensor_index, cur, sensor_count):
+    """Tối đa n dòng DataReadings mới -> cũ, sau cursor `cur`."""
+    m = DataReadings
+    stmt = select(m.id_reading, m.sensor_index, m.value, m.timestamp).where(m.user_id == user_id)
+    if sensor_index is not None:
+        stmt = stmt.where(m.sensor_index == sensor_index)
+    if start is not None:
+        stmt = stmt.where(m.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(m.timestamp < end)
+    if cur is not None:
+        stmt = stmt.where(tuple_(m.timestamp, m.id_reading) < tuple_(*cur))
+    stmt = stmt.order_by(m.timestamp.desc(), m.id_reading.desc()).limit(n)
+    return [ReadingRow(*r) for r in source.execute(stmt)]
+
+
+def _frames_page(source, user_id, n, start, end, sensor_index, cur, sensor_count):
+    """
+    Như _rows_page nhưng đọc DataFrames (READINGS_STORAGE = 'frames').
+    id của mỗi giá trị = id_frame * FRAME_ID_SPAN + sensor_index nên cursor
+    (timestamp, id) vẫn dùng chung định dạng. Số frame cần đọc ước theo
+    sensor_count (số giá trị mỗi frame); thiếu thì đọc tiếp, gấp đôi mỗi lượt.
+    """
+    m = DataFrames
+    stmt = frame_store.frame_select().where(m.user_id == user_id)
+    if sensor_index is not None:
+        stmt = stmt.where(m.sensor_count >= sensor_index)
+    if start is not None:
+        stmt = stmt.where(m.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(m.timestamp < end)
+
+    per_frame = 1 if sensor_index is not None else max(sensor_count or 1, 1)
+    # +1 frame: frame chứa cursor chỉ còn một phần giá trị
+    count = -(-n // per_frame) + 1
+    rows = []
+    after = None
+    while True:
+        page = stmt
+        if after is not None:
+            page = page.where(tuple_(m.timestamp, m.id_frame) < after)
+        elif cur is not None:
+            page = page.where(tuple_(m.timestamp, m.id_frame) <= tuple_(cur[0], cur[1] // frame_store.FRAME_ID_SPAN))
+        page = page.order_by(m.timestamp.desc(), m.id_frame.desc()).limit(count)
+        frames = [frame_store.FrameRow(*r) for r in source.execute(page)]
+        rows += [ReadingRow(*r) for r in
+                 frame_store.explode_frames(frames, sensor_index, before=cur, limit=n - len(rows))]
+        if len(rows) >= n or len(frames) < count:
+            return rows
+        after = tuple_(frames[-1].timestamp, frames[-1].id_frame)
+        count *= 2
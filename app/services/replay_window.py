@@ -0,0 +1,107 @@
+# File: app/services/replay_window.py
+import threading
+from collections import OrderedDict, deque
+
+
+class _UserWindow:
+    __slots__ = ('stream', 'events')
+
+    def __init__(self, size):
+        self.stream = None
+        self.events = deque(maxlen=size)  # (seq, event, data), seq liên tục tăng dần
+
+
+class ReplayWindow:
+    """
+    Cửa sổ phát lại sự kiện realtime gần nhất của mỗi user (đã đánh số
+    stream/seq bởi collector, xem collector/live_sequence.py).
+
+    Trình duyệt kết nối lại gửi (stream, seq) cuối cùng đã thấy và nhận một
+    lô các sự kiện bị lỡ, thay vì tải lại trang. Chỉ giữ cho user đang có
+    người xem (track khi join), tối đa `max_users` user (bỏ user lâu nhất),
+    mỗi user `size` sự kiện. Cửa sổ luôn liên tục: sự kiện bị mất trên bus
+    (seq nhảy cóc) hoặc collector khởi động lại (stream mới) làm cửa sổ bắt
+    đầu lại, các trình duyệt lỡ phần trước đó sẽ được yêu cầu tải lại.
+    """
+
+    def __init__(self, size=256, max_users=1000):
+        self.size = size
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> _UserWindow
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.resumed = 0
+        self.replayed = 0
+        self.resets = 0
+
+    def configure(self, size=256, max_users=1000):
+        with self._lock:
+            self.size = size
+            self.max_users = max_users
+            self._users.clear()
+
+    def track(self, user_id):
+        """Bắt đầu (hoặc tiếp tục) giữ sự kiện của user_id; gọi khi trình duyệt vào room."""
+        if self.size <= 0:
+            return
+        with self._lock:
+            if user_id in self._users:
+                self._users.move_to_end(user_id)
+                return
+            self._users[user_id] = _UserWindow(self.size)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def record(self, user_id, event, data):
+        """Ghi một sự kiện đã phát xuống room (bỏ qua nếu không có seq hoặc user không được xem)."""
+        seq = data.get('seq')
+        if seq is None:
+            return
+        with self._lock:
+            window = self._users.get(user_id)
+            if window is None:
+                return
+            events = window.events
+            if window.stream != data.get('stream'):
+                window.stream = data.get('stream')
+                events.clear()
+            elif events and seq <= events[-1][0]:
+                return  # trùng lặp
+            elif events and seq != events[-1][0] + 1:
+                events.clear()  # mất sự kiện trên bus: bắt đầu lại cửa sổ
+            events.append((seq, event, data))
+            self.recorded += 1
+
+    def since(self, user_id, stream, seq):
+        """
+        Các sự kiện sau (stream, seq) dạng list [event, data] theo thứ tự, hoặc
+        None nếu cửa sổ không còn phủ đoạn bị lỡ (trình duyệt phải tải lại).
+        """
+        if self.size <= 0:
+            return []  # tắt: không phát lại, trình duyệt chỉ vào lại room
+        with self._lock:
+            self.resumed += 1
+            window = self._users.get(user_id)
+            events = window.events if window is not None else None
+            if not events or stream != window.stream or seq + 1 < events[0][0]:
+                self.resets += 1
+                return None
+            missed = [[event, data] for s, event, data in events if s > seq]
+            self.replayed += len(missed)
+            return missed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'events': sum(len(w.events) for w in self._users.values()),
+                'size': self.size,
+                'recorded': self.recorded,
+                'resumed': self.resumed,
+                'replayed': self.replayed,
+                'resets': self.resets,
+            }
+
+
+# Mỗi tiến trình Web giữ cửa sổ riêng (sự kiện từ bus đi tới đúng tiến trình này)
+replay_window = ReplayWindow()
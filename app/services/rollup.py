@@ -0,0 +1,349 @@
+# File: app/services/rollup.py
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, func
+
+from app import db
+from app.models.sensor_model import DataReadings, DataFrames
+from app.services import frame_store
+from app.services.partitions import reading_partitions, raw_sources, keyed_raw_sources
+from app.models.rollup_model import ReadingRollup1m, ReadingRollup1h, ReadingRollup1d, RollupState, RollupCursor
+
+# Độ phân giải: tên, số giây mỗi bucket, model lưu trữ (None = dữ liệu thô)
+Level = namedtuple('Level', 'name seconds model')
+
+RAW = Level('raw', 1, None)
+LEVELS = (
+    Level('1m', 60, ReadingRollup1m),
+    Level('1h', 3600, ReadingRollup1h),
+    Level('1d', 86400, ReadingRollup1d),
+)
+ALL_LEVELS = (RAW,) + LEVELS
+
+# Một điểm của chuỗi thời gian trả về cho biểu đồ
+SeriesPoint = namedtuple('SeriesPoint', 'timestamp sensor_index min max avg count last')
+
+
+class SeriesRangeError(ValueError):
+    """Khoảng thời gian quá dài cho độ phân giải được yêu cầu (dữ liệu thô)."""
+
+
+def floor_time(ts, seconds):
+    """Làm tròn xuống đầu bucket (phút / giờ / ngày)."""
+    if seconds <= 1:
+        return ts.replace(microsecond=0)
+    if seconds == 60:
+        return ts.replace(second=0, microsecond=0)
+    if seconds == 3600:
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _watermark(name):
+    state = db.session.get(RollupState, name)
+    return state.watermark if state else None
+
+
+def _first_source_time(source):
+    if source is RAW:
+        # Phân vùng cũ nhất có dữ liệu (không phân vùng: chỉ db.session)
+        for executor in raw_sources():
+            if frame_store.reads_frames():
+                first = frame_store.first_frame_time(executor)
+            else:
+                first = executor.scalar(select(func.min(DataReadings.timestamp)))
+            if first is not None:
+                return first
+        return None
+    return db.session.scalar(select(func.min(source.model.bucket)))
+
+
+def _source_rows(source, start, end):
+    """Đọc dữ liệu nguồn dạng tuple cột (không tạo ORM object)."""
+    if source is RAW and frame_store.reads_frames():
+        for executor in raw_sources(start, end):
+            for user_id, sensor_index, ts, value in frame_store.iter_frame_values(start, end, source=executor):
+                yield user_id, sensor_index, ts, value, value, value, 1, value, ts
+    elif source is RAW:
+        stmt = select(DataReadings.user_id, DataReadings.sensor_index,
+                      DataReadings.timestamp, DataReadings.value)\
+            .where(DataReadings.timestamp >= start, DataReadings.timestamp < end)\
+            .order_by(DataReadings.timestamp)
+        for executor in raw_sources(start, end):
+            for user_id, sensor_index, ts, value in executor.execute(stmt).yield_per(5000):
+                yield user_id, sensor_index, ts, value, value, value, 1, value, ts
+    else:
+        m = source.model
+        stmt = select(m.user_id, m.sensor_index, m.bucket, m.min_val, m.max_val,
+                      m.sum_val, m.count, m.last_val, m.last_ts)\
+            .where(m.bucket >= start, m.bucket < end)\
+            .order_by(m.bucket)
+        yield from db.session.execute(stmt).yield_per(5000)
+
+
+def _aggregate(level, source, start, end):
+    """Gộp dữ liệu nguồn trong [start, end) theo bucket của `level`: {(user, sensor, bucket): [...]}."""
+    buckets = {}
+    for user_id, sensor_index, ts, mn, mx, sm, cnt, last, last_ts in _source_rows(source, start, end):
+        key = (user_id, sensor_index, floor_time(ts, level.seconds))
+        agg = buckets.get(key)
+        if agg is None:
+            buckets[key] = [mn, mx, sm, cnt, last, last_ts]
+            continue
+        if mn < agg[0]: agg[0] = mn
+        if mx > agg[1]: agg[1] = mx
+        agg[2] += sm
+        agg[3] += cnt
+        if last_ts >= agg[5]:
+            agg[4], agg[5] = last, last_ts
+    return buckets
+
+
+def _insert_buckets(level, buckets):
+    if buckets:
+        db.session.execute(insert(level.model), [
+            {'user_id': u, 'sensor_index': s, 'bucket': b,
+             'min_val': a[0], 'max_val': a[1], 'sum_val': a[2], 'count': a[3],
+             'last_val': a[4], 'last_ts': a[5]}
+            for (u, s, b), a in buckets.items()
+        ])
+
+
+def _rollup_window(level, source, start, end):
+    """Tổng hợp dữ liệu nguồn trong [start, end) vào bảng của `level`."""
+    buckets = _aggregate(level, source, start, end)
+    _insert_buckets(level, buckets)
+    return len(buckets)
+
+
+def _reroll_window(level, source, start, end):
+    """
+    Tính lại [start, end) (đã nằm dưới watermark) và ghi lại các bucket mà
+    nguồn nay có nhiều mẫu hơn: dòng đến trễ (phát lại spool, mất kết nối).
+    Chỉ ghi khi số mẫu tăng, nên nguồn đã bị xóa một phần theo retention
+    không làm hỏng bucket cũ. Trả về danh sách bucket đã ghi lại.
+    """
+    fresh = _aggregate(level, source, start, end)
+    if not fresh:
+        return []
+    m = level.model
+    stored = {(u, s, b): cnt for u, s, b, cnt in db.session.execute(
+        select(m.user_id, m.sensor_index, m.bucket, m.count)
+        .where(m.bucket >= start, m.bucket < end))}
+    changed = {key: agg for key, agg in fresh.items() if agg[3] > stored.get(key, 0)}
+    for u, s, b in changed:
+        if (u, s, b) in stored:
+            db.session.execute(delete(m).where(m.user_id == u, m.sensor_index == s, m.bucket == b))
+    _insert_buckets(level, changed)
+    return sorted({b for _, _, b in changed})
+
+
+def _late_raw_buckets(watermark, detect=True):
+    """
+    Bucket 1m có dòng thô đến trễ (phát lại spool, mất kết nối): dòng ghi sau
+    lần chạy trước (khóa chính > RollupCursor của nơi lưu) mà timestamp <
+    watermark. Chỉ đọc các dòng mới theo khoảng khóa chính, không quét lại dữ
+    liệu cũ. detect=False (lần chạy đầu) chỉ lấy mốc khóa chính hiện tại.
+    Trả về (list bucket, {nơi lưu: khóa chính lớn nhất}) - ghi con trỏ sau khi
+    đã tổng hợp tới watermark mới.
+    """
+    m = DataFrames if frame_store.reads_frames() else DataReadings
+    pk = m.__table__.primary_key.columns.values()[0]
+    known = dict(db.session.execute(select(RollupCursor.source, RollupCursor.last_id)).all())
+    buckets, cursors = set(), {}
+    for name, executor in keyed_raw_sources():
+        key = f"{m.__tablename__}:{name}"
+        top = executor.scalar(select(func.max(pk)))
+        if top is None:
+            continue
+        cursors[key] = top
+        # Nơi lưu mới (VD file phân vùng vừa tạo) khi đã có con trỏ khác: mọi dòng đều mới
+        last = known.get(key, 0 if known else None)
+        if not detect or last is None or last >= top:
+            continue
+        stmt = select(m.timestamp).distinct()\
+            .where(pk > last, pk <= top, m.timestamp < watermark)
+        for ts in executor.scalars(stmt):
+            buckets.add(floor_time(ts, LEVELS[0].seconds))
+    return sorted(buckets), cursors
+
+
+def _bucket_ranges(buckets, seconds):
+    """Gộp các bucket liền nhau thành các khoảng [start, end)."""
+    step = timedelta(seconds=seconds)
+    ranges = []
+    for b in buckets:
+        if ranges and ranges[-1][1] == b:
+            ranges[-1][1] = b + step
+        else:
+            ranges.append([b, b + step])
+    return ranges
+
+
+def update_rollups(now=None):
+    """
+    Cập nhật tăng dần các bảng 1m -> 1h -> 1d. Chỉ tổng hợp các bucket đã
+    đóng (kết thúc trước `now`); mỗi cấp lấy nguồn từ cấp mịn hơn ngay trước nó.
+    Dữ liệu thô đến trễ (timestamp < watermark, xem _late_raw_buckets) được
+    tính lại vào bucket 1m của nó, rồi lan lên các bucket 1h/1d chứa bucket đó.
+    Trả về dict {độ phân giải: số bucket đã ghi}.
+    """
+    now = now or datetime.now()
+    window = timedelta(seconds=current_app.config['ROLLUP_WINDOW_SECONDS'])
+    written = {}
+    cursors = {}
+    # Bucket của cấp trước vừa được tính lại do dữ liệu trễ
+    rerolled = []
+
+    for source, level in zip(ALL_LEVELS, LEVELS):
+        if source is RAW:
+            upper = floor_time(now, level.seconds)
+        else:
+            source_wm = _watermark(source.name)
+            if source_wm is None:
+                break
+            upper = floor_time(min(now, source_wm), level.seconds)
+
+        state = db.session.get(RollupState, level.name)
+        created = state is None
+        if created:
+            first = _first_source_time(source)
+            if first is None:
+                continue
+            state = RollupState(resolution=level.name, watermark=floor_time(first, level.seconds))
+            db.session.add(state)
+
+        total = 0
+        if source is RAW:
+            # Mốc khóa chính lấy trước khi tổng hợp: dòng ghi trong lúc chạy được xét ở lần sau
+            late, cursors = _late_raw_buckets(state.watermark, detect=not created)
+            rerolled = []
+            for start, end in _bucket_ranges(late, level.seconds):
+                rerolled += _reroll_window(level, source, start, end)
+        elif rerolled:
+            start = floor_time(rerolled[0], level.seconds)
+            rerolled = _reroll_window(level, source, start, state.watermark) \
+                if start < state.watermark else []
+        total += len(rerolled)
+        db.session.commit()
+        # Xử lý theo từng cửa sổ để lần chạy đầu (tồn đọng lớn) không ngốn RAM
+        while state.watermark < upper:
+            end = min(upper, floor_time(state.watermark + window, level.seconds))
+            if end <= state.watermark:
+                end = upper
+            total += _rollup_window(level, source, state.watermark, end)
+            state.watermark = end
+            db.session.commit()
+        if source is RAW:
+            for key, last_id in cursors.items():
+                db.session.merge(RollupCursor(source=key, last_id=last_id))
+            db.session.commit()
+        written[level.name] = total
+
+    db.session.commit()
+    return written
+
+
+def apply_retention(now=None):
+    """
+    Xóa dữ liệu cũ theo ROLLUP_RETENTION_DAYS. Một cấp chỉ bị xóa khi cấp
+    thô hơn đã tổng hợp xong phần đó (timestamp < watermark của cấp kế tiếp).
+    Dữ liệu thô phân vùng hết hạn theo cả file: phân vùng kết thúc trước
+    mốc xóa bị xóa file, phân vùng chứa mốc được giữ tới khi hết hạn hẳn.
+    """
+    now = now or datetime.now()
+    retention = current_app.config['ROLLUP_RETENTION_DAYS']
+    deleted = {}
+
+    for level, coarser in zip(ALL_LEVELS, LEVELS + (None,)):
+        days = retention.get(level.name)
+        if days is None:
+            continue
+        cutoff = now - timedelta(days=days)
+        if coarser is not None:
+            wm = _watermark(coarser.name)
+            if wm is None:
+                continue
+            cutoff = min(cutoff, wm)
+
+        if level is RAW:
+            q = DataReadings.query.filter(DataReadings.timestamp < cutoff)
+            # Dữ liệu thô dạng frame (READINGS_STORAGE = 'frames'/'both') hết hạn cùng lúc
+            deleted['frames'] = DataFrames.query.filter(DataFrames.timestamp < cutoff)\
+                .delete(synchronize_session=False)
+            if reading_partitions.enabled:
+                deleted['partitions'] = reading_partitions.drop_before(cutoff)
+        else:
+            q = level.model.query.filter(level.model.bucket < cutoff)
+        deleted[level.name] = q.delete(synchronize_session=False)
+
+    db.session.commit()
+    return deleted
+
+
+def choose_resolution(start, end, now=None):
+    """
+    Chọn độ phân giải mịn nhất sao cho số điểm mỗi cảm biến không vượt quá
+    ROLLUP_MAX_POINTS và dữ liệu của cấp đó còn được giữ tại thời điểm `start`.
+    Dữ liệu thô được coi như 1 mẫu/giây.
+    """
+    now = now or datetime.now()
+    span = max((end - start).total_seconds(), 1)
+    max_points = current_app.config['ROLLUP_MAX_POINTS']
+    retention = current_app.config['ROLLUP_RETENTION_DAYS']
+
+    for level in ALL_LEVELS:
+        days = retention.get(level.name)
+        if days is not None and start < now - timedelta(days=days):
+            continue
+        if span / level.seconds <= max_points:
+            return level
+    return LEVELS[-1]
+
+
+def get_series(user_id, start, end, sensor_index=None, resolution=None):
+    """
+    Lấy chuỗi dữ liệu của user trong [start, end) ở độ phân giải phù hợp.
+    Trả về (tên độ phân giải, list[SeriesPoint]) sắp xếp theo thời gian.
+    Chỉ định resolution='raw' cho khoảng dài hơn ROLLUP_RAW_MAX_SECONDS -> SeriesRangeError.
+    """
+    level = next((l for l in ALL_LEVELS if l.name == resolution), None) \
+        or choose_resolution(start, end)
+    max_raw = current_app.config['ROLLUP_RAW_MAX_SECONDS']
+    if level is RAW and (end - start).total_seconds() > max_raw:
+        raise SeriesRangeError(f"Dữ liệu thô chỉ lấy tối đa {max_raw} giây mỗi lần, hãy chọn độ phân giải khác")
+
+    if level is RAW and frame_store.reads_frames():
+        m = DataFrames
+        stmt = frame_store.frame_select()\
+            .where(m.user_id == user_id, m.timestamp >= start, m.timestamp < end)
+        if sensor_index is not None:
+            stmt = stmt.where(m.sensor_count >= sensor_index)
+        stmt = stmt.order_by(m.timestamp)
+        frames = [frame_store.FrameRow(*r) for executor in raw_sources(start, end) for r in executor.execute(stmt)]
+        points = [SeriesPoint(ts, idx, v, v, v, 1, v)
+                  for _, idx, v, ts in reversed(frame_store.explode_frames(frames[::-1], sensor_index))]
+        return level.name, points
+
+    if level is RAW:
+        m = DataReadings
+        stmt = select(m.timestamp, m.sensor_index, m.value)\
+            .where(m.user_id == user_id, m.timestamp >= start, m.timestamp < end)
+        if sensor_index is not None:
+            stmt = stmt.where(m.sensor_index == sensor_index)
+        stmt = stmt.order_by(m.timestamp)
+        points = [SeriesPoint(ts, idx, v, v, v, 1, v)
+                  for executor in raw_sources(start, end) for ts, idx, v in executor.execute(stmt)]
+        return level.name, points
+
+    m = level.model
+    stmt = select(m.bucket, m.sensor_index, m.min_val, m.max_val, m.sum_val, m.count, m.last_val)\
+        .where(m.user_id == user_id, m.bucket >= floor_time(start, level.seconds), m.bucket < end)
+    if sensor_index is not None:
+        stmt = stmt.where(m.sensor_index == sensor_index)
+    stmt = stmt.order_by(m.bucket)
+    points = [SeriesPoint(b, idx, mn, mx, sm / cnt, cnt, last)
+              for b, idx, mn, mx, sm, cnt, last in db.session.execute(stmt)]
+    return level.name, points
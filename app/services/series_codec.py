@@ -0,0 +1,113 @@
+# File: app/services/series_codec.py
+import gzip
+import json
+import struct
+import sys
+from array import array
+
+# Định dạng trả về của API dữ liệu theo dõi
+FORMAT_JSON = 'json'          # danh sách dict như cũ
+FORMAT_COLUMNAR = 'columnar'  # mảng song song theo từng cảm biến (JSON)
+FORMAT_F32 = 'f32'            # nhị phân: int64 epoch-ms + float32 giá trị
+
+MIME_COLUMNAR = 'application/vnd.sensor.columnar+json'
+MIME_F32 = 'application/vnd.sensor.f32'
+
+_MIME_TO_FORMAT = {
+    MIME_COLUMNAR: FORMAT_COLUMNAR,
+    MIME_F32: FORMAT_F32,
+    'application/octet-stream': FORMAT_F32,
+}
+
+# Header file nhị phân: magic, phiên bản, số cảm biến
+F32_MAGIC = b'SRC1'
+_F32_HEADER = struct.Struct('<4sBH')
+# Mỗi cảm biến: sensor_index, số điểm
+_F32_SERIES = struct.Struct('<HI')
+
+
+def negotiate_format(format_arg, accept_mimetypes):
+    """Chọn định dạng từ tham số `format`, nếu không có thì theo header Accept."""
+    if format_arg in (FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_F32):
+        return format_arg
+    best = accept_mimetypes.best_match(list(_MIME_TO_FORMAT) + ['application/json'])
+    return _MIME_TO_FORMAT.get(best, FORMAT_JSON)
+
+
+def to_columns(rows):
+    """
+    Gom các dòng (sensor_index, value, timestamp) thành mảng song song theo
+    cảm biến, sắp xếp thời gian tăng dần: {sensor_index: (epoch_ms[], values[])}.
+    """
+    series = {}
+    # rows đến theo thứ tự mới -> cũ, duyệt ngược để ra tăng dần
+    for row in reversed(rows):
+        cols = series.get(row.sensor_index)
+        if cols is None:
+            cols = series[row.sensor_index] = (array('q'), array('d'))
+        cols[0].append(int(row.timestamp.timestamp() * 1000))
+        cols[1].append(row.value)
+    return series
+
+
+def encode_columnar(series, extra=None):
+    body = {
+        'status': 'success',
+        'format': FORMAT_COLUMNAR,
+        'series': {
+            str(idx): {'t': ts.tolist(), 'v': vals.tolist()}
+            for idx, (ts, vals) in sorted(series.items())
+        },
+    }
+    if extra:
+        body.update(extra)
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def encode_f32(series):
+    """
+    Định dạng nhị phân little-endian:
+        'SRC1' | uint8 version=1 | uint16 số cảm biến
+        lặp lại: uint16 sensor_index | uint32 n | int64[n] epoch-ms | float32[n] giá trị
+    """
+    parts = [_F32_HEADER.pack(F32_MAGIC, 1, len(series))]
+    for idx, (ts, vals) in sorted(series.items()):
+        values = array('f', vals)
+        ts = array('q', ts)
+        if sys.byteorder == 'big':
+            ts.byteswap()
+            values.byteswap()
+        parts.append(_F32_SERIES.pack(idx, len(ts)))
+        parts.append(ts.tobytes())
+        parts.append(values.tobytes())
+    return b''.join(parts)
+
+
+def decode_f32(data):
+    """Giải mã ngược encode_f32 (dùng cho kiểm tra / client Python)."""
+    magic, version, count = _F32_HEADER.unpack_from(data, 0)
+    if magic != F32_MAGIC:
+        raise ValueError('Sai định dạng SRC1')
+    offset = _F32_HEADER.size
+    series = {}
+    for _ in range(count):
+        idx, n = _F32_SERIES.unpack_from(data, offset)
+        offset += _F32_SERIES.size
+        ts = array('q')
+        ts.frombytes(data[offset:offset + 8 * n])
+        offset += 8 * n
+        values = array('f')
+        values.frombytes(data[offset:offset + 4 * n])
+        offset += 4 * n
+        if sys.byteorder == 'big':
+            ts.byteswap()
+            values.byteswap()
+        series[idx] = (ts, values)
+    return series
+
+
+def maybe_gzip(payload, accept_encodings, min_bytes, level=6):
+    """Nén gzip nếu client chấp nhận và payload đủ lớn. Trả về (payload, đã nén?)."""
+    if len(payload) < min_bytes or 'gzip' not in accept_encodings:
+        return payload, False
+    return gzip.compress(payload, compresslevel=level), True
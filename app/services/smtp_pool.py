@@ -0,0 +1,139 @@
+# File: app/services/smtp_pool.py
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+
+class _Session:
+    """Một phiên SMTP đã STARTTLS + đăng nhập, giữ lại giữa các lần gửi."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.smtp = None
+        self.last_used = 0.0
+        self.sent = 0
+
+    def connect(self):
+        pool = self.pool
+        smtp = smtplib.SMTP(pool.host, pool.port, timeout=pool.timeout)
+        try:
+            if pool.starttls:
+                smtp.starttls()
+            if pool.password:
+                smtp.login(pool.user, pool.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.sent = 0
+        with pool._lock:
+            pool.connects += 1
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+        self.smtp = None
+
+    def send(self, msg):
+        pool = self.pool
+        # Server thường tự cắt phiên nhàn rỗi lâu hoặc gửi quá nhiều thư: mở lại chủ động
+        if self.smtp is not None and (time.monotonic() - self.last_used > pool.max_idle
+                                      or self.sent >= pool.max_messages):
+            self.close()
+        if self.smtp is None:
+            self.connect()
+        self.smtp.send_message(msg)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Transport email cho Notifier: giữ `size` phiên SMTP đã đăng nhập thay vì
+    kết nối + STARTTLS + login cho từng thư như send_email cũ.
+
+    Gọi như hàm `pool(to, subject, body) -> bool` (một thư), hoặc
+    `pool.send_many([(to, subject, body), ...])` để gửi song song qua `size`
+    luồng. Phiên lỗi (server ngắt, timeout...) được đóng, kết nối lại và gửi lại
+    tối đa `retries` lần.
+    """
+
+    def __init__(self, host, port, user=None, password=None, starttls=True, size=4,
+                 timeout=30.0, retries=1, max_idle=240.0, max_messages=100):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self.retries = retries
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+
+        self._sessions = queue.Queue()
+        for _ in range(size):
+            self._sessions.put(_Session(self))
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp-pool")
+        self._lock = threading.Lock()
+
+        # Số liệu theo dõi
+        self.sent = 0
+        self.failed = 0
+        self.connects = 0
+        self.reconnects = 0
+
+    def _message(self, to_email, subject, body):
+        msg = MIMEText(body, "plain", "utf-8")
+        msg["From"] = self.user or ""
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        return msg
+
+    def __call__(self, to_email, subject, body):
+        msg = self._message(to_email, subject, body)
+        session = self._sessions.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    session.send(msg)
+                    with self._lock:
+                        self.sent += 1
+                    return True
+                except (smtplib.SMTPException, OSError) as e:
+                    session.close()
+                    if attempt < self.retries and not isinstance(e, smtplib.SMTPRecipientsRefused):
+                        with self._lock:
+                            self.reconnects += 1
+                        continue
+                    print(f"❌ Lỗi gửi email tới {to_email}: {e}")
+            with self._lock:
+                self.failed += 1
+            return False
+        finally:
+            self._sessions.put(session)
+
+    send = __call__
+
+    def send_many(self, messages):
+        """Gửi song song; trả về list bool theo đúng thứ tự `messages`."""
+        if len(messages) <= 1 or self.size <= 1:
+            return [self(*m) for m in messages]
+        return list(self._executor.map(lambda m: self(*m), messages))
+
+    def stats(self):
+        with self._lock:
+            return {"sent": self.sent, "failed": self.failed,
+                    "connects": self.connects, "reconnects": self.reconnects}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for _ in range(self.size):
+            self._sessions.get().close()
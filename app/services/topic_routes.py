@@ -0,0 +1,122 @@
+# File: app/services/topic_routes.py
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import select
+
+from app import db
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig
+from app.models.config_model import ConfigVersion
+from collector.alert_engine import AlertRules
+from collector.topic_trie import TopicTrie, covering_filters, is_wildcard, validate_filter
+
+# Ngưỡng của một cảm biến (tách khỏi ORM, không bị detached/expire)
+SensorThreshold = namedtuple('SensorThreshold', 'name unit min_val max_val hysteresis debounce max_rate')
+
+# Thông tin định tuyến của một topic; `rules` là ngưỡng đã biên dịch sang mảng NumPy
+TopicRoute = namedtuple('TopicRoute', 'user_id username sensor_count configs rules')
+
+
+class RoutingSnapshot:
+    """
+    Ảnh chụp bất biến: topic filter -> TopicRoute tại một version cấu hình.
+    Topic cụ thể tra bằng dict; filter có '+'/'#' nằm trong trie nên mỗi
+    message chỉ tốn O(độ sâu topic) dù có hàng nghìn filter.
+    """
+
+    def __init__(self, version, routes):
+        self.version = version
+        self.routes = MappingProxyType(routes)
+        self._trie = TopicTrie()
+        for topic_filter, route in routes.items():
+            if is_wildcard(topic_filter):
+                self._trie.add(topic_filter, route)
+        self._subscriptions = frozenset(covering_filters(routes))
+
+    def get(self, topic):
+        return self.routes.get(topic)
+
+    def match(self, topic):
+        """Mọi route nhận message của topic cụ thể này (chính xác + wildcard)."""
+        exact = self.routes.get(topic)
+        matched = [exact] if exact is not None else []
+        if len(self._trie):
+            matched.extend(route for _, route in self._trie.match(topic))
+        return matched
+
+    def topics(self):
+        return set(self.routes)
+
+    def subscriptions(self):
+        """Tập filter tối thiểu cần SUBSCRIBE (bỏ filter bị filter khác bao trùm)."""
+        return set(self._subscriptions)
+
+
+def load_snapshot(owns=None):
+    """
+    Nạp toàn bộ bảng định tuyến bằng MỘT truy vấn join (thay cho N+1).
+    `owns(topic_filter) -> bool` (nếu có) chỉ giữ các topic thuộc worker hiện tại.
+    """
+    version = ConfigVersion.current()
+    stmt = select(Users.id_user, Users.username, Users.sub_topic, Users.sensor_count,
+                  SensorConfig.sensor_index, SensorConfig.name, SensorConfig.unit,
+                  SensorConfig.min_val, SensorConfig.max_val, SensorConfig.hysteresis,
+                  SensorConfig.debounce, SensorConfig.max_rate)\
+        .outerjoin(SensorConfig, SensorConfig.user_id == Users.id_user)\
+        .where(Users.sub_topic.isnot(None), Users.sub_topic != '', Users.sensor_count > 0)\
+        .order_by(Users.id_user)
+
+    routes = {}
+    configs_by_user = {}
+    for (user_id, username, topic, sensor_count, idx, name, unit,
+         min_val, max_val, hysteresis, debounce, max_rate) in db.session.execute(stmt):
+        configs = configs_by_user.get(user_id)
+        if configs is None:
+            try:
+                validate_filter(topic)
+            except ValueError as e:
+                # Dữ liệu cũ có thể chứa filter sai cú pháp: bỏ qua, không làm hỏng cả bảng
+                print(f"⚠️ Bỏ qua topic '{topic}' của {username}: {e}")
+                configs_by_user[user_id] = {}
+                continue
+            configs = configs_by_user[user_id] = {}
+            if owns is None or owns(topic):
+                routes[topic] = (user_id, username, sensor_count, configs)
+        if idx is not None:
+            configs[idx] = SensorThreshold(name, unit, min_val, max_val, hysteresis, debounce, max_rate)
+
+    frozen = {
+        topic: TopicRoute(user_id, username, sensor_count, MappingProxyType(configs),
+                          AlertRules.compile(configs, sensor_count))
+        for topic, (user_id, username, sensor_count, configs) in routes.items()
+    }
+    return RoutingSnapshot(version, frozen)
+
+
+class TopicRouter:
+    """
+    Giữ snapshot định tuyến hiện tại. Việc thay snapshot là một phép gán
+    tham chiếu (nguyên tử), nên on_message luôn đọc một bản nhất quán mà
+    không cần khóa.
+    """
+
+    def __init__(self, owns=None):
+        self.owns = owns
+        self.snapshot = RoutingSnapshot(-1, {})
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """
+        Nạp lại nếu version cấu hình đã đổi. Trả về (filter cần subscribe thêm,
+        filter cần unsubscribe) so với snapshot cũ, hoặc None nếu không đổi.
+        """
+        with self._refresh_lock:
+            old = self.snapshot
+            if not force and ConfigVersion.current() == old.version:
+                return None
+            new = load_snapshot(self.owns)
+            self.snapshot = new
+            old_subs, new_subs = old.subscriptions(), new.subscriptions()
+            return new_subs - old_subs, old_subs - new_subs
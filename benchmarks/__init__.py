@@ -0,0 +1,2 @@
+# File: benchmarks/__init__.py
+# Các script đo hiệu năng. Chạy từ thư mục gốc: python -m benchmarks.<tên_script>
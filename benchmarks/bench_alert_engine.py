@@ -0,0 +1,97 @@
+# File: benchmarks/bench_alert_engine.py
+# So sánh kiểm tra ngưỡng từng giá trị (vòng if cũ của on_message) với
+# AlertEngine vector hóa theo frame và theo lô frame.
+# Chạy: python -m benchmarks.bench_alert_engine --users 1000 --sensors 8 --frames 50
+import argparse
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from collector.alert_engine import AlertEngine, AlertRules
+
+Threshold = namedtuple('Threshold', 'min_val max_val hysteresis debounce max_rate')
+
+
+def make_configs(sensors, rnd, advanced):
+    configs = {}
+    for idx in range(1, sensors + 1):
+        configs[idx] = Threshold(20.0, 80.0,
+                                 2.0 if advanced else None,
+                                 3 if advanced else None,
+                                 25.0 if advanced else None)
+    return configs
+
+
+def python_loop(configs, frame):
+    """Cách cũ: mỗi giá trị một chuỗi if (chỉ Min/Max)."""
+    alerts = []
+    for i, real_val in enumerate(frame):
+        config = configs.get(i + 1)
+        if config:
+            alert_msg = None
+            if config.min_val is not None and real_val < config.min_val:
+                alert_msg = f"Thấp hơn Min ({config.min_val})"
+            elif config.max_val is not None and real_val > config.max_val:
+                alert_msg = f"Cao hơn Max ({config.max_val})"
+            if alert_msg:
+                alerts.append((i, alert_msg))
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--sensors', type=int, default=8)
+    parser.add_argument('--frames', type=int, default=50, help="số frame mỗi user")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    np_rnd = np.random.default_rng(1)
+    n_values = args.users * args.sensors * args.frames
+    data = np_rnd.uniform(0, 100, size=(args.users, args.frames, args.sensors)).round(1)
+    frames = data.tolist()
+    times = np.arange(args.frames, dtype=np.float64)
+    print(f"{args.users} user × {args.frames} frame × {args.sensors} cảm biến = {n_values:,} giá trị")
+
+    for advanced in (False, True):
+        label = "min/max + hysteresis/debounce/rate" if advanced else "min/max"
+        configs = [make_configs(args.sensors, rnd, advanced) for _ in range(args.users)]
+        rules = [AlertRules.compile(c, args.sensors) for c in configs]
+        print(f"\n--- Quy tắc: {label} ---")
+
+        if not advanced:
+            t0 = time.perf_counter()
+            py_alerts = 0
+            for u in range(args.users):
+                for frame in frames[u]:
+                    py_alerts += len(python_loop(configs[u], frame))
+            elapsed = time.perf_counter() - t0
+            print(f"vòng if Python   : {n_values / elapsed:12,.0f} giá trị/s  ({py_alerts} cảnh báo)")
+
+        engine = AlertEngine()
+        t0 = time.perf_counter()
+        frame_alerts = 0
+        for u in range(args.users):
+            for f in range(args.frames):
+                # on_message truyền list giá trị của một frame
+                frame_alerts += len(engine.evaluate(u, rules[u], frames[u][f], times[f])[0])
+        elapsed = time.perf_counter() - t0
+        print(f"engine theo frame: {n_values / elapsed:12,.0f} giá trị/s  ({frame_alerts} cảnh báo)")
+
+        engine = AlertEngine()
+        t0 = time.perf_counter()
+        batch_alerts = 0
+        for u in range(args.users):
+            batch_alerts += len(engine.evaluate(u, rules[u], data[u], times)[0])
+        elapsed = time.perf_counter() - t0
+        print(f"engine theo lô   : {n_values / elapsed:12,.0f} giá trị/s  ({batch_alerts} cảnh báo)")
+
+        assert frame_alerts == batch_alerts, "đánh giá theo frame và theo lô phải cho cùng kết quả"
+        if not advanced:
+            assert batch_alerts == py_alerts, "engine phải tạo đúng các cảnh báo như vòng if cũ"
+
+
+if __name__ == '__main__':
+    main()
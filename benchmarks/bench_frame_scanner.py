@@ -0,0 +1,88 @@
+# File: benchmarks/bench_frame_scanner.py
+# Đo thông lượng tách frame 9 byte từ luồng TCP giả lập có nhiễu.
+# Chạy: python -m benchmarks.bench_frame_scanner --frames 20000 --corruption 0.05
+import argparse
+import random
+import time
+
+from collector.modbus import crc16, FrameScanner
+from benchmarks.bench_modbus import crc_bitwise
+
+
+def build_stream(n_frames, corruption, seed=1):
+    """
+    Sinh luồng n_frames frame hợp lệ; với xác suất `corruption` mỗi frame
+    bị chèn thêm 1-16 byte rác phía trước hoặc bị lật 1 bit (frame hỏng).
+    Trả về (stream, số frame hợp lệ mong đợi).
+    """
+    rnd = random.Random(seed)
+    out = bytearray()
+    valid = 0
+    for _ in range(n_frames):
+        body = bytes([1, 0x03, 0x04]) + rnd.getrandbits(32).to_bytes(4, 'big')
+        crc = crc16(body)
+        frame = bytearray(body + bytes([crc & 0xFF, crc >> 8]))
+        if rnd.random() < corruption:
+            if rnd.random() < 0.5:
+                out += bytes(rnd.getrandbits(8) for _ in range(rnd.randint(1, 16)))
+                valid += 1
+            else:
+                frame[rnd.randrange(3, 9)] ^= 1 << rnd.randrange(8)
+        else:
+            valid += 1
+        out += frame
+    return bytes(out), valid
+
+
+def chunks(stream, size):
+    for i in range(0, len(stream), size):
+        yield stream[i:i + size]
+
+
+def scan_legacy(stream, chunk_size):
+    """Vòng lặp cũ của connectIoT.main: cắt buffer từng byte khi sai CRC."""
+    found = 0
+    buffer = b""
+    for chunk in chunks(stream, chunk_size):
+        buffer += chunk
+        while len(buffer) >= 9:
+            if crc_bitwise(buffer[:9]):
+                found += 1
+                buffer = buffer[9:]
+            else:
+                buffer = buffer[1:]
+    return found
+
+
+def scan_new(stream, chunk_size):
+    scanner = FrameScanner(frame_len=9)
+    found = 0
+    for chunk in chunks(stream, chunk_size):
+        found += len(scanner.feed(chunk))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--corruption", type=float, nargs="+", default=[0.0, 0.01, 0.1, 0.5])
+    parser.add_argument("--chunk", type=int, default=1024)
+    args = parser.parse_args()
+
+    print(f"{'corrupt':>8} | {'MB':>6} | {'legacy frames/s':>16} | {'scanner frames/s':>16} | found (legacy/new/expected)")
+    for rate in args.corruption:
+        stream, expected = build_stream(args.frames, rate)
+
+        t0 = time.perf_counter()
+        legacy = scan_legacy(stream, args.chunk)
+        t1 = time.perf_counter()
+        new = scan_new(stream, args.chunk)
+        t2 = time.perf_counter()
+
+        print(f"{rate:>8.2f} | {len(stream) / 1e6:>6.2f} | {legacy / (t1 - t0):>16,.0f} | "
+              f"{new / (t2 - t1):>16,.0f} | {legacy}/{new}/{expected}")
+        assert legacy == new == expected, f"corrupt {rate}: legacy {legacy}, scanner {new}, expected {expected}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# File: benchmarks/bench_frame_storage.py
+# So sánh lưu dữ liệu thô một dòng mỗi cảm biến (DataReadings) với một dòng
+# mỗi frame (DataFrames, BLOB uint16) trên DB tạm: dung lượng (bảng + index),
+# tốc độ ghi theo lô như IngestWriter, tốc độ truy vấn trang mới nhất / chuỗi
+# thô, và kiểm tra flask migrate-frames cho kết quả giống hệt.
+# Chạy: python -m benchmarks.bench_frame_storage --users 10 --frames 20000 --sensors 8
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import func, select, text
+
+from app import app, db
+from app.models.sensor_model import DataReadings, DataFrames
+from app.services.frame_store import frame_row, migrate_readings_to_frames
+from app.services.readings_query import fetch_readings_page
+from app.services.rollup import get_series
+
+BATCH = 500
+
+
+def make_frames(users, frames, sensors, start):
+    rng = random.Random(1)
+    for f in range(frames):
+        t = start + timedelta(seconds=f)
+        for u in range(1, users + 1):
+            yield u, t, [rng.randrange(0, 1000) for _ in range(sensors)]
+
+
+def insert_batches(table, rows):
+    t0 = time.perf_counter()
+    for i in range(0, len(rows), BATCH):
+        with db.engine.begin() as conn:
+            conn.execute(table.insert(), rows[i:i + BATCH])
+    return time.perf_counter() - t0
+
+
+def table_bytes(table):
+    names = [table.name] + [index.name for index in table.indexes]
+    sql = text(f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({','.join(repr(n) for n in names)})")
+    with db.engine.connect() as conn:
+        return conn.execute(sql).scalar() or 0
+
+
+def timed(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def strip_ids(rows):
+    return [(r.sensor_index, r.value, r.timestamp) for r in rows]
+
+
+def all_pages(user_id, limit, **kwargs):
+    rows, cursor = fetch_readings_page(user_id, limit, **kwargs)
+    while cursor:
+        page, cursor = fetch_readings_page(user_id, limit, cursor=cursor, **kwargs)
+        rows += page
+    return rows
+
+
+def migrate_after_both(start, sensors, frames=2000):
+    """
+    Chuyển đổi như tài liệu hướng dẫn: lịch sử chỉ có DataReadings, collector
+    chạy 'both' (ghi cả dòng và frame) một thời gian, rồi mới migrate-frames.
+    """
+    user_id = 1000
+    rng = random.Random(2)
+    samples = [(start + timedelta(seconds=i), [rng.randrange(0, 1000) for _ in range(sensors)])
+               for i in range(frames)]
+    old, live = samples[:frames // 2], samples[frames // 2:]
+    rows = lambda part: [{'user_id': user_id, 'sensor_index': s + 1, 'value': reg / 10.0, 'timestamp': t}
+                         for t, regs in part for s, reg in enumerate(regs)]
+    insert_batches(DataReadings.__table__, rows(old))
+    insert_batches(DataReadings.__table__, rows(live))
+    insert_batches(DataFrames.__table__, [frame_row(user_id, t, registers=regs) for t, regs in live])
+    migrated, moved = migrate_readings_to_frames(batch_size=997)
+    again = migrate_readings_to_frames(batch_size=997)
+    stored = db.session.scalar(select(func.count()).select_from(DataFrames).where(DataFrames.user_id == user_id))
+    ok = (migrated, moved) == (len(old), len(old) * sensors) and stored == frames and again == (0, 0)
+    print(f"{'✅' if ok else '❌'} migrate-frames sau giai đoạn 'both': {migrated:,} frame lịch sử đã chuyển "
+          f"(cần {len(old):,}), {stored:,}/{frames:,} frame, chạy lại chuyển thêm {again[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--sensors', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        start = datetime.now() - timedelta(seconds=args.frames)
+        samples = list(make_frames(args.users, args.frames, args.sensors, start))
+        rows = [{'user_id': u, 'sensor_index': s + 1, 'value': reg / 10.0, 'timestamp': t}
+                for u, t, regs in samples for s, reg in enumerate(regs)]
+        frames = [frame_row(u, t, registers=regs) for u, t, regs in samples]
+        print(f"{len(samples):,} frame x {args.sensors} cảm biến = {len(rows):,} giá trị")
+
+        # 1. Ghi theo lô (mỗi lô BATCH dòng / frame một transaction)
+        rows_s = insert_batches(DataReadings.__table__, rows)
+        t0 = time.perf_counter()
+        migrated, moved = migrate_readings_to_frames()
+        migrate_s = time.perf_counter() - t0
+        print(f"✅ migrate-frames: {moved:,} dòng -> {migrated:,} frame trong {migrate_s:.2f}s"
+              if (migrated, moved) == (len(samples), len(rows)) else "❌ migrate-frames sai số lượng")
+        migrate_after_both(start - timedelta(days=1), args.sensors)
+        extra = frames[:len(frames) // 10]
+        extra_rows = rows[:len(rows) // 10]
+        shift = lambda d: dict(d, timestamp=d['timestamp'] + timedelta(seconds=args.frames))
+        rows_extra_s = insert_batches(DataReadings.__table__, [shift(r) for r in extra_rows])
+        frames_extra_s = insert_batches(DataFrames.__table__, [shift(f) for f in extra])
+        print(f"Ghi {len(extra):,} frame : dòng {len(extra_rows) / rows_extra_s:>10,.0f} giá trị/s, "
+              f"frame {len(extra) * args.sensors / frames_extra_s:>10,.0f} giá trị/s "
+              f"(x{rows_extra_s / frames_extra_s:.1f})  [nạp ban đầu dạng dòng: {rows_s:.1f}s]")
+
+        # 2. Dung lượng
+        db.session.execute(text('ANALYZE'))
+        rows_bytes, frames_bytes = table_bytes(DataReadings.__table__), table_bytes(DataFrames.__table__)
+        print(f"Dung lượng: dòng {rows_bytes / 2**20:>8.1f} MB, frame {frames_bytes / 2**20:>8.1f} MB "
+              f"(x{rows_bytes / frames_bytes:.1f} nhỏ hơn)")
+
+        # 3. Truy vấn: cùng hàm, đổi READINGS_STORAGE
+        user_id = args.users // 2 or 1
+        end = start + timedelta(seconds=args.frames)
+        cases = [
+            ('trang mới nhất (50)', lambda: fetch_readings_page(user_id, 50, sensor_count=args.sensors)),
+            ('trang mới nhất cảm biến 1', lambda: fetch_readings_page(user_id, 50, sensor_index=1)),
+            ('chuỗi thô 1 giờ', lambda: get_series(user_id, end - timedelta(hours=1), end, resolution='raw')),
+        ]
+        results = {}
+        for mode in ('rows', 'frames'):
+            app.config['READINGS_STORAGE'] = mode
+            results[mode] = {
+                # sensor_count cố ý ước sai để kiểm tra trường hợp phải đọc thêm frame
+                'pages': strip_ids(all_pages(user_id, 97, start=end - timedelta(minutes=20), end=end, sensor_count=3)),
+                'sensor_pages': strip_ids(all_pages(user_id, 50, sensor_index=2, sensor_count=args.sensors)),
+                'series': get_series(user_id, end - timedelta(hours=1), end, resolution='raw')[1],
+                'times': [timed(fn, args.repeat) for _, fn in cases],
+            }
+        same = results['rows']['pages'] == results['frames']['pages'] and \
+            results['rows']['sensor_pages'] == results['frames']['sensor_pages'] and \
+            results['rows']['series'] == results['frames']['series']
+        print(f"{'✅' if same else '❌'} kết quả đọc dạng dòng và dạng frame giống nhau")
+        for (name, _), rows_us, frames_us in zip(cases, results['rows']['times'], results['frames']['times']):
+            print(f"  {name:<28} dòng {rows_us:>9.1f}µs  frame {frames_us:>9.1f}µs  (x{rows_us / frames_us:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# File: benchmarks/bench_modbus.py
+# So sánh bộ giải mã Modbus mới (collector.modbus) với cách cũ
+# (hex string + int(segment, 16) + CRC tính từng bit).
+# Chạy: python -m benchmarks.bench_modbus
+import random
+import timeit
+
+from collector.modbus import crc16, parse_read_response
+
+
+def build_frame(count, slave=1):
+    body = bytes([slave, 0x03, count * 2]) + bytes(random.getrandbits(8) for _ in range(count * 2))
+    crc = crc16(body)
+    return body + bytes([crc & 0xFF, crc >> 8])
+
+
+def crc_bitwise(data):
+    """CRC cũ của connectIoT.crc_ok (8 vòng lặp mỗi byte)."""
+    crc_calc = 0xFFFF
+    for pos in data[:-2]:
+        crc_calc ^= pos
+        for _ in range(8):
+            if (crc_calc & 0x0001) != 0:
+                crc_calc >>= 1
+                crc_calc ^= 0xA001
+            else:
+                crc_calc >>= 1
+    return crc_calc == (data[-2] | (data[-1] << 8))
+
+
+def decode_hex(payload, count):
+    """Cách cũ của connectMQTT.on_message (không kiểm tra CRC)."""
+    hex_string = payload.hex().upper()
+    if not hex_string.startswith("0103"): return None
+    byte_count = int(hex_string[4:6], 16)
+    if byte_count < count * 2: return None
+    values = []
+    for i in range(count):
+        segment = hex_string[6 + i*4 : 6 + (i+1)*4]
+        if len(segment) < 4: break
+        values.append(int(segment, 16))
+    return values
+
+
+def decode_hex_crc(payload, count):
+    if not crc_bitwise(payload): return None
+    return decode_hex(payload, count)
+
+
+def main(number=20000):
+    print(f"{'regs':>5} | {'hex (no CRC)':>14} | {'hex + CRC bit':>14} | {'modbus + CRC':>14} | speedup")
+    for count in (1, 8, 64):
+        frame = build_frame(count)
+        assert list(parse_read_response(frame, slave=1, min_registers=count)) == decode_hex(frame, count)
+
+        t_hex = timeit.timeit(lambda: decode_hex(frame, count), number=number)
+        t_hex_crc = timeit.timeit(lambda: decode_hex_crc(frame, count), number=number)
+        t_new = timeit.timeit(lambda: parse_read_response(frame, slave=1, min_registers=count), number=number)
+
+        us = lambda t: f"{t / number * 1e6:10.2f} µs"
+        print(f"{count:>5} | {us(t_hex):>14} | {us(t_hex_crc):>14} | {us(t_new):>14} | "
+              f"x{t_hex_crc / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
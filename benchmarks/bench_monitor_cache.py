@@ -0,0 +1,78 @@
+# File: benchmarks/bench_monitor_cache.py
+# Đo số request/giây của trang /monitor/<id> (Flask test client, DB tạm) khi
+# bật và tắt cache user/cấu hình cảm biến, kèm số câu SQL mỗi request.
+# Chạy: python -m benchmarks.bench_monitor_cache --requests 500 --sensors 8
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event
+
+from app import app, db
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig, DataReadings
+from app.services import model_cache
+
+
+def setup(sensors):
+    with app.app_context():
+        db.create_all()
+        user = Users(id_user=1, fullname='User 1', username='user1', email='user1@example.com',
+                     sub_topic='site/1/rtu', sensor_count=sensors)
+        user.password_hash = 'x'
+        db.session.add(user)
+        for s in range(1, sensors + 1):
+            db.session.add(SensorConfig(user_id=1, sensor_index=s, name=f'Cảm biến {s}',
+                                        unit='°C', min_val=0, max_val=50))
+        now = datetime.now()
+        db.session.add_all(DataReadings(user_id=1, sensor_index=1 + i % sensors, value=float(i),
+                                        timestamp=now - timedelta(seconds=i)) for i in range(200))
+        db.session.commit()
+
+
+def run(client, n, queries):
+    for _ in range(10):  # làm nóng (template, cache)
+        client.get('/monitor/1')
+    queries[0] = 0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        response = client.get('/monitor/1')
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - t0
+    return n / elapsed, queries[0] / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--sensors', type=int, default=8)
+    args = parser.parse_args()
+
+    setup(args.sensors)
+    queries = [0]
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*_args):
+            queries[0] += 1
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+
+    model_cache.configure(maxsize=0, ttl=0)
+    base_rps, base_q = run(client, args.requests, queries)
+    print(f"Không cache : {base_rps:>8,.1f} req/s, {base_q:.1f} câu SQL/request")
+
+    model_cache.configure(maxsize=app.config['MODEL_CACHE_SIZE'], ttl=app.config['MODEL_CACHE_TTL'])
+    rps, q = run(client, args.requests, queries)
+    print(f"Có cache    : {rps:>8,.1f} req/s, {q:.1f} câu SQL/request (x{rps / base_rps:.2f})")
+    print(f"  {model_cache.cache_stats()}")
+
+
+if __name__ == '__main__':
+    main()
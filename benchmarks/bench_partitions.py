@@ -0,0 +1,194 @@
+# File: benchmarks/bench_partitions.py
+# So sánh dữ liệu thô trong app.db với phân vùng theo tháng (READINGS_PARTITION_DIR)
+# trên DB tạm: (1) độ trễ transaction của admin (sửa user) trong lúc một tiến
+# trình collector ghi liên tục các lô lớn qua IngestWriter, (2) thời gian xóa
+# dữ liệu hết hạn: DELETE + VACUUM so với xóa file phân vùng. Kiểm tra thêm:
+# flask partition-readings chạy lại sau khi dừng giữa chừng không chép trùng,
+# file phân vùng chưa xóa được (Windows, còn ATTACH) được xóa ở lần sau.
+# Chạy: python -m benchmarks.bench_partitions --seconds 5 --batch 2000 --rows 300000
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event, text, select, func
+
+from app import app, db
+from app.models.user_model import Users
+from app.models.sensor_model import DataReadings
+from app.models.alert_model import AlertEvent
+from app.services import partitions
+from app.services.partitions import reading_partitions, move_to_partitions
+from collector.ingest_writer import IngestWriter
+
+
+def _pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA busy_timeout=10000")
+    cur.close()
+
+
+def collector(stop, batch, partitioned):
+    """Tiến trình collector giả lập: ghi lô `batch` dòng liên tục tới khi stop."""
+    with app.app_context():
+        db.engine.dispose(close=False)
+        writer = IngestWriter(db.engine, DataReadings.__table__, AlertEvent.__table__,
+                              partitions=reading_partitions if partitioned else None)
+        i = 0
+        while not stop.is_set():
+            now = datetime.now()
+            rows = [{'user_id': 1 + n % 10, 'sensor_index': 1 + n % 8, 'value': float(n),
+                     'timestamp': now + timedelta(microseconds=i * batch + n)} for n in range(batch)]
+            writer._flush(rows, [])
+            i += 1
+
+
+def admin_latency(seconds, batch, partitioned):
+    """Sửa user (một transaction trên app.db) lặp lại trong lúc collector ghi; trả về list ms."""
+    stop = multiprocessing.Event()
+    proc = multiprocessing.get_context('fork').Process(target=collector, args=(stop, batch, partitioned))
+    proc.start()
+    time.sleep(0.5)
+    samples = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        user = db.session.get(Users, 1)
+        user.fullname = f'User {len(samples)}'
+        db.session.commit()
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.01)
+    stop.set()
+    proc.join()
+    return samples
+
+
+def expiry(rows, partitioned):
+    """Nạp `rows` dòng của một tháng cũ rồi xóa hết hạn; trả về giây."""
+    month = datetime(2020, 1, 1)
+    data = [{'user_id': 1, 'sensor_index': 1 + n % 8, 'value': float(n),
+             'timestamp': month + timedelta(seconds=n)} for n in range(rows)]
+    cutoff = datetime(2020, 3, 1)
+    with db.engine.connect() as conn:
+        if partitioned:
+            groups = reading_partitions.split(data)
+            reading_partitions.attach(conn, groups, create=True)
+            for p, part in groups.items():
+                conn.execute(DataReadings.__table__.insert(), part, execution_options=reading_partitions.options(p))
+        else:
+            conn.execute(DataReadings.__table__.insert(), data)
+        conn.commit()
+
+    t0 = time.perf_counter()
+    if partitioned:
+        reading_partitions.drop_before(cutoff)
+    else:
+        with db.engine.connect() as conn:
+            conn.execute(DataReadings.__table__.delete().where(DataReadings.timestamp < cutoff))
+            conn.commit()
+            conn.execute(text('VACUUM'))
+    return time.perf_counter() - t0
+
+
+def check(ok, text):
+    print(f"  {'✅' if ok else '❌'} {text}")
+
+
+def move_resume(rows=3000):
+    """Chép vào phân vùng rồi dừng trước khi xóa khỏi DB chính (= move không remove), sau đó chạy lại với remove."""
+    reading_partitions.configure(directory=tempfile.mkdtemp())
+    month = datetime(2021, 1, 20)
+    with db.engine.connect() as conn:
+        conn.execute(DataReadings.__table__.insert(), [
+            {'user_id': 1, 'sensor_index': 1, 'value': float(n), 'timestamp': month + timedelta(minutes=10 * n)}
+            for n in range(rows)])
+        conn.commit()
+    copied = move_to_partitions(batch_size=700)
+    again = move_to_partitions(batch_size=700)
+    rerun = move_to_partitions(batch_size=1100, remove=True)
+    stored = 0
+    with db.engine.connect() as conn:
+        left = conn.scalar(select(func.count()).select_from(DataReadings.__table__),
+                           execution_options={'schema_translate_map': {None: 'main'}})
+        for p in reading_partitions.list():
+            reading_partitions.attach(conn, [p])
+            stored += conn.scalar(select(func.count()).select_from(DataReadings.__table__),
+                                  execution_options=reading_partitions.options(p))
+    print("Chuyển dữ liệu vào phân vùng, chạy lại sau khi dừng trước bước xóa:")
+    check(copied['data_readings'] == rows and again['data_readings'] == 0,
+          f"chép {copied['data_readings']}, chạy lại không remove chép thêm {again['data_readings']}")
+    check(rerun['data_readings'] == 0 and left == 0 and stored == rows,
+          f"chạy lại với remove (lô khác cỡ): chép thêm {rerun['data_readings']}, "
+          f"còn {left} dòng trong DB chính, {stored}/{rows} dòng trong phân vùng")
+
+
+def locked_drop():
+    """os.remove báo PermissionError (Windows, file còn ATTACH): bỏ qua, xóa lại ở lần sau."""
+    reading_partitions.configure(directory=tempfile.mkdtemp())
+    p = reading_partitions.partition_for(datetime(2020, 1, 1))
+    open(p.path, 'wb').close()
+    remove = os.remove
+
+    def locked(path):
+        raise PermissionError(13, 'The process cannot access the file', path)
+    partitions.os.remove = locked
+    try:
+        first = reading_partitions.drop_before(datetime(2020, 3, 1))
+    finally:
+        partitions.os.remove = remove
+    kept = os.path.exists(p.path)
+    second = reading_partitions.drop_before(datetime(2020, 3, 1))
+    print("Xóa phân vùng hết hạn khi file đang bị khóa:")
+    check(first == 0 and kept and second == 1 and not os.path.exists(p.path),
+          f"lần 1 xóa {first} (file còn: {kept}), lần 2 xóa {second}")
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {statistics.median(samples):>7.1f}ms  p99 {p99:>7.1f}ms  max {samples[-1]:>7.1f}ms  (n={len(samples)})"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--batch', type=int, default=2000, help="số dòng mỗi lô ghi của collector")
+    parser.add_argument('--rows', type=int, default=300000, help="số dòng của tháng hết hạn")
+    args = parser.parse_args()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', _pragmas)
+        db.create_all()
+        user = Users(id_user=1, fullname='User 1', username='user1', email='user1@example.com',
+                     sub_topic='site/1/rtu', sensor_count=8)
+        user.password_hash = 'x'
+        db.session.add(user)
+        db.session.commit()
+
+        move_resume()
+        locked_drop()
+
+        results = {}
+        for partitioned in (False, True):
+            reading_partitions.configure(directory=tempfile.mkdtemp() if partitioned else None)
+            name = 'phân vùng' if partitioned else 'app.db'
+            results[name] = admin_latency(args.seconds, args.batch, partitioned), expiry(args.rows, partitioned)
+            db.session.remove()
+
+        print(f"Sửa user trong lúc collector ghi lô {args.batch} dòng:")
+        for name, (samples, _) in results.items():
+            print(f"  {name:<10} {summary(samples)}")
+        print(f"Xóa {args.rows:,} dòng hết hạn:")
+        main_s, part_s = results['app.db'][1], results['phân vùng'][1]
+        print(f"  app.db     DELETE + VACUUM {main_s * 1000:>9.1f}ms")
+        print(f"  phân vùng  xóa file        {part_s * 1000:>9.1f}ms (x{main_s / part_s:.0f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# File: benchmarks/bench_reading_buffer.py
+# So sánh lấy trang dữ liệu mới nhất từ SQLite (fetch_readings_page) với bộ
+# đệm RAM ReadingBuffer (nạp từ DB + nhận frame realtime) trên DB tạm.
+# Chạy: python -m benchmarks.bench_reading_buffer --users 20 --frames 5000 --sensors 4
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, db
+from app.models.sensor_model import DataReadings
+from app.services.reading_buffer import ReadingBuffer
+from app.services.readings_query import fetch_readings_page
+
+
+def fill(users, frames, sensors):
+    rows = []
+    start = datetime.now() - timedelta(seconds=frames)
+    for f in range(frames):
+        t = start + timedelta(seconds=f)
+        for u in range(1, users + 1):
+            for s in range(1, sensors + 1):
+                rows.append({'user_id': u, 'sensor_index': s, 'value': (f + s) / 10.0, 'timestamp': t})
+    db.session.execute(DataReadings.__table__.insert(), rows)
+    db.session.commit()
+    return start + timedelta(seconds=frames)
+
+
+def timed(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--sensors', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        now = fill(args.users, args.frames, args.sensors)
+        print(f"{args.users * args.frames * args.sensors:,} dòng DataReadings, trang {args.limit} dòng")
+
+        buffer = ReadingBuffer(capacity=512, settle_seconds=0)
+        user_id = args.users // 2 or 1
+        buffer.latest(user_id, args.limit, sensor_count=args.sensors)
+        # Vài frame realtime mới (cũng ghi DB như collector) rồi nạp phần cũ
+        for f in range(10):
+            t = now + timedelta(seconds=f)
+            data = [{'index': s, 'value': s / 10.0} for s in range(1, args.sensors + 1)]
+            db.session.execute(DataReadings.__table__.insert(),
+                               [{'user_id': user_id, 'sensor_index': d['index'], 'value': d['value'],
+                                 'timestamp': t} for d in data])
+            buffer.feed({'user_id': user_id, 'ts': t.isoformat(), 'data': data, 'stream': 's', 'seq': f + 1})
+        db.session.commit()
+        assert buffer.latest(user_id, args.limit, sensor_count=args.sensors) is not None
+
+        cases = [
+            ('mới nhất, mọi cảm biến', {}),
+            ('mới nhất, cảm biến 1', {'sensor_index': 1}),
+            ('10 phút gần nhất', {'start': now - timedelta(minutes=10)}),
+        ]
+        for name, kwargs in cases:
+            db_us = timed(lambda: fetch_readings_page(user_id, args.limit, **kwargs), args.repeat)
+            buf_us = timed(lambda: buffer.latest(user_id, args.limit, **kwargs), args.repeat)
+            same = buffer.latest(user_id, args.limit, **kwargs)[0] == \
+                [r._replace(id_reading=None) if r.timestamp >= now else r
+                 for r in fetch_readings_page(user_id, args.limit, **kwargs)[0]]
+            print(f"{'✅' if same else '❌'} {name:<24} DB {db_us:>8.1f}µs  bộ đệm {buf_us:>7.1f}µs  (x{db_us / buf_us:.1f})")
+        print(f"  {buffer.stats()}")
+
+        # Bus bỏ mất seq 12 (buffer đầy): ring không còn đủ, phải đọc lại DB
+        t = now + timedelta(seconds=10)
+        buffer.feed({'user_id': user_id, 'ts': t.isoformat(), 'data': [], 'stream': 's', 'seq': 11})
+        buffer.feed({'user_id': user_id, 'ts': (t + timedelta(seconds=2)).isoformat(), 'data': [],
+                     'stream': 's', 'seq': 13})
+        gap = buffer.latest(user_id, args.limit, sensor_count=args.sensors)
+        print(f"{'✅' if gap is None and buffer.stats()['gaps'] == 1 else '❌'} mất sự kiện (seq 12): "
+              f"bỏ bộ đệm, đọc DB (gaps={buffer.stats()['gaps']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# File: benchmarks/bench_replay_resume.py
+# So sánh chi phí trình duyệt kết nối lại: tải lại trang /monitor/<id>
+# (follow_data) với resume_monitor (chỉ nhận lô sự kiện bị lỡ từ cửa sổ phát lại),
+# dùng Flask test client + SocketIO test client trên DB tạm.
+# Chạy: python -m benchmarks.bench_replay_resume --missed 30 --sensors 8
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, db, socketio
+from app.events import handle_sensor_update, handle_new_alert
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig, DataReadings
+from app.services.replay_window import replay_window
+from collector.live_sequence import LiveSequencer
+
+
+def setup(sensors):
+    with app.app_context():
+        db.create_all()
+        user = Users(id_user=1, fullname='User 1', username='user1', email='user1@example.com',
+                     sub_topic='site/1/rtu', sensor_count=sensors)
+        user.password_hash = 'x'
+        db.session.add(user)
+        for s in range(1, sensors + 1):
+            db.session.add(SensorConfig(user_id=1, sensor_index=s, name=f'Cảm biến {s}',
+                                        unit='°C', min_val=0, max_val=50))
+        now = datetime.now()
+        db.session.add_all(DataReadings(user_id=1, sensor_index=1 + i % sensors, value=float(i),
+                                        timestamp=now - timedelta(seconds=i)) for i in range(200))
+        db.session.commit()
+
+
+def frame(sequencer, sensors, i):
+    t = datetime.now()
+    return sequencer.stamp({
+        'user_id': 1, 'topic': 'site/1/rtu', 'device_id': 'site/1/rtu',
+        'time': t.strftime('%d/%m/%Y %H:%M:%S'), 'ts': t.isoformat(),
+        'data': [{'index': s, 'value': (i + s) / 10.0} for s in range(1, sensors + 1)],
+        'raw_hex': '01' * (5 + 2 * sensors),
+    })
+
+
+def timed(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--missed', type=int, default=30, help="số sự kiện bị lỡ khi mất kết nối")
+    parser.add_argument('--sensors', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    setup(args.sensors)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    browser = socketio.test_client(app, flask_test_client=client)
+    assert browser.emit('join_monitor', {'user_id': 1}, callback=True) == {'status': 'ok'}
+
+    sequencer = LiveSequencer()
+    with app.app_context():
+        last = frame(sequencer, args.sensors, 0)
+        handle_sensor_update(last)
+        newest = last
+        # Mất kết nối: các sự kiện tiếp theo (dữ liệu + vài cảnh báo) bị lỡ
+        for i in range(1, args.missed + 1):
+            if i % 10 == 0:
+                handle_new_alert(sequencer.stamp({'user_id': 1, 'sensor_index': 1, 'value': 99.0,
+                                                  'msg': 'vượt ngưỡng', 'timestamp': '00:00:00',
+                                                  'sent': False, 'episode_id': f'e{i}'}))
+            else:
+                newest = frame(sequencer, args.sensors, i)
+                handle_sensor_update(newest)
+    browser.get_received()
+
+    resume = {'user_id': 1, 'stream': last['stream'], 'seq': last['seq']}
+    res = browser.emit('resume_monitor', resume, callback=True)
+    ok = not res['reset'] and [d['seq'] for _, d in res['events']] == \
+        list(range(last['seq'] + 1, last['seq'] + args.missed + 1))
+    print(f"{'✅' if ok else '❌'} resume_monitor trả {len(res['events'])}/{args.missed} sự kiện bị lỡ, đúng thứ tự")
+    keyframes = res.get('keyframes') or []
+    ok = len(keyframes) == 1 and 'seq' not in keyframes[0] and \
+        sorted((r['index'], r['value']) for r in keyframes[0]['data']) == \
+        sorted((r['index'], r['value']) for r in newest['data'])
+    print(f"{'✅' if ok else '❌'} keyframe kèm theo mang giá trị mới nhất của thiết bị (kể cả frame còn chờ gộp)")
+    stale = browser.emit('resume_monitor', dict(resume, stream='khac'), callback=True)
+    print(f"{'✅' if stale['reset'] else '❌'} stream cũ (collector đã khởi động lại) -> reset")
+
+    reload_us = timed(lambda: client.get('/monitor/1'), args.repeat)
+    resume_us = timed(lambda: browser.emit('resume_monitor', resume, callback=True), args.repeat)
+    print(f"Tải lại trang /monitor/1 : {reload_us:>9.1f}µs")
+    print(f"resume_monitor          : {resume_us:>9.1f}µs (x{reload_us / resume_us:.1f})")
+    print(f"  {replay_window.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# File: benchmarks/bench_series_codec.py
+# So sánh kích thước payload và thời gian mã hóa của API dữ liệu theo dõi:
+# danh sách dict + strftime (cũ) với columnar JSON / nhị phân float32 (+ gzip).
+# Chạy: python -m benchmarks.bench_series_codec --rows 10000
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+from app.services import series_codec
+from app.services.readings_query import ReadingRow
+
+
+def make_rows(n, sensors=8):
+    base = datetime(2026, 1, 1)
+    # Mới -> cũ, giống thứ tự của fetch_readings_page
+    return [ReadingRow(n - i, 1 + i % sensors, round(20 + (i % 500) / 10.0, 1),
+                       base + timedelta(seconds=(n - i) // sensors))
+            for i in range(n)]
+
+
+def encode_legacy(rows):
+    result = []
+    for item in rows:
+        result.append({
+            'id': item.id_reading,
+            'value': item.value,
+            'sensor_index': item.sensor_index,
+            'timestamp': item.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return json.dumps({'status': 'success', 'readings_count': len(result), 'readings': result}).encode()
+
+
+def encode_columnar(rows):
+    return series_codec.encode_columnar(series_codec.to_columns(rows))
+
+
+def encode_f32(rows):
+    return series_codec.encode_f32(series_codec.to_columns(rows))
+
+
+def timed(fn, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(rows)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+
+    print(f"{'format':>10} | {'bytes':>10} | {'gzip bytes':>10} | {'encode ms':>9} | {'+gzip ms':>9}")
+    for name, fn in (('legacy', encode_legacy), ('columnar', encode_columnar), ('f32', encode_f32)):
+        payload, t_encode = timed(fn, rows, args.repeat)
+        t0 = time.perf_counter()
+        zipped = gzip.compress(payload, compresslevel=6)
+        t_gzip = time.perf_counter() - t0
+        print(f"{name:>10} | {len(payload):>10,} | {len(zipped):>10,} | {t_encode * 1000:>9.2f} | {t_gzip * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
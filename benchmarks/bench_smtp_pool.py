@@ -0,0 +1,64 @@
+# File: benchmarks/bench_smtp_pool.py
+# So sánh thông lượng gửi email: send_email cũ (mỗi thư một kết nối + login)
+# với SMTPPool (phiên giữ sẵn, gửi song song) trên server SMTP cục bộ.
+# --connect-delay giả lập chi phí TLS handshake + AUTH, --delay thời gian server nhận một thư.
+# Chạy: python -m benchmarks.bench_smtp_pool --messages 200 --connect-delay 0.05 --delay 0.01
+import argparse
+import time
+
+from app.services.smtp_pool import SMTPPool
+from benchmarks.fake_smtp_server import FakeSMTPServer
+import reportByEmail
+
+
+def messages(n):
+    return [(f'user{i}@example.com', f'[CẢNH BÁO] Sensor {i} vượt ngưỡng an toàn!', f'Giá trị {i}')
+            for i in range(n)]
+
+
+def run_case(name, server, send, n):
+    before = server.message_count()
+    t0 = time.perf_counter()
+    results = send(messages(n))
+    elapsed = time.perf_counter() - t0
+    received = server.message_count() - before
+    ok = all(results) and received == n
+    print(f"{'✅' if ok else '❌'} {name:<28} {n / elapsed:>9,.1f} thư/s  ({received}/{n} thư, {elapsed:.2f}s)")
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--connect-delay', type=float, default=0.05)
+    parser.add_argument('--delay', type=float, default=0.01)
+    parser.add_argument('--pool', type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(delay=args.delay, connect_delay=args.connect_delay).start()
+    port = server.port
+    print(f"SMTP cục bộ tại 127.0.0.1:{port}, mở phiên {args.connect_delay * 1000:.0f}ms, "
+          f"mỗi thư {args.delay * 1000:.0f}ms")
+
+    def one_shot(msgs):
+        return [reportByEmail.send_email(*m, host='127.0.0.1', port=port, starttls=False, password=None)
+                for m in msgs]
+    base = run_case("send_email (mỗi thư 1 kết nối)", server, one_shot, args.messages)
+
+    for size in (1, args.pool):
+        pool = SMTPPool('127.0.0.1', port, 'bench@example.com', 'x', starttls=False, size=size)
+        rate = run_case(f"SMTPPool size={size}", server, pool.send_many, args.messages)
+        print(f"   x{rate / base:.1f} so với send_email, {pool.stats()}")
+        pool.close()
+
+    # Server cắt kết nối sau mỗi 25 thư: pool phải tự kết nối lại, không mất thư
+    server.max_per_connection = 25
+    pool = SMTPPool('127.0.0.1', port, 'bench@example.com', 'x', starttls=False, size=args.pool)
+    run_case(f"SMTPPool size={args.pool}, server cắt phiên", server, pool.send_many, args.messages)
+    print(f"   {pool.stats()}")
+    pool.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+# File: benchmarks/bench_spool.py
+# Spool trên đĩa của collector (collector/spool.py):
+# (1) tốc độ ghi thêm liên tục của spool so với hàng đợi trong RAM của
+#     IngestWriter và commit SQLite mỗi bản tin;
+# (2) các kịch bản khôi phục sau sự cố: kill -9 khi đang ghi spool, kill -9
+#     khi IngestWriter đang phát lại vào DB, DB bị khóa rồi hồi phục, đuôi segment
+#     ghi dở -> không mất bản tin nào (at-least-once, trùng tối đa một lô);
+#     bản tin lỗi dữ liệu ra dead-letter, không chặn các bản tin sau.
+# Chạy: python -m benchmarks.bench_spool --seconds 2 --sensors 8
+import argparse
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, Column, Integer, Float, DateTime, String, create_engine, func, select
+
+from collector.ingest_writer import IngestWriter
+from collector.spool import SegmentSpool, SpoolReplayer
+
+metadata = MetaData()
+readings = Table('data_readings', metadata,
+                 Column('id_reading', Integer, primary_key=True),
+                 Column('user_id', Integer), Column('sensor_index', Integer),
+                 Column('value', Float), Column('timestamp', DateTime))
+alerts = Table('alert_events', metadata,
+               Column('id', Integer, primary_key=True), Column('episode_id', String(32)))
+
+
+def message(i, sensors):
+    """Các dòng DataReadings của một bản tin (user_id = số thứ tự bản tin để kiểm tra)."""
+    now = datetime.now()
+    return [{'user_id': i, 'sensor_index': s, 'value': s / 10.0, 'timestamp': now} for s in range(1, sensors + 1)]
+
+
+def rate(fn, seconds):
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for _ in range(100):
+            fn(n)
+            n += 1
+    return n / (time.perf_counter() - t0)
+
+
+# ----------------------------------------------------------------------
+# 1. Tốc độ ghi thêm
+# ----------------------------------------------------------------------
+def append_rates(seconds, sensors):
+    # Như IngestWriter.submit: hàng đợi nhận tuple, spool nhận tuple đã pickle
+    item = (message(0, sensors), [], time.time(), [], ())
+    payload = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+    results = {}
+
+    q = queue.Queue()
+    results['hàng đợi RAM (cũ)'] = rate(lambda i: q.put_nowait(item), seconds)
+
+    spool = SegmentSpool(tempfile.mkdtemp())
+    results['spool'] = rate(lambda i: spool.append(pickle.dumps(item, pickle.HIGHEST_PROTOCOL)), seconds)
+    spool.close()
+    spool = SegmentSpool(tempfile.mkdtemp(), sync_interval=0.05)
+    results['spool + msync 50ms'] = rate(lambda i: spool.append(pickle.dumps(item, pickle.HIGHEST_PROTOCOL)), seconds)
+    spool.close()
+
+    path = os.path.join(tempfile.mkdtemp(), 'commit.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE data_readings (user_id, sensor_index, value, timestamp)")
+    rows = [tuple(r.values()) for r in message(0, sensors)]
+
+    def commit(i):
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO data_readings VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    results['SQLite commit mỗi bản tin'] = rate(commit, seconds)
+
+    print(f"Ghi thêm liên tục ({len(payload)} byte/bản tin, {sensors} cảm biến):")
+    for name, per_s in results.items():
+        print(f"  {name:<28} {per_s:>12,.0f} bản tin/s  {per_s * len(payload) / 2**20:>8.1f} MB/s")
+
+
+# ----------------------------------------------------------------------
+# 2. Khôi phục sau sự cố
+# ----------------------------------------------------------------------
+def _append_forever(directory):
+    spool = SegmentSpool(directory, segment_bytes=256 * 1024)
+    i = 0
+    while True:
+        spool.append(pickle.dumps(i))
+        i += 1
+
+
+def _drain(spool):
+    replayer = SpoolReplayer(spool, pickle.loads)
+    out = []
+    while True:
+        try:
+            out.append(replayer.get())
+        except queue.Empty:
+            return out, replayer
+
+
+def check(ok, text):
+    print(f"  {'✅' if ok else '❌'} {text}")
+
+
+def crash_while_appending():
+    directory = tempfile.mkdtemp()
+    ctx = multiprocessing.get_context('fork')
+    proc = ctx.Process(target=_append_forever, args=(directory,))
+    proc.start()
+    time.sleep(0.5)
+    os.kill(proc.pid, signal.SIGKILL)
+    proc.join()
+    spool = SegmentSpool(directory, segment_bytes=256 * 1024)
+    got, replayer = _drain(spool)
+    check(got == list(range(len(got))) and got,
+          f"kill -9 khi đang ghi spool: đọc lại {len(got):,} bản ghi liên tục, không hỏng")
+    spool.append(pickle.dumps('sau khôi phục'))
+    check(replayer.get() == 'sau khôi phục', "ghi tiếp sau khôi phục")
+    spool.close()
+
+
+def _submit_forever(directory, db_url, sensors, total):
+    engine = create_engine(db_url)
+    writer = IngestWriter(engine, readings, alerts, batch_size=200, flush_interval=0.05,
+                          spool=SegmentSpool(directory, segment_bytes=1024 * 1024)).start()
+    for i in range(total):
+        writer.submit(message(i, sensors))
+        if i % 50 == 0:
+            time.sleep(0.001)
+    time.sleep(3600)
+
+
+def _db_messages(engine):
+    with engine.connect() as conn:
+        distinct = conn.scalar(select(func.count(readings.c.user_id.distinct())))
+        rows = conn.scalar(select(func.count()).select_from(readings))
+        last = conn.scalar(select(func.max(readings.c.user_id)))
+    return distinct, rows, last
+
+
+def crash_while_replaying(sensors, total=20000):
+    directory = tempfile.mkdtemp()
+    db_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'spool.db')
+    engine = create_engine(db_url)
+    metadata.create_all(engine)
+    ctx = multiprocessing.get_context('fork')
+    proc = ctx.Process(target=_submit_forever, args=(directory, db_url, sensors, total))
+    proc.start()
+    time.sleep(1.0)
+    os.kill(proc.pid, signal.SIGKILL)
+    proc.join()
+    before = _db_messages(engine)[0]
+
+    spool = SegmentSpool(directory, segment_bytes=1024 * 1024)
+    pending = spool.stats()['pending_bytes']
+    writer = IngestWriter(engine, readings, alerts, spool=spool).start()
+    writer.close(timeout=60)
+    distinct, rows, last = _db_messages(engine)
+    got, _ = _drain(spool)
+    # Bản tin có số thứ tự liên tục: không thiếu số nào từ 0 tới bản tin cuối đã vào spool
+    check(not got and distinct == last + 1 > before,
+          f"kill -9 khi đang ghi DB: {before:,} bản tin trong DB lúc kill, phát lại {pending:,} byte tồn "
+          f"-> {distinct:,}/{last + 1:,} bản tin, {rows - distinct * sensors} dòng trùng")
+    spool.close()
+
+
+def db_outage(sensors, total=2000):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(tempfile.mkdtemp(), 'outage.db')
+    engine = create_engine('sqlite:///' + path, connect_args={'timeout': 0.05})
+    metadata.create_all(engine)
+    # Tiến trình khác giữ khóa ghi: "database is locked" (lỗi tạm thời)
+    locker = sqlite3.connect(path, isolation_level=None)
+    locker.execute("BEGIN EXCLUSIVE")
+    spool = SegmentSpool(directory)
+    writer = IngestWriter(engine, readings, alerts, flush_interval=0.05, retry_interval=0.1, spool=spool).start()
+    for i in range(total):
+        writer.submit(message(i, sensors))
+    time.sleep(0.5)
+    errors = writer.stats()['flush_errors']
+    locker.execute("ROLLBACK")  # DB "hồi phục"
+    locker.close()
+    deadline = time.monotonic() + 30
+    while spool.stats()['pending_bytes'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    writer.close()
+    distinct, rows, _ = _db_messages(engine)
+    check(errors > 0 and distinct == total and rows == total * sensors and not writer.stats()['dead_lettered'],
+          f"DB bị khóa ({errors} lần ghi lỗi) rồi hồi phục: {distinct:,}/{total:,} bản tin đã vào DB")
+    spool.close()
+
+
+def poison_message(sensors, total=200):
+    directory = tempfile.mkdtemp()
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'poison.db'))
+    metadata.create_all(engine)
+    spool = SegmentSpool(directory)
+    writer = IngestWriter(engine, readings, alerts, flush_interval=0.05, retry_interval=0.1, spool=spool).start()
+    bad = message(total // 2, sensors)
+    bad[0]['value'] = 1j  # sqlite không lưu được số phức: lỗi dữ liệu, thử lại cũng lỗi
+    for i in range(total):
+        writer.submit(bad if i == total // 2 else message(i, sensors))
+        time.sleep(0.001)
+    deadline = time.monotonic() + 10
+    while spool.stats()['pending_bytes'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    writer.close()
+    distinct, _, last = _db_messages(engine)
+    dead = writer.stats()['dead_lettered']
+    check(dead == 1 and last == total - 1 and distinct == total - 1 and not spool.stats()['pending_bytes'],
+          f"bản tin lỗi dữ liệu -> dead-letter ({dead} bản tin), {distinct:,}/{total:,} bản tin vẫn vào DB")
+
+    # Phát lại khi chưa sửa nguyên nhân: bản tin vẫn lỗi, được giữ lại trong file
+    written, failed = writer.replay_dead_letter(directory)
+    kept = os.path.getsize(os.path.join(directory, 'dead-letter'))
+    check(written == 0 and failed == 1 and kept > 0,
+          f"phát lại dead-letter: {written} bản tin đã ghi, {failed} vẫn lỗi và được giữ lại")
+    spool.close()
+
+
+class _FlakyPartitions:
+    """
+    Phân vùng giả cho IngestWriter: file phân vùng nằm trong thư mục chưa tồn
+    tại nên ATTACH báo sqlite3.OperationalError "unable to open database file"
+    cho tới khi thư mục được tạo.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, 'p0.db')
+
+    def split(self, rows):
+        return {'p0': rows} if rows else {}
+
+    def attach(self, conn, partitions, create=False):
+        raw = conn.connection.driver_connection
+        if 'p0' not in [row[1] for row in raw.execute("PRAGMA database_list")]:
+            raw.execute("ATTACH DATABASE ? AS p0", (self.path,))
+            raw.execute("CREATE TABLE IF NOT EXISTS p0.data_readings "
+                        "(id_reading INTEGER PRIMARY KEY, user_id, sensor_index, value, timestamp)")
+
+    def options(self, p):
+        return {'schema_translate_map': {None: p}}
+
+
+def attach_failure(sensors, total=500):
+    directory = os.path.join(tempfile.mkdtemp(), 'partitions')
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'main.db'))
+    metadata.create_all(engine)
+    spool = SegmentSpool(tempfile.mkdtemp())
+    writer = IngestWriter(engine, readings, alerts, flush_interval=0.05, retry_interval=0.1,
+                          partitions=_FlakyPartitions(directory), spool=spool).start()
+    for i in range(total):
+        writer.submit(message(i, sensors))
+    time.sleep(0.5)
+    errors = writer.stats()['flush_errors']
+    os.makedirs(directory)  # phân vùng mở được trở lại
+    deadline = time.monotonic() + 30
+    while spool.stats()['pending_bytes'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    writer.close()
+    conn = sqlite3.connect(os.path.join(directory, 'p0.db'))
+    distinct = conn.execute("SELECT COUNT(DISTINCT user_id) FROM data_readings").fetchone()[0]
+    conn.close()
+    check(errors > 0 and not writer.stats()['dead_lettered'] and distinct == total,
+          f"ATTACH phân vùng lỗi ({errors} lần) là lỗi tạm thời: {distinct:,}/{total:,} bản tin, "
+          f"{writer.stats()['dead_lettered']} dead-letter")
+    spool.close()
+
+
+def torn_tail():
+    directory = tempfile.mkdtemp()
+    spool = SegmentSpool(directory, segment_bytes=64 * 1024)
+    for i in range(1000):
+        spool.append(pickle.dumps(i))
+    spool.close()
+    last = os.path.join(directory, sorted(n for n in os.listdir(directory) if n.endswith('.seg'))[-1])
+    with open(last, 'r+b') as f:
+        used = len(f.read().rstrip(b'\0'))
+        f.seek(used)
+        f.write(b'\x40\x00\x00\x00\xde\xad\xbe\xef' + b'ghi do')  # header của bản ghi 64 byte, payload thiếu
+    spool = SegmentSpool(directory, segment_bytes=64 * 1024)
+    got, replayer = _drain(spool)
+    spool.append(pickle.dumps(1000))
+    got.append(replayer.get())
+    check(got == list(range(1001)), "đuôi segment ghi dở bị bỏ qua, bản ghi mới nối tiếp đúng thứ tự")
+    spool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=2)
+    parser.add_argument('--sensors', type=int, default=8)
+    args = parser.parse_args()
+
+    append_rates(args.seconds, args.sensors)
+    print("Khôi phục sau sự cố:")
+    crash_while_appending()
+    torn_tail()
+    db_outage(args.sensors)
+    poison_message(args.sensors)
+    attach_failure(args.sensors)
+    crash_while_replaying(args.sensors)
+
+
+if __name__ == '__main__':
+    main()
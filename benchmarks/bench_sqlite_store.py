@@ -0,0 +1,78 @@
+# File: benchmarks/bench_sqlite_store.py
+# So sánh tốc độ ghi frame/giây: mở kết nối cho mỗi dòng (cách cũ của
+# connectIoT.save_to_database) với SQLiteStore (một kết nối WAL, commit theo lô).
+# Chạy: python -m benchmarks.bench_sqlite_store --frames 2000 50000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from collector.sqlite_store import SQLiteStore
+from connectIoT import INSERT_SQL
+
+
+def create_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, tem REAL, hum REAL, time TEXT, ip_address TEXT)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def cleanup(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def bench_connect_per_row(path, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        conn = sqlite3.connect(path)
+        conn.execute(INSERT_SQL, (25.0, 60.0, datetime.now(), "10.0.0.1"))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - t0
+
+
+def bench_store(path, n):
+    store = SQLiteStore(path, INSERT_SQL)
+    t0 = time.perf_counter()
+    for i in range(n):
+        store.add((25.0, 60.0, datetime.now(), "10.0.0.1"))
+    store.flush()
+    elapsed = time.perf_counter() - t0
+    store.close()
+    return elapsed
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    n = conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+    conn.close()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, nargs=2, default=[2000, 50000],
+                        metavar=("LEGACY", "STORE"),
+                        help="Số frame cho cách cũ (chậm) và cho SQLiteStore")
+    args = parser.parse_args()
+    n_legacy, n_store = args.frames
+
+    for name, fn, n in (("connect-per-row", bench_connect_per_row, n_legacy),
+                        ("SQLiteStore", bench_store, n_store)):
+        path = create_db()
+        elapsed = fn(path, n)
+        written = count(path)
+        cleanup(path)
+        print(f"{name:>16}: {n / elapsed:>12,.0f} frames/s  ({written}/{n} dòng)")
+
+
+if __name__ == "__main__":
+    main()
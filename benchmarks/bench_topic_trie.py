@@ -0,0 +1,85 @@
+# File: benchmarks/bench_topic_trie.py
+# So sánh định tuyến topic MQTT qua trie với duyệt tuần tự toàn bộ filter.
+# Chạy: python -m benchmarks.bench_topic_trie --filters 10000 --messages 20000
+import argparse
+import random
+import time
+
+from collector.topic_trie import TopicTrie, covering_filters
+
+
+def filter_matches(topic_filter, topic):
+    """Cách làm ngây thơ: so từng cấp của một filter với topic."""
+    f_levels = topic_filter.split('/')
+    t_levels = topic.split('/')
+    for i, level in enumerate(f_levels):
+        if level == '#':
+            return True
+        if i >= len(t_levels):
+            return False
+        if level != '+' and level != t_levels[i]:
+            return False
+    return len(f_levels) == len(t_levels)
+
+
+def build_filters(n, wildcard_ratio, seed=1):
+    """Sinh n filter dạng site/<s>/gw/<g>/rtu, một phần dùng '+' hoặc '#'."""
+    rnd = random.Random(seed)
+    filters = set()
+    while len(filters) < n:
+        site, gw = rnd.randrange(n // 10 + 1), rnd.randrange(100)
+        r = rnd.random()
+        if r < wildcard_ratio / 2:
+            filters.add(f"site/{site}/gw/+/rtu")
+        elif r < wildcard_ratio:
+            filters.add(f"site/{site}/#")
+        else:
+            filters.add(f"site/{site}/gw/{gw}/rtu")
+    return sorted(filters)
+
+
+def build_topics(n, n_filters, seed=2):
+    rnd = random.Random(seed)
+    return [f"site/{rnd.randrange(n_filters // 10 + 1)}/gw/{rnd.randrange(100)}/rtu" for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filters', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--wildcards', type=float, default=0.1, help="tỉ lệ filter có wildcard")
+    args = parser.parse_args()
+
+    filters = build_filters(args.filters, args.wildcards)
+    topics = build_topics(args.messages, args.filters)
+
+    t0 = time.perf_counter()
+    trie = TopicTrie()
+    for f in filters:
+        trie.add(f, f)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    covering = covering_filters(filters)
+    cover_s = time.perf_counter() - t0
+    print(f"{len(filters)} filter -> {len(covering)} filter cần subscribe "
+          f"(dựng trie {build_s * 1000:.1f} ms, tính tập bao {cover_s * 1000:.1f} ms)")
+
+    t0 = time.perf_counter()
+    trie_hits = [sorted(f for f, _ in trie.match(t)) for t in topics]
+    trie_s = time.perf_counter() - t0
+    print(f"trie  : {args.messages / trie_s:12,.0f} msg/s  ({trie_s / args.messages * 1e6:.2f} µs/msg)")
+
+    # Duyệt tuần tự chậm tới mức chỉ đo một phần nhỏ số message
+    sample = topics[:max(1, min(len(topics), 200))]
+    t0 = time.perf_counter()
+    linear_hits = [sorted(f for f in filters if filter_matches(f, t)) for t in sample]
+    linear_s = time.perf_counter() - t0
+    print(f"linear: {len(sample) / linear_s:12,.0f} msg/s  ({linear_s / len(sample) * 1e6:.2f} µs/msg)")
+
+    assert linear_hits == trie_hits[:len(sample)], "trie và duyệt tuần tự cho kết quả khác nhau"
+    print(f"speedup: {(linear_s / len(sample)) / (trie_s / args.messages):.0f}x")
+
+
+if __name__ == '__main__':
+    main()
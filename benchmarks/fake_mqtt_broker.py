@@ -0,0 +1,281 @@
+# File: benchmarks/fake_mqtt_broker.py
+# Broker MQTT tối giản chạy trong tiến trình (asyncio) để thử collector mà
+# không cần mosquitto: MQTT 3.1.1 và 5.0, QoS 0, wildcard '+'/'#' và
+# shared subscription $share/<nhóm>/<filter> (chia vòng tròn trong nhóm).
+# Chạy riêng: python -m benchmarks.fake_mqtt_broker --port 1883
+import argparse
+import asyncio
+import itertools
+import struct
+import threading
+
+from collector.topic_trie import TopicTrie
+from collector.sharding import split_shared
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def encode_varint(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def decode_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_str(s):
+    raw = s.encode('utf-8')
+    return struct.pack('>H', len(raw)) + raw
+
+
+def decode_str(data, pos):
+    (n,) = struct.unpack_from('>H', data, pos)
+    return data[pos + 2:pos + 2 + n].decode('utf-8'), pos + 2 + n
+
+
+def packet(ptype, body, flags=0):
+    return bytes([ptype << 4 | flags]) + encode_varint(len(body)) + body
+
+
+class _Subscribers:
+    __slots__ = ('sessions', 'groups')
+
+    def __init__(self):
+        self.sessions = set()
+        self.groups = {}  # nhóm -> [danh sách session, bộ đếm vòng tròn]
+
+
+class Session:
+    def __init__(self, broker, writer):
+        self.broker = broker
+        self.writer = writer
+        self.version = 4
+        self.client_id = None
+        self.subscriptions = set()
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def send_publish(self, topic, payload):
+        body = encode_str(topic)
+        if self.version == 5:
+            body += b'\x00'  # không có properties
+        self.send(packet(PUBLISH, body + payload))
+
+
+class FakeBroker:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._trie = TopicTrie()
+        self._subs = {}
+        self._sessions = set()
+        self._server = None
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self.received = 0
+        self.delivered = 0
+
+    # ------------------------------------------------------------------
+    # Điều khiển từ luồng khác
+    # ------------------------------------------------------------------
+    def start(self):
+        """Chạy broker trong luồng nền; trả về khi đã lắng nghe (self.port là cổng thật)."""
+        self._thread = threading.Thread(target=self._run, name="fake-mqtt-broker", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._serve())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def publish(self, topic, payload):
+        """Gửi một message như thể một thiết bị publish (gọi được từ luồng bất kỳ)."""
+        self.loop.call_soon_threadsafe(self._route, topic, bytes(payload))
+
+    def publish_many(self, messages):
+        self.loop.call_soon_threadsafe(lambda: [self._route(t, bytes(p)) for t, p in messages])
+
+    def subscription_count(self):
+        return sum(len(s.subscriptions) for s in list(self._sessions))
+
+    # ------------------------------------------------------------------
+    # Định tuyến
+    # ------------------------------------------------------------------
+    def _route(self, topic, payload):
+        self.received += 1
+        targets = set()
+        for _, subs in self._trie.match(topic):
+            targets.update(subs.sessions)
+            for group in subs.groups.values():
+                members, turn = group
+                if members:
+                    targets.add(members[next(turn) % len(members)])
+        for session in targets:
+            session.send_publish(topic, payload)
+        self.delivered += len(targets)
+
+    def _subscribe(self, session, subscription):
+        group, topic_filter = split_shared(subscription)
+        subs = self._subs.get(topic_filter)
+        if subs is None:
+            subs = self._subs[topic_filter] = _Subscribers()
+            self._trie.add(topic_filter, subs)
+        if group is None:
+            subs.sessions.add(session)
+        else:
+            members = subs.groups.setdefault(group, [[], itertools.count()])[0]
+            if session not in members:
+                members.append(session)
+        session.subscriptions.add(subscription)
+
+    def _unsubscribe(self, session, subscription):
+        session.subscriptions.discard(subscription)
+        group, topic_filter = split_shared(subscription)
+        subs = self._subs.get(topic_filter)
+        if subs is None:
+            return
+        if group is None:
+            subs.sessions.discard(session)
+        elif group in subs.groups:
+            members = subs.groups[group][0]
+            if session in members:
+                members.remove(session)
+            if not members:
+                del subs.groups[group]
+        if not subs.sessions and not subs.groups:
+            del self._subs[topic_filter]
+            self._trie.remove(topic_filter)
+
+    # ------------------------------------------------------------------
+    # Giao thức
+    # ------------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        session = Session(self, writer)
+        self._sessions.add(session)
+        try:
+            while True:
+                first = await reader.readexactly(1)
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b''
+                if not self._dispatch(session, first[0] >> 4, first[0] & 0x0F, body):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for subscription in list(session.subscriptions):
+                self._unsubscribe(session, subscription)
+            self._sessions.discard(session)
+            writer.close()
+
+    def _skip_props(self, session, body, pos):
+        if session.version != 5:
+            return pos
+        n, pos = decode_varint(body, pos)
+        return pos + n
+
+    def _dispatch(self, session, ptype, flags, body):
+        if ptype == CONNECT:
+            _, pos = decode_str(body, 0)
+            session.version = body[pos]
+            pos = self._skip_props(session, body, pos + 4)
+            session.client_id, _ = decode_str(body, pos)
+            ack = b'\x00\x00\x00' if session.version == 5 else b'\x00\x00'
+            session.send(packet(CONNACK, ack))
+        elif ptype == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic, pos = decode_str(body, 0)
+            packet_id = None
+            if qos:
+                (packet_id,) = struct.unpack_from('>H', body, pos)
+                pos += 2
+            pos = self._skip_props(session, body, pos)
+            self._route(topic, body[pos:])
+            if qos == 1:
+                session.send(packet(PUBACK, struct.pack('>H', packet_id)))
+        elif ptype == SUBSCRIBE:
+            (packet_id,) = struct.unpack_from('>H', body, 0)
+            pos = self._skip_props(session, body, 2)
+            codes = bytearray()
+            while pos < len(body):
+                subscription, pos = decode_str(body, pos)
+                pos += 1  # options/QoS yêu cầu; broker này chỉ cấp QoS 0
+                self._subscribe(session, subscription)
+                codes.append(0)
+            props = b'\x00' if session.version == 5 else b''
+            session.send(packet(SUBACK, struct.pack('>H', packet_id) + props + bytes(codes)))
+        elif ptype == UNSUBSCRIBE:
+            (packet_id,) = struct.unpack_from('>H', body, 0)
+            pos = self._skip_props(session, body, 2)
+            count = 0
+            while pos < len(body):
+                subscription, pos = decode_str(body, pos)
+                self._unsubscribe(session, subscription)
+                count += 1
+            extra = b'\x00' + bytes(count) if session.version == 5 else b''
+            session.send(packet(UNSUBACK, struct.pack('>H', packet_id) + extra))
+        elif ptype == PINGREQ:
+            session.send(packet(PINGRESP, b''))
+        elif ptype == DISCONNECT:
+            return False
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args()
+    broker = FakeBroker(args.host, args.port).start()
+    print(f"🚀 Fake MQTT broker tại {broker.host}:{broker.port} (Ctrl+C để dừng)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# File: benchmarks/fake_smtp_server.py
+# Server SMTP tối giản chạy trong tiến trình (asyncio) để thử dịch vụ email
+# mà không cần aiosmtpd/mail server thật: EHLO/HELO, AUTH PLAIN/LOGIN, MAIL,
+# RCPT, DATA, RSET, NOOP, QUIT (không hỗ trợ STARTTLS). Chỉ đếm/lưu thư nhận được.
+# Chạy riêng: python -m benchmarks.fake_smtp_server --port 1025
+import argparse
+import asyncio
+import threading
+import time
+
+
+class FakeSMTPServer:
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, connect_delay=0.0, max_per_connection=0):
+        self.host = host
+        self.port = port
+        # Độ trễ giả lập cho mỗi thư (giây), như server thật phải xử lý/chuyển tiếp
+        self.delay = delay
+        # Độ trễ khi mở phiên (giây), thay cho các vòng TLS handshake + AUTH của server thật
+        self.connect_delay = connect_delay
+        # Cắt kết nối sau N thư (0 = không), để thử client kết nối lại
+        self.max_per_connection = max_per_connection
+        self._server = None
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self.messages = []  # (mail_from, [rcpt], nội dung, thời điểm nhận)
+        self.connections = 0
+
+    # ------------------------------------------------------------------
+    # Điều khiển từ luồng khác
+    # ------------------------------------------------------------------
+    def start(self):
+        """Chạy server trong luồng nền; trả về khi đã lắng nghe (self.port là cổng thật)."""
+        self._thread = threading.Thread(target=self._run, name="fake-smtp-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._serve())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def message_count(self):
+        with self._lock:
+            return len(self.messages)
+
+    # ------------------------------------------------------------------
+    # Giao thức
+    # ------------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        with self._lock:
+            self.connections += 1
+
+        def reply(line):
+            writer.write(line.encode() + b'\r\n')
+
+        mail_from, rcpts, received = None, [], 0
+        try:
+            if self.connect_delay:
+                await asyncio.sleep(self.connect_delay)
+            reply('220 fake-smtp ESMTP')
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                verb, _, arg = line.partition(' ')
+                verb = verb.upper()
+
+                if verb == 'EHLO':
+                    writer.write(b'250-fake-smtp\r\n250-8BITMIME\r\n250-AUTH PLAIN LOGIN\r\n250 SMTPUTF8\r\n')
+                elif verb == 'HELO':
+                    reply('250 fake-smtp')
+                elif verb == 'AUTH':
+                    mech, _, initial = arg.partition(' ')
+                    if mech.upper() == 'LOGIN':
+                        # Hỏi user rồi password (base64), chấp nhận mọi giá trị
+                        for prompt in ([] if initial else ['334 VXNlcm5hbWU6']) + ['334 UGFzc3dvcmQ6']:
+                            reply(prompt)
+                            await writer.drain()
+                            await reader.readline()
+                    elif not initial:
+                        reply('334 ')
+                        await writer.drain()
+                        await reader.readline()
+                    reply('235 2.7.0 Authentication successful')
+                elif verb == 'MAIL':
+                    mail_from, rcpts = arg.split(':', 1)[-1].strip(), []
+                    reply('250 OK')
+                elif verb == 'RCPT':
+                    rcpts.append(arg.split(':', 1)[-1].strip())
+                    reply('250 OK')
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line in (b'.\r\n', b'.\n'):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    with self._lock:
+                        self.messages.append((mail_from, rcpts, b''.join(lines), time.time()))
+                    mail_from, rcpts = None, []
+                    reply('250 OK: queued')
+                    received += 1
+                    if self.max_per_connection and received >= self.max_per_connection:
+                        await writer.drain()
+                        break
+                elif verb == 'RSET':
+                    mail_from, rcpts = None, []
+                    reply('250 OK')
+                elif verb == 'NOOP':
+                    reply('250 OK')
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    await writer.drain()
+                    break
+                else:
+                    reply('502 Command not implemented')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--connect-delay', type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeSMTPServer(args.host, args.port, args.delay, args.connect_delay).start()
+    print(f"🚀 Fake SMTP server tại {server.host}:{server.port} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📬 Đã nhận {server.message_count()} thư")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# File: benchmarks/loadtest_iot.py
+# Load test cho collector TCP (connectIoT.py): mở N gateway giả lập tới localhost,
+# mỗi gateway gửi frame Modbus 9 byte theo chu kỳ, sau đó đếm số dòng đã ghi DB.
+#
+# Tự chạy collector trong cùng tiến trình với DB tạm:
+#   python -m benchmarks.loadtest_iot --gateways 1000 --duration 10 --interval 1
+# Hoặc bắn vào một collector đang chạy sẵn:
+#   python -m benchmarks.loadtest_iot --external --port 8899
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import connectIoT
+from collector.modbus import crc16
+
+
+def build_frame(temp, hum):
+    body = bytes([1, 0x03, 0x04]) + int(temp * 10).to_bytes(2, 'big') + int(hum * 10).to_bytes(2, 'big')
+    crc = crc16(body)
+    return body + bytes([crc & 0xFF, crc >> 8])
+
+
+async def gateway(host, port, duration, interval, stats):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats["failed"] += 1
+        return
+    stats["connected"] += 1
+    # Lệch pha ngẫu nhiên để các gateway không gửi cùng một lúc
+    await asyncio.sleep(random.random() * interval)
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            writer.write(build_frame(random.uniform(20, 40), random.uniform(40, 90)))
+            await writer.drain()
+            stats["sent"] += 1
+            await asyncio.sleep(interval)
+    except OSError:
+        stats["errors"] += 1
+    finally:
+        writer.close()
+
+
+def create_temp_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, tem REAL, hum REAL, time TEXT, ip_address TEXT)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+async def main_async(args):
+    stats = {"connected": 0, "failed": 0, "sent": 0, "errors": 0}
+    collector_task = db_path = None
+
+    if not args.external:
+        db_path = create_temp_db()
+        started = asyncio.Event()
+        collector_task = asyncio.create_task(
+            connectIoT.run_collector("127.0.0.1", args.port, db_path, started=started)
+        )
+        await started.wait()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        gateway("127.0.0.1", args.port, args.duration, args.interval, stats)
+        for _ in range(args.gateways)
+    ))
+    elapsed = time.perf_counter() - t0
+
+    print(f"Gateways: {stats['connected']} kết nối, {stats['failed']} thất bại, {stats['errors']} lỗi")
+    print(f"Đã gửi {stats['sent']} frame trong {elapsed:.1f}s ({stats['sent'] / elapsed:,.0f} frames/s)")
+
+    if collector_task:
+        # Chờ task ghi DB xử lý hết rồi đếm
+        await asyncio.sleep(connectIoT.WRITE_FLUSH_INTERVAL * 2)
+        collector_task.cancel()
+        try: await collector_task
+        except asyncio.CancelledError: pass
+
+        conn = sqlite3.connect(db_path)
+        saved = conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+        conn.close()
+        os.remove(db_path)
+        print(f"Đã ghi DB: {saved}/{stats['sent']} frame")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gateways", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=18899)
+    parser.add_argument("--external", action="store_true", help="Không tự chạy collector")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
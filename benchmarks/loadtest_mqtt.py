@@ -0,0 +1,113 @@
+# File: benchmarks/loadtest_mqtt.py
+# Đo thông lượng collector MQTT nhiều tiến trình trên broker giả lập trong tiến trình.
+# Dùng DB tạm; mỗi user có sub_topic site/<i>/rtu với 2 cảm biến.
+# Chạy: python -m benchmarks.loadtest_mqtt --workers 4 --mode hash --messages 20000
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# Worker "spawn" import lại module này: dùng chung thư mục tạm qua biến môi trường
+_tmp = os.environ.get('LOADTEST_MQTT_DIR') or tempfile.mkdtemp()
+os.environ['LOADTEST_MQTT_DIR'] = _tmp
+DB_PATH = os.path.join(_tmp, 'loadtest.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+if os.name == 'posix':
+    # Web Server giả: nhận và bỏ sự kiện để bus của worker không phải gửi lại
+    BUS_PATH = os.path.join(_tmp, 'bus.sock')
+    os.environ['EVENT_BUS_URL'] = 'unix://' + BUS_PATH
+
+from sqlalchemy import func, select
+
+from app import app, db
+from app.models.user_model import Users
+from app.models.sensor_model import DataReadings
+from benchmarks.bench_modbus import build_frame
+from benchmarks.fake_mqtt_broker import FakeBroker
+from collector.supervisor import Supervisor
+import connectMQTT
+
+
+def create_users(n):
+    with app.app_context():
+        db.create_all()
+        for i in range(1, n + 1):
+            user = Users(id_user=i, fullname=f'User {i}', username=f'user{i:04d}',
+                         email=f'user{i}@example.com', sub_topic=f'site/{i}/rtu', sensor_count=2)
+            user.password_hash = 'x'
+            db.session.add(user)
+        db.session.commit()
+
+
+def drain_bus():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(BUS_PATH)
+    while True:
+        sock.recv(65536)
+
+
+def count_rows():
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(DataReadings))
+
+
+def wait_for(predicate, timeout, supervisor):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        supervisor.poll(timeout=0.2)
+        if predicate():
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=connectMQTT.SHARD_MODES, default='hash')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    create_users(args.users)
+    if os.name == 'posix':
+        threading.Thread(target=drain_bus, daemon=True).start()
+    broker = FakeBroker().start()
+    print(f"Broker giả tại 127.0.0.1:{broker.port}, {args.users} user, DB {DB_PATH}")
+
+    supervisor = Supervisor(connectMQTT.run_worker, args.workers,
+                            dict(mode=args.mode, broker='127.0.0.1', port=broker.port,
+                                 quiet=True, stats_interval=1.0),
+                            stats_interval=5.0).start()
+    try:
+        expected_subs = args.users * (args.workers if args.mode == 'share' and args.workers > 1 else 1)
+        if not wait_for(lambda: broker.subscription_count() >= expected_subs, 60, supervisor):
+            print(f"❌ Worker chưa subscribe đủ ({broker.subscription_count()}/{expected_subs})")
+            return
+        print(f"{args.workers} worker ({args.mode}) đã subscribe {broker.subscription_count()} filter")
+
+        frame = build_frame(2)
+        messages = [(f'site/{1 + i % args.users}/rtu', frame) for i in range(args.messages)]
+        t0 = time.perf_counter()
+        for i in range(0, len(messages), 1000):
+            broker.publish_many(messages[i:i + 1000])
+        expected_rows = args.messages * 2
+        done = wait_for(lambda: count_rows() >= expected_rows, args.timeout, supervisor)
+        elapsed = time.perf_counter() - t0
+        rows = count_rows()
+        print(f"{'✅' if done else '❌'} {rows}/{expected_rows} dòng trong {elapsed:.2f}s "
+              f"-> {rows / 2 / elapsed:,.0f} msg/s")
+    finally:
+        # Worker gửi số liệu cuối cùng khi dừng
+        supervisor.stop()
+        broker.stop()
+
+    for worker_id, w in supervisor.stats()['workers'].items():
+        print(f"  worker {worker_id}: routes={w['routes']} messages={w['messages']} "
+              f"rows={w['rows_written']} max_lag={w['max_lag_ms']}ms handle_max={w['handle_ms_max']}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# File: benchmarks/loadtest_notifier.py
+# Đo độ trễ gửi email cảnh báo của Notifier (reportByEmail.py) trên DB tạm:
+# IngestWriter ghi AlertEvent -> hook on_commit của collector báo qua bus ->
+# Notifier gửi tới server SMTP cục bộ (aiosmtpd nếu có, không thì FakeSMTPServer).
+# Chạy: python -m benchmarks.loadtest_notifier --users 50 --alerts 500 [--pool 4] [--digest 2]
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+_tmp = tempfile.mkdtemp()
+DB_PATH = os.path.join(_tmp, 'loadtest.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+NOTIFY_URL = 'unix://' + os.path.join(_tmp, 'notify.sock')
+
+from sqlalchemy import func, select, true
+
+from app import app, db
+from app.models.user_model import Users
+from app.models.sensor_model import SensorConfig, DataReadings
+from app.models.alert_model import AlertEvent
+from app.models.notification_model import NotificationCooldown
+from app.services.notifier import Notifier
+from app.services.smtp_pool import SMTPPool
+from collector.event_bus import create_bus, listen
+from collector.ingest_writer import IngestWriter
+import connectMQTT
+import reportByEmail
+
+SENSORS = 4
+
+
+def start_smtp():
+    """aiosmtpd nếu đã cài, không thì server giả trong tiến trình. Trả về (tên, cổng, hàm đếm thư, hàm dừng)."""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        from benchmarks.fake_smtp_server import FakeSMTPServer
+        server = FakeSMTPServer().start()
+        return 'FakeSMTPServer', server.port, server.message_count, server.stop
+
+    class Counter:
+        count = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Counter.count += 1
+            return '250 OK'
+
+    controller = Controller(Counter(), hostname='127.0.0.1', port=0)
+    controller.start()
+    return 'aiosmtpd', controller.port, lambda: Counter.count, controller.stop
+
+
+def create_users(n):
+    with app.app_context():
+        db.create_all()
+        NotificationCooldown.__table__.create(bind=db.engine, checkfirst=True)
+        for i in range(1, n + 1):
+            user = Users(id_user=i, fullname=f'User {i}', username=f'user{i:04d}',
+                         email=f'user{i}@example.com', sub_topic=f'site/{i}/rtu', sensor_count=SENSORS)
+            user.password_hash = 'x'
+            db.session.add(user)
+            for s in range(1, SENSORS + 1):
+                db.session.add(SensorConfig(user_id=i, sensor_index=s, name=f'Cảm biến {s}',
+                                            unit='°C', min_val=0, max_val=50))
+        db.session.commit()
+
+
+def count_handled():
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(AlertEvent).where(AlertEvent.sent == true()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--alerts', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=200.0, help='cảnh báo/giây collector tạo ra')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--pool', type=int, default=0, help='số phiên SMTPPool (0 = send_email từng thư)')
+    parser.add_argument('--digest', type=float, default=0, help='gom cảnh báo mỗi user trong N giây')
+    args = parser.parse_args()
+
+    create_users(args.users)
+    name, port, delivered, stop_smtp = start_smtp()
+    print(f"SMTP cục bộ ({name}) tại 127.0.0.1:{port}, {args.users} user, DB {DB_PATH}")
+
+    if args.pool:
+        transport = SMTPPool('127.0.0.1', port, 'loadtest@example.com', 'x', starttls=False, size=args.pool)
+    else:
+        def transport(to, subject, body):
+            return reportByEmail.send_email(to, subject, body, host='127.0.0.1', port=port,
+                                            starttls=False, password=None)
+
+    notifier = Notifier(transport, cooldown_minutes=5, stats_interval=3600,
+                        digest_window=args.digest or None)
+    stop = threading.Event()
+    threading.Thread(target=listen, args=(NOTIFY_URL, notifier.on_event, stop), daemon=True).start()
+
+    def run_notifier():
+        with app.app_context():
+            notifier.run_forever()
+    notifier_thread = threading.Thread(target=run_notifier, daemon=True)
+    notifier_thread.start()
+    time.sleep(0.5)
+
+    # Phía collector: luồng ghi + hook báo sau commit như connectMQTT
+    connectMQTT.notify_bus = create_bus(NOTIFY_URL)
+    with app.app_context():
+        writer = IngestWriter(db.engine, DataReadings.__table__, AlertEvent.__table__,
+                              on_commit=connectMQTT.notify_committed_alerts).start()
+
+    # Mỗi (user, cảm biến) một cảnh báo mới; lần lặp lại rơi vào cooldown
+    keys = [(1 + i % args.users, 1 + (i // args.users) % SENSORS) for i in range(args.alerts)]
+    expected_sent = len(set(keys))
+    t0 = time.perf_counter()
+    for i, (user_id, sensor_index) in enumerate(keys):
+        now = datetime.now()
+        writer.submit([], [{'user_id': user_id, 'sensor_index': sensor_index, 'value': 99.0,
+                            'created_at': now, 'timestamp': now, 'sent': False,
+                            'episode_id': uuid.uuid4().hex}])
+        # Giữ đúng tốc độ tạo cảnh báo
+        delay = t0 + (i + 1) / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and count_handled() < args.alerts:
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - t0
+
+    notifier.stop()
+    notifier_thread.join(5)
+    stop.set()
+    writer.close()
+    connectMQTT.notify_bus.close()
+    if args.pool:
+        transport.close()
+    stop_smtp()
+
+    s = notifier.stats()
+    handled = count_handled()
+    # Digest: mỗi user một email cho mỗi lô
+    ok = handled == args.alerts and delivered() == s['emails'] and s['sent'] == expected_sent
+    print(f"{'✅' if ok else '❌'} {handled}/{args.alerts} cảnh báo đã xử lý, "
+          f"{s['sent']}/{expected_sent} cảnh báo gửi trong {delivered()} email, {elapsed:.2f}s")
+    print(f"  độ trễ gửi: avg={s['avg_latency_ms']}ms max={s['max_latency_ms']}ms "
+          f"(bản cũ quét DB mỗi 10s: tới 10000ms + thời gian gửi)")
+    print(f"  cooldown bỏ qua={s['skipped_cooldown']} lỗi={s['failed']} lô={s['batches']} "
+          f"max_queue={s['max_queue_depth']} cache hit/miss={s['contact_cache_hits']}/{s['contact_cache_misses']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# File: benchmarks/loadtest_rooms.py
+# Đếm số message SocketIO phát ra cho mỗi sự kiện collector:
+# broadcast toàn cục (cách cũ) so với room theo user.
+# Dùng DB tạm và test client của Flask-SocketIO (không cần chạy server).
+# Chạy: python -m benchmarks.loadtest_rooms --viewers 1000 --users 100
+import argparse
+import os
+import tempfile
+import time
+
+_fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+
+from app import app, db, socketio
+from app.events import COLLECTOR_NAMESPACE, live_coalescer
+from app.models.user_model import Users
+
+
+def create_users(n):
+    with app.app_context():
+        db.create_all()
+        for i in range(1, n + 1):
+            user = Users(id_user=i, fullname=f'User {i}', username=f'user{i:04d}',
+                         email=f'user{i}@example.com', sub_topic=f'site/{i}/rtu', sensor_count=2)
+            # Bỏ qua bcrypt cho nhanh: viewer đăng nhập bằng session
+            user.password_hash = 'x'
+            db.session.add(user)
+        db.session.commit()
+
+
+def connect_viewer(user_id):
+    flask_client = app.test_client()
+    with flask_client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    client = socketio.test_client(app, flask_test_client=flask_client)
+    ack = client.emit('join_monitor', {'user_id': user_id}, callback=True)
+    assert ack == {'status': 'ok'}, ack
+    client.get_received()
+    return client
+
+
+def drain(viewers):
+    return sum(len(v.get_received()) for v in viewers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--viewers', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--events', type=int, default=100)
+    args = parser.parse_args()
+
+    create_users(args.users)
+    t0 = time.perf_counter()
+    viewers = [connect_viewer(1 + i % args.users) for i in range(args.viewers)]
+    print(f"{len(viewers)} viewer / {args.users} user, kết nối trong {time.perf_counter() - t0:.1f}s")
+
+    collector = socketio.test_client(app, namespace=COLLECTOR_NAMESPACE,
+                                     auth={'token': app.config['COLLECTOR_TOKEN']})
+    assert collector.is_connected(COLLECTOR_NAMESPACE)
+
+    def payload(k):
+        return {'user_id': 1 + k % args.users, 'topic': f'site/{1 + k % args.users}/rtu',
+                'data': [{'index': 1, 'value': 25.0}]}
+
+    # Cách cũ: emit(..., broadcast=True) tới mọi trình duyệt
+    with app.app_context():
+        for k in range(args.events):
+            socketio.emit('update_monitor', payload(k), namespace='/')
+    legacy = drain(viewers)
+
+    # Cách mới: collector -> namespace /collector -> bộ gộp -> room của user.
+    # Flush bộ gộp thủ công (không chạy background task) sau mỗi sự kiện.
+    live_coalescer.mark_started()
+    for k in range(args.events):
+        collector.emit('sensor_data_update', payload(k), namespace=COLLECTOR_NAMESPACE)
+        live_coalescer.flush(now=time.monotonic() + 3600 * k)
+    rooms = drain(viewers)
+
+    print(f"broadcast: {legacy / args.events:>8.1f} message / sự kiện")
+    print(f"room     : {rooms / args.events:>8.1f} message / sự kiện")
+
+    for v in viewers:
+        v.disconnect()
+    collector.disconnect(namespace=COLLECTOR_NAMESPACE)
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+# File: collector/__init__.py
+# Các thành phần dùng chung cho các tiến trình thu thập dữ liệu
+# (connectMQTT.py, connectIoT.py). Không phụ thuộc vào Flask.
@@ -0,0 +1,213 @@
+# File: collector/alert_engine.py
+import numpy as np
+
+# Mã loại cảnh báo trong ma trận kết quả
+NONE, LOW, HIGH, RATE = 0, 1, 2, 3
+
+
+class AlertRules:
+    """
+    Ngưỡng của một user đã "biên dịch" thành mảng NumPy (mỗi phần tử một cảm biến):
+        lo/hi      : Min/Max (-inf/+inf nếu không đặt)
+        hysteresis : vùng trễ; đang cảnh báo thì chỉ hết khi giá trị quay lại
+                     trong [lo + h, hi - h]
+        debounce   : số mẫu vượt ngưỡng liên tiếp trước khi báo (1 = báo ngay)
+        max_rate   : tốc độ thay đổi tối đa |Δgiá trị|/giây (+inf nếu không đặt)
+    Cảm biến không có cấu hình thì không bao giờ cảnh báo.
+    """
+
+    def __init__(self, lo, hi, hysteresis, debounce, max_rate, enabled, min_vals, max_vals):
+        self.lo = lo
+        self.hi = hi
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.max_rate = max_rate
+        self.enabled = enabled
+        # Giá trị gốc (để ghi thông điệp giống hệt cách cũ)
+        self.min_vals = min_vals
+        self.max_vals = max_vals
+        self.size = len(lo)
+        # Bản list để so sánh vô hướng khi chỉ có một frame nhỏ
+        self.lo_list = lo.tolist()
+        self.hi_list = hi.tolist()
+        # Không có hysteresis/debounce/rate -> chỉ cần so sánh Min/Max, không cần trạng thái
+        self.stateless = not (hysteresis.any() or (debounce > 1).any() or np.isfinite(max_rate).any())
+
+    @classmethod
+    def compile(cls, configs, sensor_count):
+        """configs: {sensor_index (từ 1): đối tượng có min_val, max_val, hysteresis, debounce, max_rate}."""
+        lo = np.full(sensor_count, -np.inf)
+        hi = np.full(sensor_count, np.inf)
+        hysteresis = np.zeros(sensor_count)
+        debounce = np.ones(sensor_count, dtype=np.int64)
+        max_rate = np.full(sensor_count, np.inf)
+        enabled = np.zeros(sensor_count, dtype=bool)
+        min_vals = [None] * sensor_count
+        max_vals = [None] * sensor_count
+
+        for idx, config in configs.items():
+            i = idx - 1
+            if not 0 <= i < sensor_count or config is None:
+                continue
+            enabled[i] = True
+            min_vals[i], max_vals[i] = config.min_val, config.max_val
+            if config.min_val is not None: lo[i] = config.min_val
+            if config.max_val is not None: hi[i] = config.max_val
+            if getattr(config, 'hysteresis', None): hysteresis[i] = abs(config.hysteresis)
+            if getattr(config, 'debounce', None): debounce[i] = max(1, int(config.debounce))
+            if getattr(config, 'max_rate', None): max_rate[i] = abs(config.max_rate)
+
+        # Cảm biến không cấu hình: ngưỡng vô cực -> không bao giờ vượt
+        lo[~enabled] = -np.inf
+        hi[~enabled] = np.inf
+        max_rate[~enabled] = np.inf
+        return cls(lo, hi, hysteresis, debounce, max_rate, enabled, min_vals, max_vals)
+
+    def message(self, kind, sensor, rate=None):
+        if kind == LOW:
+            return f"Thấp hơn Min ({self.min_vals[sensor]})"
+        if kind == HIGH:
+            return f"Cao hơn Max ({self.max_vals[sensor]})"
+        return f"Thay đổi nhanh ({rate:.2f}/s > {self.max_rate[sensor]:g}/s)"
+
+
+class AlertState:
+    """Trạng thái nối giữa các lần evaluate (theo thời gian) của một user."""
+
+    def __init__(self, size):
+        self.size = size
+        self.in_alarm = np.zeros(size, dtype=bool)
+        self.streak = np.zeros(size, dtype=np.int64)
+        self.last_value = np.full(size, np.nan)
+        self.last_time = np.nan
+
+
+def _carry_streak(flags, initial):
+    """
+    Đếm số mẫu True liên tiếp tính tới từng hàng (theo trục thời gian 0),
+    cộng dồn `initial` nếu chuỗi kéo dài từ đầu lô.
+    """
+    idx = np.arange(flags.shape[0])[:, None]
+    last_false = np.maximum.accumulate(np.where(flags, -1, idx), axis=0)
+    streak = np.where(last_false < 0, initial + idx + 1, idx - last_false)
+    return np.where(flags, streak, 0)
+
+
+def evaluate(rules, state, values, times):
+    """
+    Đánh giá một lô frame trong một lượt vector hóa.
+        values: mảng (số frame, số cảm biến) giá trị thực; list/tuple = một frame
+        times : mảng (số frame,) thời điểm (giây, epoch)
+    Trả về (frame, cảm biến, loại, tốc độ) của các mẫu cần tạo AlertEvent,
+    theo thứ tự frame rồi cảm biến (giống vòng lặp cũ). `state` được cập nhật.
+    """
+    if rules.stateless and isinstance(values, (list, tuple)):
+        # Một frame vài giá trị chỉ với Min/Max: so sánh vô hướng rẻ hơn chi phí gọi NumPy
+        return _evaluate_scalar(rules, values)
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[None, :]
+    times = np.asarray(times, dtype=np.float64).reshape(-1)
+
+    low = values < rules.lo
+    high = values > rules.hi
+    rate = None
+
+    if rules.stateless:
+        kinds = np.where(low, LOW, np.where(high, HIGH, NONE))
+    elif values.shape[0] == 1:
+        kinds, rate = _evaluate_frame(rules, state, values[0], times[0], low, high)
+    else:
+        # Debounce: chỉ đếm các mẫu vượt ngưỡng chặt liên tiếp; đủ N mẫu mới báo
+        low_relaxed = values < rules.lo + rules.hysteresis
+        high_relaxed = values > rules.hi - rules.hysteresis
+        relaxed = low_relaxed | high_relaxed
+        streak = _carry_streak(low | high, state.streak)
+        trigger = streak >= rules.debounce
+        # Hysteresis: alarm_t = báo (trigger) ∨ (alarm_{t-1} ∧ vẫn trong vùng trễ);
+        # chốt alarm chỉ khi cảnh báo thật sự được báo, không phải khi mới vượt ngưỡng
+        idx = np.arange(values.shape[0])[:, None]
+        last_trigger = np.maximum.accumulate(np.where(trigger, idx, -1), axis=0)
+        last_clear = np.maximum.accumulate(np.where(relaxed, -1, idx), axis=0)
+        alarm = relaxed & ((last_trigger > last_clear) | ((last_clear < 0) & state.in_alarm))
+        kinds = np.where(alarm, np.where(low_relaxed, LOW, HIGH), NONE)
+
+        # Tốc độ thay đổi so với mẫu trước (kể cả mẫu cuối của lô trước)
+        prev_values = np.vstack([state.last_value[None, :], values[:-1]])
+        prev_times = np.concatenate([[state.last_time], times[:-1]])[:, None]
+        dt = times[:, None] - prev_times
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.abs(values - prev_values) / dt
+        too_fast = (dt > 0) & (rate > rules.max_rate)
+        kinds = np.where((kinds == NONE) & too_fast, RATE, kinds)
+
+        state.in_alarm = alarm[-1]
+        state.streak = streak[-1]
+        state.last_value = values[-1].copy()
+        state.last_time = times[-1]
+
+    frames, sensors = np.nonzero(kinds)
+    rates = rate[frames, sensors] if rate is not None else np.full(len(frames), np.nan)
+    return frames, sensors, kinds[frames, sensors], rates
+
+
+def _evaluate_scalar(rules, values):
+    sensors, kinds = [], []
+    for i, (value, lo, hi) in enumerate(zip(values, rules.lo_list, rules.hi_list)):
+        if value < lo:
+            sensors.append(i)
+            kinds.append(LOW)
+        elif value > hi:
+            sensors.append(i)
+            kinds.append(HIGH)
+    n = len(sensors)
+    return [0] * n, sensors, kinds, [np.nan] * n
+
+
+def _evaluate_frame(rules, state, values, now, low, high):
+    """Đường tắt cho một frame (trường hợp on_message): cùng logic, không cần accumulate."""
+    low, high = low[0], high[0]
+    low_relaxed = values < rules.lo + rules.hysteresis
+    relaxed = low_relaxed | (values > rules.hi - rules.hysteresis)
+    streak = np.where(low | high, state.streak + 1, 0)
+    alarm = relaxed & ((streak >= rules.debounce) | state.in_alarm)
+    kinds = np.where(alarm, np.where(low_relaxed, LOW, HIGH), NONE)
+
+    dt = now - state.last_time
+    rate = None
+    if dt > 0:
+        rate = np.abs(values - state.last_value) / dt
+        kinds = np.where((kinds == NONE) & (rate > rules.max_rate), RATE, kinds)
+
+    state.in_alarm = alarm
+    state.streak = streak
+    state.last_value = values.copy()
+    state.last_time = now
+    if rate is None:
+        rate = np.full(rules.size, np.nan)
+    return kinds[None, :], rate[None, :]
+
+
+class AlertEngine:
+    """
+    Giữ AlertState của từng user; trạng thái được tạo lại khi bộ quy tắc đổi
+    kích thước (đổi số cảm biến).
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def state_for(self, key, rules):
+        state = self._states.get(key)
+        if state is None or state.size != rules.size:
+            state = self._states[key] = AlertState(rules.size)
+        return state
+
+    def evaluate(self, key, rules, values, times):
+        return evaluate(rules, self.state_for(key, rules), values, times)
+
+    def reset(self, key=None):
+        if key is None:
+            self._states.clear()
+        else:
+            self._states.pop(key, None)
@@ -0,0 +1,86 @@
+# File: collector/alert_episodes.py
+import uuid
+
+from collector.alert_engine import LOW
+
+
+class Episode:
+    """
+    Một đợt cảnh báo của một cảm biến: mở khi giá trị vượt ngưỡng, cập nhật
+    đỉnh/giá trị cuối/số mẫu trong bộ nhớ, đóng khi giá trị trở lại bình thường.
+    """
+    __slots__ = ('episode_id', 'user_id', 'sensor_index', 'kind', 'message',
+                 'opened_at', 'open_value', 'peak_value', 'last_value', 'count')
+
+    def __init__(self, user_id, sensor_index, kind, message, value, now):
+        self.episode_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.sensor_index = sensor_index
+        self.kind = kind
+        self.message = message
+        self.opened_at = now
+        self.open_value = value
+        self.peak_value = value
+        self.last_value = value
+        self.count = 1
+
+    def add(self, value):
+        self.count += 1
+        self.last_value = value
+        # Đỉnh = giá trị xa ngưỡng nhất theo hướng vượt
+        if (value < self.peak_value) if self.kind == LOW else (value > self.peak_value):
+            self.peak_value = value
+
+
+class EpisodeTracker:
+    """
+    Giữ các đợt cảnh báo đang mở theo (user, cảm biến). Mỗi frame chỉ sinh ra
+    các chuyển trạng thái (mở / đóng); các mẫu vượt ngưỡng ở giữa chỉ cập nhật
+    Episode trong bộ nhớ.
+    """
+
+    def __init__(self):
+        self._open = {}  # user_id -> {sensor_index: Episode}
+
+    def update(self, user_id, values, alerts, now):
+        """
+        values: giá trị của frame (index 0 = cảm biến 1)
+        alerts: {sensor_index: (kind, message)} các cảm biến đang vượt ngưỡng trong frame
+        Trả về (danh sách Episode mới mở, danh sách (Episode đã đóng, giá trị hồi phục)).
+        """
+        episodes = self._open.get(user_id)
+        if episodes is None:
+            if not alerts:
+                return [], []
+            episodes = self._open[user_id] = {}
+
+        opened, closed = [], []
+        for sensor_index, episode in list(episodes.items()):
+            alert = alerts.get(sensor_index)
+            # Hết vượt ngưỡng, hoặc đổi hướng (Min -> Max...) thì đóng đợt cũ
+            if alert is None or alert[0] != episode.kind:
+                del episodes[sensor_index]
+                recovery = values[sensor_index - 1] if sensor_index <= len(values) else None
+                closed.append((episode, recovery))
+
+        for sensor_index, (kind, message) in alerts.items():
+            value = values[sensor_index - 1]
+            episode = episodes.get(sensor_index)
+            if episode is None:
+                episode = episodes[sensor_index] = Episode(user_id, sensor_index, kind, message, value, now)
+                opened.append(episode)
+            else:
+                episode.add(value)
+
+        if not episodes:
+            del self._open[user_id]
+        return opened, closed
+
+    def open_episodes(self, user_id=None):
+        if user_id is not None:
+            return list(self._open.get(user_id, {}).values())
+        return [e for episodes in self._open.values() for e in episodes.values()]
+
+    def close_all(self, user_id):
+        """Đóng mọi đợt đang mở của user (VD: user bị xóa / đổi số cảm biến)."""
+        return [(e, None) for e in self._open.pop(user_id, {}).values()]
@@ -0,0 +1,281 @@
+# File: collector/event_bus.py
+import hashlib
+import hmac
+import json
+import os
+import socket
+import stat
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# Kênh Redis mặc định cho backend redis://
+REDIS_CHANNEL = 'sensor-monitor-bus'
+
+
+def _signature(token, body):
+    return hmac.new(token.encode(), body, hashlib.sha256).hexdigest().encode()
+
+
+def encode_event(event, data, token=None):
+    """
+    JSON của sự kiện. Có `token` (COLLECTOR_TOKEN) thì thêm chữ ký HMAC-SHA256
+    phía trước: "<hex>.<json>", bên nhận bỏ mọi sự kiện sai chữ ký.
+    """
+    body = json.dumps({'event': event, 'data': data}, separators=(',', ':'), default=str).encode()
+    if token:
+        return _signature(token, body) + b'.' + body
+    return body
+
+
+def decode_event(raw, token=None):
+    """Ngược lại của encode_event; sai chữ ký / sai định dạng -> ValueError."""
+    if token:
+        signature, _, raw = bytes(raw).partition(b'.')
+        if not hmac.compare_digest(signature, _signature(token, raw)):
+            raise ValueError("chữ ký HMAC không hợp lệ")
+    msg = json.loads(raw)
+    return msg['event'], msg['data']
+
+
+def bind_unix_socket(path, sock_module=socket):
+    """
+    Tạo socket datagram nghe tại `path` với quyền 0600 (chỉ user chạy Web
+    Server/collector gửi được). File cũ tại `path` chỉ bị xóa khi đó là socket
+    của chính user này và không còn tiến trình nào nghe trên nó.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+            raise RuntimeError(f"{path} đã tồn tại nhưng không phải socket của user này, không xóa")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            # Socket bỏ lại của tiến trình trước đã dừng
+            os.remove(path)
+        else:
+            raise RuntimeError(f"Đã có tiến trình đang nghe trên {path}")
+        finally:
+            probe.close()
+    sock = sock_module.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)
+    return sock
+
+
+class UnixDatagramBackend:
+    """Gửi mỗi sự kiện thành một datagram tới Unix domain socket của Web Server."""
+
+    def __init__(self, path, token=None):
+        self.path = path
+        self.token = token
+        self._sock = None
+
+    def send(self, event, data):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        self._sock.sendto(encode_event(event, data, self.token), self.path)
+
+    def reset(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class RedisBackend:
+    """PUBLISH lên Redis (hoặc server tương thích Redis). Cần thư viện `redis`."""
+
+    def __init__(self, url, channel=REDIS_CHANNEL, token=None):
+        import redis  # phụ thuộc tùy chọn
+        self._client = redis.Redis.from_url(url, socket_timeout=2)
+        self.channel = channel
+        self.token = token
+
+    def send(self, event, data):
+        self._client.publish(self.channel, encode_event(event, data, self.token))
+
+    def reset(self):
+        self._client.connection_pool.disconnect()
+
+
+class SocketIOBackend:
+    """Cách cũ: socketio.Client tới namespace /collector qua HTTP/WebSocket."""
+
+    def __init__(self, url, token, namespace='/collector'):
+        import socketio
+        self.url = url
+        self.token = token
+        self.namespace = namespace
+        self._sio = socketio.Client(logger=False, engineio_logger=False)
+
+    def send(self, event, data):
+        if not self._sio.connected:
+            self._sio.connect(self.url, transports=['websocket', 'polling'], wait_timeout=5,
+                              namespaces=[self.namespace], auth={'token': self.token})
+            print(f"✅ [Bus] Đã kết nối SocketIO tới {self.url}")
+        self._sio.emit(event, data, namespace=self.namespace)
+
+    def reset(self):
+        try: self._sio.disconnect()
+        except Exception: pass
+
+
+def create_backend(url, token=None):
+    """
+    Chọn backend theo URL:
+        unix:///tmp/sensor-monitor-bus.sock  -> Unix domain socket (datagram)
+        redis://localhost:6379/0             -> Redis PUBLISH
+        http://127.0.0.1:1404                -> SocketIO client (cách cũ)
+    unix:// và redis:// không tự xác thực: `token` dùng để ký HMAC từng sự kiện.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == 'unix':
+        return UnixDatagramBackend(url[len('unix://'):], token)
+    if scheme in ('redis', 'rediss'):
+        return RedisBackend(url, token=token)
+    if scheme in ('http', 'https'):
+        return SocketIOBackend(url, token)
+    raise ValueError(f"EVENT_BUS_URL không hỗ trợ: {url}")
+
+
+class EventBus:
+    """
+    Bus sự kiện nội bộ từ collector tới Web Server.
+
+    publish() không bao giờ chặn: sự kiện được đưa vào buffer có giới hạn và
+    một luồng nền gửi đi qua backend. Khi Web Server chậm hoặc đang khởi động
+    lại, luồng gửi thử lại với backoff; buffer đầy thì sự kiện mới bị bỏ
+    (đếm trong `dropped`), luồng MQTT không bao giờ bị giữ lại.
+    """
+
+    def __init__(self, backend, max_buffer=10000, max_backoff=5.0):
+        self.backend = backend
+        self.max_buffer = max_buffer
+        self.max_backoff = max_backoff
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._thread.start()
+
+    def publish(self, event, data):
+        with self._cond:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            self._buffer.append((event, data))
+            self.published += 1
+            self._cond.notify()
+        return True
+
+    def close(self, timeout=2.0):
+        """Dừng luồng gửi, cố gửi nốt buffer trong `timeout` giây."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'buffered': len(self._buffer),
+                'published': self.published,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'errors': self.errors,
+            }
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if not self._buffer:
+                    return
+                event, data = self._buffer[0]
+                closing = self._closed
+
+            try:
+                self.backend.send(event, data)
+            except BlockingIOError:
+                # Hàng đợi nhận của Web Server tạm đầy (datagram): chờ rất ngắn rồi gửi lại
+                if closing:
+                    return
+                time.sleep(0.001)
+                continue
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                if closing:
+                    return
+                if backoff == 0.0:
+                    print(f"⚠️ [Bus] Chưa gửi được tới Web Server ({e}), sẽ thử lại...")
+                backoff = min(max(backoff * 2, 0.05), self.max_backoff)
+                try: self.backend.reset()
+                except Exception: pass
+                time.sleep(backoff)
+                continue
+
+            backoff = 0.0
+            with self._cond:
+                self._buffer.popleft()
+                self.sent += 1
+
+
+def create_bus(url, token=None, max_buffer=10000):
+    return EventBus(create_backend(url, token), max_buffer=max_buffer)
+
+
+def listen(url, on_event, stop=None, token=None):
+    """
+    Nhận sự kiện từ bus trong một luồng thường (không dùng eventlet), gọi
+    on_event(event, data) cho từng sự kiện. Hỗ trợ unix:// và redis://.
+    `stop` (threading.Event) để dừng vòng lặp; có `token` thì bỏ sự kiện sai chữ ký.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == 'unix':
+        sock = bind_unix_socket(url[len('unix://'):])
+        sock.settimeout(1.0)
+        receive = lambda: sock.recv(65536)
+        close = sock.close
+    elif scheme in ('redis', 'rediss'):
+        import redis  # phụ thuộc tùy chọn
+        pubsub = redis.Redis.from_url(url).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(REDIS_CHANNEL)
+        def receive():
+            msg = pubsub.get_message(timeout=1.0)
+            if msg is None:
+                raise socket.timeout()
+            return msg['data']
+        close = pubsub.close
+    else:
+        raise ValueError(f"Không thể nghe sự kiện trên: {url}")
+
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                raw = receive()
+            except socket.timeout:
+                continue
+            try:
+                event, data = decode_event(raw, token)
+            except (ValueError, KeyError) as e:
+                print(f"⚠️ [Bus] Bỏ sự kiện lỗi định dạng: {e}")
+                continue
+            on_event(event, data)
+    finally:
+        close()
@@ -0,0 +1,358 @@
+# File: collector/ingest_writer.py
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from collector.spool import SpoolFull, SpoolReplayer, bisect_failures, is_transient_message, replay_dead_letter
+
+_STOP = object()
+
+
+class IngestWriter:
+    """
+    Tầng ghi dữ liệu "write-behind" cho collector.
+
+    on_message chỉ đẩy dữ liệu vào hàng đợi có giới hạn (không chặn luồng mạng
+    của paho); một luồng ghi riêng gom các bản ghi DataReadings/AlertEvent và
+    ghi hàng loạt (executemany) trong một transaction khi đủ `batch_size` dòng
+    hoặc hết `flush_interval` giây. Cập nhật AlertEvent (đóng đợt cảnh báo,
+    tìm theo `alert_key`) chạy sau phần insert trong cùng transaction.
+    Nếu có `frames_table`, mỗi bản tin có thể kèm các dòng frame (DataFrames)
+    ghi cùng transaction.
+    Nếu có `partitions` (app.services.partitions.ReadingPartitions), dòng dữ
+    liệu/frame được ghi vào file phân vùng theo timestamp (ATTACH, tạo file khi
+    cần) thay vì bảng trong DB chính; cảnh báo vẫn ghi vào DB chính.
+    Nếu có `spool` (collector.spool.SegmentSpool), submit() ghi bản tin vào
+    spool trên đĩa thay vì hàng đợi trong RAM; luồng ghi phát lại spool từ
+    offset đã commit và chỉ lưu offset sau khi lô đã vào DB. Lô ghi lỗi (DB
+    bận/mất) được đọc lại từ spool sau `retry_interval` giây thay vì bị bỏ;
+    lô gặp lỗi không tạm thời (lỗi dữ liệu/ràng buộc) được chia đôi để ghi lại,
+    chỉ bản tin hỏng bị chuyển ra file dead-letter của spool
+    (replay_dead_letter() ghi lại sau khi đã sửa nguyên nhân).
+    Tồn đọng được ghi theo lô `replay_batch_size` dòng.
+    """
+
+    def __init__(self, engine, readings_table, alerts_table,
+                 batch_size=500, flush_interval=0.5, max_queue=10000,
+                 stats_interval=30.0, alert_key='episode_id', on_commit=None, frames_table=None,
+                 partitions=None, spool=None, retry_interval=2.0, replay_batch_size=5000):
+        self.engine = engine
+        self.readings_table = readings_table
+        self.alerts_table = alerts_table
+        self.frames_table = frames_table
+        self.partitions = partitions
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.replay_batch_size = replay_batch_size
+        self._replayer = SpoolReplayer(spool, pickle.loads) if spool is not None else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats_interval = stats_interval
+        self.alert_key = alert_key
+        # Gọi sau mỗi lần commit thành công với (readings, alerts, updates) đã ghi,
+        # VD: báo dịch vụ email rằng cảnh báo mới đã nằm trong DB
+        self.on_commit = on_commit
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Số liệu theo dõi (backpressure / hiệu năng)
+        self.enqueued = 0
+        self.dropped = 0
+        self.rows_written = 0
+        self.frames_written = 0
+        self.alerts_written = 0
+        self.alerts_updated = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.dead_lettered = 0
+        self.max_queue_depth = 0
+        self.last_flush_ms = 0.0
+        self.last_batch_rows = 0
+        # Độ trễ từ lúc submit bản tin cũ nhất trong lô tới lúc lô được ghi xong
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, readings, alerts=(), alert_updates=(), frames=()):
+        """
+        Đưa dữ liệu của một bản tin vào hàng đợi. Không bao giờ chặn:
+        nếu hàng đợi đầy thì bỏ bản tin và tăng bộ đếm `dropped`.
+        alert_updates: dict cột -> giá trị mới, kèm khóa '_key' = giá trị `alert_key`.
+        frames: các dòng của `frames_table` (bỏ qua nếu không cấu hình).
+        """
+        if self._closed:
+            return False
+        item = (readings, alerts, time.time(), alert_updates, frames)
+        if self.spool is not None:
+            try:
+                self.spool.append(pickle.dumps(item, pickle.HIGHEST_PROTOCOL))
+            except (SpoolFull, OSError) as e:
+                with self._lock:
+                    self.dropped += 1
+                print(f"❌ [Ingest] Không ghi được vào spool: {e}")
+                return False
+            with self._lock:
+                self.enqueued += 1
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return True
+
+    def stats(self):
+        spool = self.spool.stats() if self.spool is not None else None
+        with self._lock:
+            return {
+                "spool": spool,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "rows_written": self.rows_written,
+                "frames_written": self.frames_written,
+                "alerts_written": self.alerts_written,
+                "alerts_updated": self.alerts_updated,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "dead_lettered": self.dead_lettered,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "last_batch_rows": self.last_batch_rows,
+                "last_lag_ms": round(self.last_lag_ms, 2),
+                "max_lag_ms": round(self.max_lag_ms, 2),
+            }
+
+    def close(self, timeout=10.0):
+        """
+        Dừng nhận dữ liệu mới và ghi nốt toàn bộ hàng đợi xuống DB. Trả về
+        True nếu luồng ghi đã dừng (an toàn để đóng spool).
+        """
+        if self._closed or not self._thread.is_alive():
+            self._closed = True
+            return not self._thread.is_alive()
+        self._closed = True
+        # Chờ chỗ trống cho sentinel tối đa `timeout` giây để luồng ghi thoát
+        # (spool: luồng ghi tự dừng khi đã đọc hết spool sau khi _closed)
+        deadline = time.monotonic() + timeout
+        if self.spool is None:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                print(f"⚠️ [Ingest] Hàng đợi vẫn đầy sau {timeout}s, không dừng được luồng ghi")
+                return False
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        return not self._thread.is_alive()
+
+    # ------------------------------------------------------------------
+    # Luồng ghi
+    # ------------------------------------------------------------------
+    def _run(self):
+        readings, alerts, updates, frames = [], [], [], []
+        oldest = None
+        deadline = time.monotonic() + self.flush_interval
+        next_stats = time.monotonic() + self.stats_interval
+        stopping = False
+
+        while not stopping:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._get(timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                readings.extend(item[0])
+                alerts.extend(item[1])
+                updates.extend(item[3])
+                frames.extend(item[4])
+                if oldest is None:
+                    oldest = item[2]
+                # Lấy luôn những gì đang có sẵn để giảm số lần đánh thức luồng
+                while len(readings) + len(frames) < self._batch_limit():
+                    try:
+                        item = self._get()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    readings.extend(item[0])
+                    alerts.extend(item[1])
+                    updates.extend(item[3])
+                    frames.extend(item[4])
+
+            now = time.monotonic()
+            if stopping or len(readings) + len(frames) >= self._batch_limit() or now >= deadline:
+                if readings or alerts or updates or frames:
+                    error = self._flush(readings, alerts, oldest, updates, frames)
+                    if self._replayer is not None and self._settle(error):
+                        stopping = True
+                    readings, alerts, updates, frames = [], [], [], []
+                    oldest = None
+                deadline = time.monotonic() + self.flush_interval
+
+            if now >= next_stats:
+                next_stats = now + self.stats_interval
+                s = self.stats()
+                if s["enqueued"] or s["dropped"]:
+                    print(f"📊 [Ingest] {s}")
+
+        print(f"🛑 [Ingest] Đã ghi nốt hàng đợi: {self.stats()}")
+
+    def _get(self, timeout=0):
+        """Bản tin kế tiếp từ hàng đợi hoặc spool; spool: _STOP khi đã đóng và đọc hết."""
+        if self._replayer is None:
+            return self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+        try:
+            return self._replayer.get(0 if self._closed else timeout)
+        except queue.Empty:
+            if self._closed:
+                return _STOP
+            raise
+
+    def _settle(self, error):
+        """
+        Spool, sau mỗi lần ghi: commit offset của lô đã vào DB; lỗi tạm thời ->
+        đọc lại lô từ offset đã commit sau retry_interval; lỗi khác (thử lại cũng
+        lỗi y hệt) -> chia đôi lô để ghi phần còn tốt, chỉ bản tin hỏng ra
+        dead-letter. Trả về True nếu luồng ghi nên dừng (đang đóng, lô còn lại
+        trong spool).
+        """
+        if error is not None and not self.is_transient(error):
+            error, failed = bisect_failures(self._replayer.taken, self._flush_payloads,
+                                            self.is_transient, error)
+            if error is None:
+                count = self._replayer.dead_letter(failed)
+                with self._lock:
+                    self.dead_lettered += count
+                return False
+        if error is None:
+            self._replayer.commit()
+            return False
+        # Phần đã ghi trong lúc chia đôi sẽ được ghi lại (at-least-once)
+        self._replayer.rewind()
+        if self._closed:
+            return True
+        time.sleep(self.retry_interval)
+        return False
+
+    @staticmethod
+    def is_transient(error):
+        """Lỗi DB tạm thời (bị khóa, mất kết nối...): ghi lại lô sau là có thể thành công."""
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            return True
+        # ATTACH phân vùng chạy trên kết nối DBAPI nên có thể là sqlite3.OperationalError trần
+        orig = getattr(error, 'orig', None) or error
+        return isinstance(error, (OperationalError, sqlite3.OperationalError)) \
+            and is_transient_message(str(orig))
+
+    def replay_dead_letter(self, directory):
+        """Ghi lại từng bản tin trong file dead-letter của spool `directory`; trả về (đã ghi, vẫn lỗi)."""
+        return replay_dead_letter(directory, lambda payload: self._flush_payloads([payload]))
+
+    def _flush_payloads(self, payloads):
+        """Ghi các bản tin (đã pickle như trong spool) trong một transaction."""
+        readings, alerts, updates, frames = [], [], [], []
+        oldest = None
+        for payload in payloads:
+            item = pickle.loads(payload)
+            readings.extend(item[0])
+            alerts.extend(item[1])
+            updates.extend(item[3])
+            frames.extend(item[4])
+            oldest = item[2] if oldest is None else min(oldest, item[2])
+        return self._flush(readings, alerts, oldest, updates, frames)
+
+    def _batch_limit(self):
+        """Số dòng tối đa mỗi lô: lớn hơn khi đang phát lại tồn đọng trong spool."""
+        if self._replayer is not None and self._replayer.backlog:
+            return self.replay_batch_size
+        return self.batch_size
+
+    def _flush(self, readings, alerts, oldest=None, updates=(), frames=()):
+        """Ghi một lô trong một transaction; trả về None nếu thành công, ngược lại là lỗi."""
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                if frames and self.frames_table is not None:
+                    targets = [(self.readings_table, readings), (self.frames_table, frames)]
+                else:
+                    targets = [(self.readings_table, readings)]
+                self._insert_rows(conn, targets)
+                if alerts:
+                    conn.execute(self.alerts_table.insert(), alerts)
+                for rows in self._group_updates(updates):
+                    # Các khóa còn lại của dict (tên cột) trở thành mệnh đề SET
+                    stmt = self.alerts_table.update()\
+                        .where(self.alerts_table.c[self.alert_key] == bindparam('_key'))
+                    conn.execute(stmt, rows)
+                conn.commit()
+        except Exception as e:
+            with self._lock:
+                self.flush_errors += 1
+            print(f"❌ [Ingest] Lỗi ghi {len(readings)} dòng dữ liệu, {len(frames)} frame, {len(alerts)} cảnh báo: {e}")
+            return e
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.rows_written += len(readings)
+            self.frames_written += len(frames)
+            self.alerts_written += len(alerts)
+            self.alerts_updated += len(updates)
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.last_batch_rows = len(readings) + len(frames)
+            if oldest is not None:
+                self.last_lag_ms = (time.time() - oldest) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(readings, alerts, updates)
+            except Exception as e:
+                print(f"⚠️ [Ingest] Lỗi on_commit: {e}")
+        return None
+
+    def _insert_rows(self, conn, targets):
+        """Insert dòng dữ liệu/frame: thẳng vào bảng, hoặc theo từng phân vùng."""
+        if self.partitions is None:
+            for table, rows in targets:
+                if rows:
+                    conn.execute(table.insert(), rows)
+            return
+        groups = [(table, self.partitions.split(rows)) for table, rows in targets]
+        # ATTACH (và tạo file) phải xong trước câu lệnh ghi đầu tiên của transaction
+        self.partitions.attach(conn, {p for _, by_part in groups for p in by_part}, create=True)
+        for table, by_part in groups:
+            for p, rows in by_part.items():
+                conn.execute(table.insert(), rows, execution_options=self.partitions.options(p))
+
+    @staticmethod
+    def _group_updates(updates):
+        """executemany cần mọi dòng có cùng tập cột: gom theo tập cột."""
+        groups = {}
+        for row in updates:
+            columns = tuple(sorted(k for k in row if k != '_key'))
+            groups.setdefault(columns, []).append(row)
+        return groups.values()
@@ -0,0 +1,32 @@
+# File: collector/live_sequence.py
+import threading
+import uuid
+
+
+class LiveSequencer:
+    """
+    Đánh số thứ tự tăng dần theo user cho các sự kiện realtime gửi lên Web.
+
+    `stream` đổi mỗi lần collector khởi động (số thứ tự bắt đầu lại từ 1), nên
+    Web/trình duyệt so sánh theo cặp (stream, seq). Chỉ đúng khi mỗi user do
+    một tiến trình phát (chế độ hash hoặc 1 worker); với $share nhiều worker
+    thì tắt (enabled=False) và sự kiện không mang số thứ tự.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stream = uuid.uuid4().hex[:12]
+        self._seq = {}  # user_id -> số thứ tự cuối cùng đã cấp
+        self._lock = threading.Lock()
+
+    def stamp(self, payload):
+        """Gắn 'stream' và 'seq' vào payload (có 'user_id'), trả lại chính payload."""
+        if not self.enabled:
+            return payload
+        user_id = payload['user_id']
+        with self._lock:
+            seq = self._seq.get(user_id, 0) + 1
+            self._seq[user_id] = seq
+        payload['stream'] = self.stream
+        payload['seq'] = seq
+        return payload
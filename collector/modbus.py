@@ -0,0 +1,143 @@
+# File: collector/modbus.py
+import struct
+
+# Bảng tra CRC-16/Modbus (đa thức đảo 0xA001), tính một lần khi import
+def _build_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+CRC16_TABLE = _build_crc_table()
+
+FUNC_READ_HOLDING = 0x03
+
+# Cache các đối tượng Struct theo số thanh ghi (big-endian, uint16)
+_REGISTER_STRUCTS = {}
+
+
+def crc16(data):
+    """Tính CRC-16/Modbus bằng bảng tra (1 phép tra mỗi byte)."""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc
+
+
+def crc_ok(data):
+    """Kiểm tra CRC của một frame Modbus RTU (2 byte CRC cuối, little-endian)."""
+    if len(data) < 4: return False
+    crc_recv = data[-2] | (data[-1] << 8)
+    with memoryview(data) as view, view[:-2] as body:
+        return crc16(body) == crc_recv
+
+
+def decode_registers(data, count, offset=3):
+    """
+    Giải mã `count` thanh ghi 16-bit (big-endian) bắt đầu từ `offset`
+    trong một lần gọi, không tạo bản sao của buffer.
+    """
+    fmt = _REGISTER_STRUCTS.get(count)
+    if fmt is None:
+        fmt = _REGISTER_STRUCTS[count] = struct.Struct(f">{count}H")
+    return fmt.unpack_from(data, offset)
+
+
+def parse_read_response(payload, slave=None, min_registers=0):
+    """
+    Phân tích frame phản hồi lệnh 0x03 (Read Holding Registers):
+        [slave][0x03][byte_count][data ...][crc_lo][crc_hi]
+
+    Trả về tuple các giá trị thanh ghi thô, hoặc None nếu frame sai
+    (sai slave/function, thiếu dữ liệu hoặc sai CRC).
+    """
+    if len(payload) < 5: return None
+    view = memoryview(payload)
+    if view[1] != FUNC_READ_HOLDING: return None
+    if slave is not None and view[0] != slave: return None
+
+    byte_count = view[2]
+    frame_len = 3 + byte_count + 2
+    if len(view) < frame_len: return None
+    if byte_count < min_registers * 2: return None
+
+    frame = view[:frame_len]
+    if not crc_ok(frame): return None
+
+    return decode_registers(frame, byte_count // 2)
+
+
+class FrameScanner:
+    """
+    Bộ tách frame Modbus RTU độ dài cố định từ luồng TCP (RS485-to-TCP).
+
+    Giữ một bytearray cùng vị trí đọc thay vì cắt lại buffer sau mỗi byte;
+    khi lệch khung thì dùng bytearray.find() để nhảy tới vị trí có
+    `signature` (function code + byte count) tiếp theo rồi mới tính CRC.
+    """
+
+    def __init__(self, frame_len=9, signature=b"\x03\x04", max_buffer=65536):
+        self.frame_len = frame_len
+        self.signature = signature
+        self.max_buffer = max_buffer
+        self._buf = bytearray()
+        self._pos = 0
+
+        self.frames = 0
+        self.skipped_bytes = 0
+
+    def feed(self, chunk):
+        """Thêm dữ liệu mới, trả về danh sách các frame hợp lệ (bytes) tìm được."""
+        buf = self._buf
+        buf += chunk
+        pos = self._pos
+        frame_len = self.frame_len
+        signature = self.signature
+        end = len(buf)
+        frames = []
+
+        with memoryview(buf) as view:
+            while end - pos >= frame_len:
+                if signature:
+                    # signature nằm ngay sau byte địa chỉ slave
+                    found = buf.find(signature, pos + 1, end)
+                    if found < 0:
+                        # Giữ lại phần đuôi có thể là đầu của frame kế tiếp
+                        new_pos = max(pos, end - len(signature))
+                        self.skipped_bytes += new_pos - pos
+                        pos = new_pos
+                        break
+                    if found - 1 > pos:
+                        self.skipped_bytes += found - 1 - pos
+                        pos = found - 1
+                    if end - pos < frame_len:
+                        break
+
+                with view[pos:pos + frame_len] as candidate:
+                    valid = crc_ok(candidate)
+                    if valid:
+                        frames.append(bytes(candidate))
+                if valid:
+                    pos += frame_len
+                else:
+                    self.skipped_bytes += 1
+                    pos += 1
+
+        # Thu gọn buffer một lần cho mỗi chunk
+        if pos:
+            del buf[:pos]
+            pos = 0
+        if len(buf) > self.max_buffer:
+            self.skipped_bytes += len(buf) - frame_len
+            del buf[:len(buf) - frame_len]
+        self._pos = pos
+
+        self.frames += len(frames)
+        return frames
@@ -0,0 +1,52 @@
+# File: collector/sharding.py
+import bisect
+import hashlib
+
+SHARE_PREFIX = '$share/'
+
+
+def _hash(key):
+    # Không dùng hash() của Python: giá trị đổi theo từng tiến trình (PYTHONHASHSEED)
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing: mỗi worker chiếm `replicas` điểm ảo trên vòng băm.
+    Thêm/bớt một worker chỉ làm đổi chủ khoảng 1/N số key, các key còn lại
+    giữ nguyên worker cũ.
+    """
+
+    def __init__(self, nodes, replicas=100):
+        points = []
+        for node in nodes:
+            for r in range(replicas):
+                points.append((_hash(f"{node}#{r}"), node))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def node_for(self, key):
+        if not self._keys:
+            raise LookupError("HashRing rỗng")
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[i]
+
+    def owner(self, node):
+        """Trả về hàm owns(key) -> bool cho một worker, dùng để lọc bảng định tuyến."""
+        return lambda key: self.node_for(key) == node
+
+
+def shared_filter(group, topic_filter):
+    """Filter MQTT v5 shared subscription: broker chia mỗi message cho MỘT worker trong nhóm."""
+    return f"{SHARE_PREFIX}{group}/{topic_filter}"
+
+
+def split_shared(subscription):
+    """'$share/g/a/+' -> ('g', 'a/+'); filter thường -> (None, filter)."""
+    if subscription.startswith(SHARE_PREFIX):
+        group, _, topic_filter = subscription[len(SHARE_PREFIX):].partition('/')
+        if group and topic_filter:
+            return group, topic_filter
+        raise ValueError(f"Shared subscription sai cú pháp: {subscription}")
+    return None, subscription
@@ -0,0 +1,393 @@
+# File: collector/spool.py
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+# Mỗi bản ghi: độ dài payload (uint32) + crc32 của payload, rồi payload
+_HEADER = struct.Struct('<II')
+_SEGMENT_RE = re.compile(r'^(\d{20})\.seg$')
+COMMITTED_FILE = 'committed'
+# Bản ghi không thể ghi vào DB (lỗi dữ liệu), cùng định dạng bản ghi với segment
+DEAD_LETTER_FILE = 'dead-letter'
+# Lỗi DB tạm thời (thông báo của OperationalError): phát lại sau; lỗi khác -> dead-letter
+TRANSIENT_DB_ERRORS = ('locked', 'busy', 'unable to open', 'disk i/o', 'disk is full',
+                       'connection', 'timeout', 'gone away')
+
+
+def is_transient_message(message):
+    message = message.lower()
+    return any(marker in message for marker in TRANSIENT_DB_ERRORS)
+
+
+def bisect_failures(payloads, write, transient, error):
+    """
+    Tìm các bản ghi làm lô `payloads` ghi lỗi (`error`: lỗi của cả lô) bằng
+    cách chia đôi và ghi lại từng nửa qua write(payloads) -> None | lỗi; các
+    nửa ghi được đã nằm trong DB. Một bản ghi hỏng trong lô n bản ghi tốn
+    khoảng 2·log2(n) lần ghi. Trả về (lỗi tạm thời gặp giữa chừng hoặc None,
+    list (payload, lỗi) của các bản ghi không thể ghi).
+    """
+    if transient(error):
+        return error, []
+    if len(payloads) == 1:
+        return None, [(payloads[0], error)]
+    mid = len(payloads) // 2
+    failed = []
+    for half in (payloads[:mid], payloads[mid:]):
+        half_error = write(half)
+        if half_error is None:
+            continue
+        half_error, half_failed = bisect_failures(half, write, transient, half_error)
+        if half_error is not None:
+            return half_error, failed
+        failed.extend(half_failed)
+    return None, failed
+
+
+def _append_records(path, payloads):
+    """Nối các bản ghi (cùng định dạng segment) vào cuối file, fsync."""
+    with open(path, 'ab') as f:
+        for payload in payloads:
+            f.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_records(path):
+    """Các payload của file bản ghi, dừng ở bản ghi ghi dở / sai CRC."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    out = []
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, pos)
+        payload = data[pos + _HEADER.size:pos + _HEADER.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        out.append(payload)
+        pos += _HEADER.size + length
+    return out
+
+
+def replay_dead_letter(directory, write):
+    """
+    Ghi lại từng bản ghi trong file dead-letter của spool `directory` qua
+    write(payload) -> None | lỗi, sau khi đã sửa nguyên nhân lỗi. File được
+    đổi tên trước khi đọc nên collector vẫn chạy được; bản ghi vẫn lỗi được nối
+    lại vào file dead-letter. Trả về (số đã ghi, số vẫn lỗi).
+    """
+    path = os.path.join(directory, DEAD_LETTER_FILE)
+    taken = path + '.replay'
+    # File .replay còn lại: lần phát lại trước dừng giữa chừng, xử lý nó trước
+    if not os.path.exists(taken):
+        try:
+            os.replace(path, taken)
+        except FileNotFoundError:
+            return 0, 0
+    written, failed = 0, []
+    for payload in _read_records(taken):
+        error = write(payload)
+        if error is None:
+            written += 1
+        else:
+            failed.append(payload)
+    if failed:
+        _append_records(path, failed)
+    os.remove(taken)
+    return written, len(failed)
+
+
+class SpoolFull(Exception):
+    """Spool đã chứa quá `max_bytes` chưa được ghi vào DB."""
+
+
+class _Segment:
+    """Một file segment đã map vào bộ nhớ; `base` = offset toàn cục của byte đầu tiên."""
+
+    def __init__(self, path, base, size=None):
+        self.path = path
+        self.base = base
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if size is not None:
+                # Giữ chỗ trên đĩa ngay: ghi vào mmap khi đĩa đầy sẽ làm tiến trình chết (SIGBUS)
+                if hasattr(os, 'posix_fallocate'):
+                    os.posix_fallocate(fd, 0, size)
+                else:
+                    os.ftruncate(fd, size)
+            self.size = os.fstat(fd).st_size
+            # File rỗng (crash trước khi kịp cấp phát) vẫn map được một trang toàn số 0
+            if self.size == 0:
+                os.ftruncate(fd, mmap.PAGESIZE)
+                self.size = mmap.PAGESIZE
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def scan(self):
+        """Vị trí sau bản ghi hợp lệ cuối cùng (dừng ở header rỗng / bị ghi dở / sai CRC)."""
+        pos = 0
+        while pos + _HEADER.size <= self.size:
+            length, crc = _HEADER.unpack_from(self.map, pos)
+            end = pos + _HEADER.size + length
+            if length == 0 or end > self.size or zlib.crc32(self.map[pos + _HEADER.size:end]) != crc:
+                break
+            pos = end
+        return pos
+
+    def close(self):
+        self.map.close()
+
+
+class SegmentSpool:
+    """
+    Hàng đợi bền vững chỉ-ghi-thêm trên đĩa cục bộ cho collector: bản tin được
+    ghi vào spool trước (memcpy vào file segment đã mmap, không chạm DB), một
+    luồng phát lại (SpoolReplayer) đọc lại theo lô lớn, ghi DB rồi lưu offset
+    đã commit. DB bận/mất kết nối hay collector bị kill thì dữ liệu vẫn nằm
+    trong spool và được ghi tiếp từ offset đã commit ở lần chạy sau
+    (at-least-once: chết giữa commit DB và lưu offset -> lô cuối ghi lại).
+
+    Offset là vị trí byte toàn cục: segment `<base>.seg` chứa các offset từ
+    base tới base của segment kế tiếp. Mỗi lần mở spool bắt đầu một segment
+    mới sau bản ghi hợp lệ cuối cùng, nên phần đuôi ghi dở lúc crash không bao
+    giờ bị đọc. Segment đã phát lại hết bị xóa khi commit.
+    sync_interval: msync dữ liệu mới tối thiểu mỗi N giây (bền cả khi mất điện);
+    None = để hệ điều hành tự ghi (chỉ bền khi tiến trình chết).
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_bytes=None, sync_interval=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._segments = []
+        self._synced = 0
+        self._last_sync = time.monotonic()
+        self.appended = 0
+        self.dead_lettered = 0
+
+        for name in sorted(os.listdir(directory)):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                self._segments.append(_Segment(os.path.join(directory, name), int(match.group(1))))
+        self.committed = self._read_committed()
+        self.end = self.committed
+        if self._segments:
+            last = self._segments[-1]
+            self.end = last.base + last.scan()
+            if self.end == last.base:
+                # Segment chưa có bản ghi nào (crash ngay sau khi tạo): bỏ, segment mới dùng lại tên
+                self._segments.pop().close()
+                os.remove(last.path)
+            self.committed = min(max(self.committed, self._segments[0].base if self._segments else 0), self.end)
+        if self.end > self.committed:
+            print(f"♻️ [Spool] {directory}: còn {self.end - self.committed:,} byte chưa ghi DB "
+                  f"(offset {self.committed:,} -> {self.end:,})")
+        self._active = None
+        self._pos = 0
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
+    def append(self, payload):
+        """Ghi thêm một bản ghi (bytes khác rỗng); trả về offset sau bản ghi."""
+        need = _HEADER.size + len(payload)
+        with self._cond:
+            if self.max_bytes is not None and self.end - self.committed + need > self.max_bytes:
+                raise SpoolFull(f"spool vượt {self.max_bytes} byte chưa ghi DB")
+            if self._active is None or self._pos + need > self._active.size:
+                self._roll(need)
+            seg, pos = self._active, self._pos
+            _HEADER.pack_into(seg.map, pos, len(payload), zlib.crc32(payload))
+            seg.map[pos + _HEADER.size:pos + need] = payload
+            self._pos = pos + need
+            self.end += need
+            self.appended += 1
+            if self.sync_interval is not None and time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+            self._cond.notify_all()
+            return self.end
+
+    def _roll(self, need):
+        """Mở segment mới bắt đầu tại self.end (đủ chỗ cho bản ghi lớn hơn segment_bytes)."""
+        if self._active is not None:
+            self._sync()
+        size = max(self.segment_bytes, need)
+        seg = _Segment(os.path.join(self.directory, f"{self.end:020d}.seg"), self.end, size)
+        self._segments.append(seg)
+        self._active, self._pos = seg, 0
+        self._synced = 0
+
+    def _sync(self):
+        seg = self._active
+        if seg is not None and self._pos > self._synced:
+            start = self._synced - self._synced % mmap.ALLOCATIONGRANULARITY
+            seg.map.flush(start, self._pos - start)
+            self._synced = self._pos
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    # ------------------------------------------------------------------
+    # Đọc / commit
+    # ------------------------------------------------------------------
+    def wait(self, offset, timeout):
+        """Chờ tới khi có dữ liệu sau `offset`; trả về True nếu có."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.end > offset, timeout)
+
+    def read(self, offset, max_records=1000, max_bytes=8 * 1024 * 1024):
+        """Các bản ghi từ `offset`: list (payload, offset sau bản ghi)."""
+        with self._lock:
+            end = self.end
+            segments = list(self._segments)
+        out = []
+        size = 0
+        for i, seg in enumerate(segments):
+            seg_end = segments[i + 1].base if i + 1 < len(segments) else end
+            if offset >= seg_end:
+                continue
+            offset = max(offset, seg.base)
+            while offset < seg_end and len(out) < max_records and size < max_bytes:
+                pos = offset - seg.base
+                length, crc = _HEADER.unpack_from(seg.map, pos)
+                payload = seg.map[pos + _HEADER.size:pos + _HEADER.size + length]
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    # Không xảy ra với segment do spool tự ghi; bỏ phần hỏng của segment này
+                    print(f"⚠️ [Spool] Bản ghi hỏng tại offset {offset:,} ({seg.path}), bỏ qua phần còn lại")
+                    offset = seg_end
+                    break
+                offset += _HEADER.size + length
+                out.append((payload, offset))
+                size += length
+            if len(out) >= max_records or size >= max_bytes:
+                break
+        return out
+
+    def commit(self, offset):
+        """Lưu offset đã ghi DB xong (ghi file tạm + rename) và xóa segment đã đọc hết."""
+        with self._lock:
+            if offset <= self.committed:
+                return
+            self.committed = offset
+            tmp = os.path.join(self.directory, COMMITTED_FILE + '.tmp')
+            with open(tmp, 'w') as f:
+                f.write(str(offset))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, COMMITTED_FILE))
+            while len(self._segments) > 1 and self._segments[1].base <= offset:
+                seg = self._segments.pop(0)
+                seg.close()
+                os.remove(seg.path)
+
+    def dead_letter(self, payloads, reason):
+        """Ghi thêm các bản ghi không thể ghi vào DB ra file dead-letter (xử lý tay sau)."""
+        path = os.path.join(self.directory, DEAD_LETTER_FILE)
+        _append_records(path, payloads)
+        with self._lock:
+            self.dead_lettered += len(payloads)
+        print(f"☠️ [Spool] {len(payloads)} bản ghi -> {path}: {reason}")
+
+    def _read_committed(self):
+        try:
+            with open(os.path.join(self.directory, COMMITTED_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "appended": self.appended,
+                "dead_lettered": self.dead_lettered,
+                "pending_bytes": self.end - self.committed,
+                "committed": self.committed,
+            }
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for seg in self._segments:
+                seg.close()
+            self._segments = []
+            self._active = None
+
+
+class SpoolReplayer:
+    """
+    Đọc lại spool từ offset đã commit cho luồng ghi DB: get() trả từng bản ghi
+    đã giải mã (đọc trước theo lô `read_records`), commit() lưu offset sau bản
+    ghi cuối đã lấy khi lô đã vào DB, rewind() quay về offset đã commit khi
+    ghi DB lỗi tạm thời (đọc lại lô đó ở lần thử sau), dead_letter() chuyển
+    các bản ghi lỗi dữ liệu của lô ra file dead-letter rồi commit qua cả lô.
+    """
+
+    def __init__(self, spool, decode, read_records=1000):
+        self.spool = spool
+        self.decode = decode
+        self.read_records = read_records
+        self._buffer = deque()
+        # Payload đã lấy từ sau offset đã commit (lô đang ghi)
+        self._taken = []
+        self._read_offset = spool.committed
+        self.position = spool.committed
+
+    def get(self, timeout=0):
+        """Bản ghi kế tiếp; chờ tối đa timeout giây, hết giờ -> queue.Empty."""
+        if not self._buffer:
+            if not self.spool.wait(self._read_offset, timeout):
+                raise queue.Empty
+            records = self.spool.read(self._read_offset, max_records=self.read_records)
+            if not records:
+                raise queue.Empty
+            self._read_offset = records[-1][1]
+            self._buffer.extend(records)
+        payload, self.position = self._buffer.popleft()
+        self._taken.append(payload)
+        return self.decode(payload)
+
+    @property
+    def backlog(self):
+        """Còn dữ liệu trong spool chưa đọc (đang phát lại tồn đọng)."""
+        return bool(self._buffer) or self.spool.end > self._read_offset
+
+    def commit(self):
+        self.spool.commit(self.position)
+        self._taken = []
+
+    def rewind(self):
+        self._buffer.clear()
+        self._taken = []
+        self._read_offset = self.position = self.spool.committed
+
+    @property
+    def taken(self):
+        """Payload của lô đang ghi (đã lấy từ sau offset đã commit)."""
+        return list(self._taken)
+
+    def dead_letter(self, failures):
+        """
+        failures: list (payload, lỗi) của lô đang ghi (xem bisect_failures),
+        phần còn lại của lô đã vào DB. Ghi chúng ra file dead-letter rồi commit
+        qua cả lô; trả về số bản ghi bị bỏ.
+        """
+        for payload, error in failures:
+            self.spool.dead_letter([payload], str(error).splitlines()[0])
+        self.commit()
+        return len(failures)
@@ -0,0 +1,221 @@
+# File: collector/sqlite_store.py
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+
+from collector.spool import SpoolFull, SpoolReplayer, bisect_failures, is_transient_message
+
+
+class SQLiteStore:
+    """
+    Backend lưu trữ cho collector TCP thô.
+
+    Giữ MỘT kết nối SQLite dùng suốt vòng đời (WAL, synchronous=NORMAL,
+    cache lớn). add()/add_many() chỉ nối dữ liệu vào danh sách chờ; luồng nền
+    commit bằng executemany khi đủ `commit_rows` dòng hoặc sau `commit_ms`
+    mili-giây. Câu INSERT luôn là cùng một chuỗi nên sqlite3 chỉ prepare một lần.
+    Nếu có `spool` (collector.spool.SegmentSpool), dữ liệu được ghi vào spool
+    trên đĩa trước và luồng nền đọc lại từ offset đã commit: lô lỗi (DB bị
+    khóa, đĩa đầy...) được thử lại sau `retry_interval` giây thay vì bị bỏ;
+    lô lỗi dữ liệu (thử lại cũng lỗi y hệt) được chia đôi để ghi lại, chỉ bản
+    ghi hỏng bị chuyển ra file dead-letter.
+    """
+
+    def __init__(self, db_path, insert_sql, commit_rows=500, commit_ms=500,
+                 cache_size_kb=20000, busy_timeout_ms=5000, spool=None, retry_interval=2.0):
+        self.db_path = db_path
+        self.insert_sql = insert_sql
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_ms / 1000.0
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self._replayer = SpoolReplayer(spool, pickle.loads) if spool is not None else None
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA cache_size=-{int(cache_size_kb)}")
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        # Tổng số dòng đã nhận / đã xử lý xong (dùng cho flush() chờ đồng bộ)
+        self._enqueued = 0
+        self._done = 0
+
+        self.rows_written = 0
+        self.commits = 0
+        self.errors = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+
+        target = self._run if spool is None else self._run_spool
+        self._thread = threading.Thread(target=target, name="sqlite-store", daemon=True)
+        self._thread.start()
+
+    def add(self, row):
+        if self.spool is not None:
+            return self._spool_rows([row])
+        with self._cond:
+            self._pending.append(row)
+            self._enqueued += 1
+            if len(self._pending) >= self.commit_rows:
+                self._cond.notify()
+
+    def add_many(self, rows):
+        if self.spool is not None:
+            return self._spool_rows(rows)
+        with self._cond:
+            self._pending.extend(rows)
+            self._enqueued += len(rows)
+            if len(self._pending) >= self.commit_rows:
+                self._cond.notify()
+
+    def _spool_rows(self, rows):
+        try:
+            self.spool.append(pickle.dumps(list(rows), pickle.HIGHEST_PROTOCOL))
+        except (SpoolFull, OSError) as e:
+            with self._cond:
+                self.dropped += len(rows)
+            print(f"[DB] ❌ Không ghi được vào spool ({len(rows)} dòng): {e}")
+            return
+        with self._cond:
+            self._enqueued += len(rows)
+
+    def flush(self, timeout=None):
+        """Commit ngay dữ liệu đang chờ và đợi tới khi ghi xong."""
+        if self.spool is not None:
+            # Luồng nền tự đọc spool (chậm nhất commit_ms), chờ offset đã commit tới cuối spool
+            target = self.spool.end
+            with self._cond:
+                return self._cond.wait_for(lambda: self.spool.committed >= target or self._closed, timeout)
+        with self._cond:
+            target = self._enqueued
+            if self._done >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify()
+            return self._cond.wait_for(lambda: self._done >= target or self._closed, timeout)
+
+    def close(self):
+        """Ghi nốt dữ liệu còn lại, dừng luồng nền và đóng kết nối."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._conn.close()
+
+    def stats(self):
+        spool = self.spool.stats() if self.spool is not None else None
+        with self._cond:
+            return {
+                "spool": spool,
+                "dropped": self.dropped,
+                "pending": len(self._pending),
+                "rows_written": self.rows_written,
+                "commits": self.commits,
+                "errors": self.errors,
+                "dead_lettered": self.dead_lettered,
+            }
+
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.commit_interval
+                while (len(self._pending) < self.commit_rows
+                       and not self._flush_requested and not self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._flush_requested = False
+                closing = self._closed
+
+            if batch:
+                self._commit(batch)
+                with self._cond:
+                    self._done += len(batch)
+                    self._cond.notify_all()
+
+            if closing:
+                with self._cond:
+                    batch, self._pending = self._pending, []
+                if batch:
+                    self._commit(batch)
+                return
+
+    def _run_spool(self):
+        """Như _run nhưng lấy lô từ spool (kể cả phần tồn từ lần chạy trước)."""
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.commit_rows:
+                with self._cond:
+                    hurry = self._flush_requested or self._closed
+                timeout = 0 if hurry else deadline - time.monotonic()
+                try:
+                    batch.extend(self._replayer.get(max(timeout, 0)))
+                except queue.Empty:
+                    if timeout <= 0:
+                        break
+            with self._cond:
+                self._flush_requested = False
+                closing = self._closed
+
+            if batch:
+                error = self._commit(batch)
+                if error is not None and not self._is_transient(error):
+                    # Lỗi dữ liệu: chia đôi lô, chỉ bản ghi hỏng ra dead-letter
+                    error, failed = bisect_failures(self._replayer.taken, self._commit_payloads,
+                                                    self._is_transient, error)
+                    if error is None:
+                        count = self._replayer.dead_letter(failed)
+                        with self._cond:
+                            self.dead_lettered += count
+                if error is None:
+                    self._replayer.commit()
+                else:
+                    # Lô vẫn nằm trong spool: đọc lại từ offset đã commit
+                    self._replayer.rewind()
+                    if closing:
+                        return
+                    time.sleep(self.retry_interval)
+                    continue
+                with self._cond:
+                    self._done += len(batch)
+                    self._cond.notify_all()
+            if closing and not self._replayer.backlog:
+                return
+
+    @staticmethod
+    def _is_transient(error):
+        return isinstance(error, sqlite3.OperationalError) and is_transient_message(str(error))
+
+    def _commit_payloads(self, payloads):
+        return self._commit([row for payload in payloads for row in pickle.loads(payload)])
+
+    def _commit(self, batch):
+        """Ghi một lô trong một transaction; trả về None nếu thành công, ngược lại là lỗi."""
+        try:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(self.insert_sql, batch)
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            try: self._conn.execute("ROLLBACK")
+            except sqlite3.Error: pass
+            with self._cond:
+                self.errors += 1
+            print(f"[DB] ❌ Error ({len(batch)} dòng): {e}")
+            return e
+        with self._cond:
+            self.rows_written += len(batch)
+            self.commits += 1
+        return None
@@ -0,0 +1,131 @@
+# File: collector/supervisor.py
+import multiprocessing
+import queue
+import time
+
+# Luôn dùng "spawn": worker là tiến trình sạch (không kế thừa luồng/kết nối DB
+# của cha) và hành vi giống nhau trên Linux lẫn Windows.
+_ctx = multiprocessing.get_context('spawn')
+
+
+class Supervisor:
+    """
+    Chạy N tiến trình worker `target(worker_id, workers, stats_queue, **kwargs)`,
+    tự khởi động lại worker bị chết và gom số liệu mỗi worker gửi về qua
+    `stats_queue` (dict có ít nhất 'messages'; supervisor tự tính msg/s).
+    """
+
+    def __init__(self, target, workers, kwargs=None, stats_interval=10.0,
+                 restart_delay=2.0, report=print):
+        self.target = target
+        self.workers = workers
+        self.kwargs = kwargs or {}
+        self.stats_interval = stats_interval
+        self.restart_delay = restart_delay
+        self.report = report
+
+        self.stats_queue = _ctx.Queue()
+        self._procs = {}
+        self._latest = {}
+        self._rates = {}
+        self._dead_since = {}
+        self.restarts = 0
+
+    def start(self):
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        return self
+
+    def _spawn(self, worker_id):
+        proc = _ctx.Process(
+            target=self.target,
+            args=(worker_id, self.workers, self.stats_queue),
+            kwargs=self.kwargs,
+            name=f"collector-{worker_id}",
+            daemon=False,
+        )
+        proc.start()
+        self._procs[worker_id] = proc
+        self._dead_since.pop(worker_id, None)
+
+    def poll(self, timeout=0.0):
+        """Nhận số liệu đang chờ và khởi động lại worker đã chết (sau restart_delay)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                worker_id, snapshot = self.stats_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            self._record(worker_id, snapshot)
+
+        now = time.monotonic()
+        for worker_id, proc in list(self._procs.items()):
+            if proc.is_alive():
+                continue
+            died = self._dead_since.setdefault(worker_id, now)
+            if now - died >= self.restart_delay:
+                self.report(f"⚠️ [Supervisor] Worker {worker_id} (pid {proc.pid}) thoát mã {proc.exitcode}, khởi động lại")
+                self.restarts += 1
+                self._spawn(worker_id)
+
+    def _record(self, worker_id, snapshot):
+        prev = self._latest.get(worker_id)
+        if prev is not None and prev.get('pid') == snapshot.get('pid'):
+            elapsed = snapshot['time'] - prev['time']
+            if elapsed > 0:
+                self._rates[worker_id] = (snapshot['messages'] - prev['messages']) / elapsed
+        self._latest[worker_id] = snapshot
+
+    def stats(self):
+        """Số liệu mới nhất của từng worker kèm tốc độ msg/s và tổng cộng."""
+        per_worker = {}
+        for worker_id, snapshot in sorted(self._latest.items()):
+            per_worker[worker_id] = dict(snapshot, msg_per_s=round(self._rates.get(worker_id, 0.0), 1))
+        total = {
+            'messages': sum(s.get('messages', 0) for s in per_worker.values()),
+            'msg_per_s': round(sum(s['msg_per_s'] for s in per_worker.values()), 1),
+            'alive': sum(1 for p in self._procs.values() if p.is_alive()),
+            'restarts': self.restarts,
+        }
+        return {'workers': per_worker, 'total': total}
+
+    def log_stats(self):
+        s = self.stats()
+        for worker_id, w in s['workers'].items():
+            self.report(f"📊 [Worker {worker_id}] pid={w.get('pid')} {w['msg_per_s']} msg/s "
+                        f"msgs={w.get('messages')} routes={w.get('routes')} "
+                        f"queue={w.get('queue_depth')} lag={w.get('last_lag_ms')}ms "
+                        f"dropped={w.get('dropped')}")
+        self.report(f"📊 [Supervisor] {s['total']}")
+
+    def run_forever(self):
+        next_report = time.monotonic() + self.stats_interval
+        try:
+            while True:
+                self.poll(timeout=min(1.0, max(0.0, next_report - time.monotonic())))
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + self.stats_interval
+                    self.log_stats()
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10.0):
+        """Yêu cầu các worker dừng (SIGTERM -> ghi nốt hàng đợi) rồi chờ thoát."""
+        procs = list(self._procs.values())
+        self._procs = {}
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + timeout
+        for proc in procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        # Số liệu cuối cùng worker gửi trước khi thoát
+        while True:
+            try:
+                worker_id, snapshot = self.stats_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            self._record(worker_id, snapshot)
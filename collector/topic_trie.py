@@ -0,0 +1,158 @@
+# File: collector/topic_trie.py
+
+SINGLE = '+'
+MULTI = '#'
+
+
+def validate_filter(topic_filter):
+    """Kiểm tra cú pháp topic filter MQTT; ném ValueError nếu sai."""
+    if not topic_filter:
+        raise ValueError("Topic không được để trống")
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+        if MULTI in level and (level != MULTI or i != len(levels) - 1):
+            raise ValueError("'#' phải đứng một mình ở cấp cuối cùng")
+        if SINGLE in level and level != SINGLE:
+            raise ValueError("'+' phải chiếm trọn một cấp")
+    return levels
+
+
+def is_wildcard(topic_filter):
+    return SINGLE in topic_filter or MULTI in topic_filter
+
+
+class _Node:
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children = {}
+        self.values = {}  # filter -> value
+
+
+class TopicTrie:
+    """
+    Cây tiền tố theo cấp topic, hỗ trợ filter '+' (một cấp) và '#' (nhiều cấp).
+    match() duyệt tối đa 3 nhánh mỗi cấp (chính xác, '+', '#') nên chi phí
+    phụ thuộc độ sâu topic chứ không phụ thuộc số filter đã đăng ký.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, topic_filter, value):
+        node = self._root
+        for level in validate_filter(topic_filter):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+        if topic_filter not in node.values:
+            self._size += 1
+        node.values[topic_filter] = value
+
+    def remove(self, topic_filter):
+        levels = topic_filter.split('/')
+        path = [self._root]
+        for level in levels:
+            child = path[-1].children.get(level)
+            if child is None:
+                return False
+            path.append(child)
+        if topic_filter not in path[-1].values:
+            return False
+        del path[-1].values[topic_filter]
+        self._size -= 1
+        # Dọn các nút không còn filter/nhánh con
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.values or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+        return True
+
+    def match(self, topic):
+        """Trả về danh sách (filter, value) khớp với topic cụ thể."""
+        levels = topic.split('/')
+        # Theo chuẩn MQTT, topic bắt đầu bằng '$' không khớp wildcard ở cấp đầu
+        system = topic.startswith('$')
+        results = []
+        stack = [(self._root, 0)]
+        n = len(levels)
+        while stack:
+            node, depth = stack.pop()
+            wildcards_ok = not (system and depth == 0)
+            if wildcards_ok:
+                multi = node.children.get(MULTI)
+                if multi is not None:
+                    results.extend(multi.values.items())
+            if depth == n:
+                results.extend(node.values.items())
+                continue
+            child = node.children.get(levels[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            if wildcards_ok:
+                single = node.children.get(SINGLE)
+                if single is not None:
+                    stack.append((single, depth + 1))
+        return results
+
+    def is_covered(self, topic_filter):
+        """
+        True nếu có filter KHÁC trong cây bao trùm mọi topic mà `topic_filter`
+        khớp (VD: 'site/#' bao 'site/+/rtu', 'site/+/rtu' bao 'site/1/rtu').
+        """
+        levels = topic_filter.split('/')
+        n = len(levels)
+        stack = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            multi = node.children.get(MULTI)
+            if multi is not None and any(f != topic_filter for f in multi.values):
+                return True
+            if depth == n:
+                if any(f != topic_filter for f in node.values):
+                    return True
+                continue
+            level = levels[depth]
+            if level == MULTI:
+                # Chỉ một '#' ở cùng cấp (đã xét ở trên) mới bao được '#'
+                continue
+            child = node.children.get(level)
+            if child is not None:
+                stack.append((child, depth + 1))
+            # '+' bao một cấp bất kỳ (kể cả '+')
+            if level != SINGLE:
+                single = node.children.get(SINGLE)
+                if single is not None:
+                    stack.append((single, depth + 1))
+        return False
+
+    def filters(self):
+        out = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            out.extend(node.values)
+            stack.extend(node.children.values())
+        return out
+
+
+def covering_filters(filters):
+    """
+    Tập filter tối thiểu cần SUBSCRIBE: bỏ các filter đã bị filter khác bao trùm.
+    """
+    trie = TopicTrie()
+    for f in filters:
+        trie.add(f, None)
+    return sorted(f for f in trie.filters() if not trie.is_covered(f))
+
+
+def batched(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -15,6 +15,96 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     
+    # Token các tiến trình collector dùng để kết nối namespace /collector của SocketIO
+    COLLECTOR_TOKEN = os.environ.get('COLLECTOR_TOKEN') or 'ban-can-thay-doi-token-collector'
+
     # Tắt tính năng theo dõi sửa đổi của SQLAlchemy để tiết kiệm tài nguyên
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- BUS SỰ KIỆN COLLECTOR -> WEB SERVER ---
+    # unix:///đường/dẫn.sock (Linux/macOS), redis://host:6379/0, hoặc http://... (SocketIO, cách cũ).
+    # Windows không có Unix datagram socket nên mặc định dùng SocketIO.
+    EVENT_BUS_URL = os.environ.get('EVENT_BUS_URL') or (
+        'unix:///tmp/sensor-monitor-bus.sock' if os.name == 'posix' else 'http://127.0.0.1:1404')
+    # Số sự kiện tối đa collector giữ lại khi Web Server chưa nhận được
+    EVENT_BUS_BUFFER = 10000
+    # Bus riêng collector -> dịch vụ email (reportByEmail.py): báo cảnh báo mới ngay sau khi ghi DB.
+    # Bỏ trống (Windows) thì dịch vụ email chỉ quét DB định kỳ.
+    NOTIFIER_BUS_URL = os.environ.get('NOTIFIER_BUS_URL') or (
+        'unix:///tmp/sensor-monitor-notify.sock' if os.name == 'posix' else None)
+    # Chu kỳ quét DB dự phòng tìm cảnh báo chưa gửi (bỏ lỡ sự kiện, gửi lỗi cần thử lại)
+    NOTIFIER_SWEEP_SECONDS = 60
+    # Message queue của Flask-SocketIO (VD: redis://localhost:6379/0) khi chạy nhiều tiến trình Web
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+    # --- CẬP NHẬT REALTIME (SOCKETIO) ---
+    # Số lần tối đa gửi 'update_monitor' mỗi giây cho một room (user)
+    LIVE_UPDATE_HZ = 1.0
+    # Ghi đè tần suất cho từng user: {user_id: hz}
+    LIVE_UPDATE_HZ_PER_USER = {}
+    # Chu kỳ gửi lại frame đầy đủ thay vì delta (giây)
+    LIVE_KEYFRAME_SECONDS = 30.0
+
+    # --- API DỮ LIỆU THEO DÕI ---
+    # Số dòng tối đa mỗi trang của /api/v1/monitor/<user_id>/data
+    MONITOR_API_MAX_PAGE_SIZE = 1000
+    # Chỉ nén gzip (định dạng columnar/f32) khi payload lớn hơn ngưỡng này
+    MONITOR_API_GZIP_MIN_BYTES = 1024
+
+    # --- CACHE USER / CẤU HÌNH CẢM BIẾN (load_user, trang theo dõi) ---
+    # Thời gian sống (giây) và số user tối đa trong cache; 0 = tắt cache.
+    # Tạo/sửa/xóa user xóa cache ngay trong tiến trình đó, tiến trình Web khác thấy sau TTL.
+    MODEL_CACHE_TTL = 60
+    MODEL_CACHE_SIZE = 1024
+
+    # --- BỘ ĐỆM DỮ LIỆU GẦN NHẤT (trang theo dõi, API trang đầu) ---
+    # Số mẫu giữ trong RAM cho mỗi (user, cảm biến); 0 = tắt, luôn đọc DB
+    READING_BUFFER_CAPACITY = 512
+    # Giới hạn bộ nhớ của bộ đệm; vượt thì bỏ user lâu không được xem
+    READING_BUFFER_MAX_BYTES = 64 * 1024 * 1024
+    # Chờ luồng ghi của collector commit xong (> INGEST_FLUSH_INTERVAL) rồi mới nạp phần cũ từ DB
+    READING_BUFFER_SETTLE_SECONDS = 2.0
+    # Cửa sổ phát lại sự kiện realtime cho trình duyệt kết nối lại: số sự kiện
+    # giữ mỗi user (0 = tắt, chỉ vào lại room) và số user tối đa
+    REPLAY_WINDOW_EVENTS = 600
+    REPLAY_WINDOW_USERS = 1000
+
+    # --- CÁCH LƯU DỮ LIỆU THÔ ---
+    # 'rows': một dòng DataReadings mỗi cảm biến (mặc định); 'frames': một dòng
+    # DataFrames mỗi frame (BLOB các thanh ghi), Web/rollup đọc từ data_frames;
+    # 'both': collector ghi cả hai (giai đoạn chuyển đổi, Web vẫn đọc data_readings).
+    # Chuyển dữ liệu cũ: flask migrate-frames
+    READINGS_STORAGE = os.environ.get('READINGS_STORAGE') or 'rows'
+    # Thư mục chứa file phân vùng dữ liệu thô (readings_YYYY_MM.db, mỗi file
+    # READINGS_PARTITION_MONTHS tháng), tách khỏi app.db: collector ghi không
+    # tranh khóa với admin, hết hạn = xóa file. None = tắt (dữ liệu thô trong app.db).
+    # Chuyển dữ liệu cũ: flask partition-readings
+    READINGS_PARTITION_DIR = os.environ.get('READINGS_PARTITION_DIR')
+    READINGS_PARTITION_MONTHS = 1
+    # Số phân vùng ATTACH tối đa mỗi kết nối (SQLite giới hạn 10)
+    READINGS_PARTITION_MAX_ATTACHED = 8
+
+    # --- SPOOL CỦA COLLECTOR ---
+    # Thư mục spool trên đĩa cục bộ (mỗi collector/worker một thư mục con):
+    # bản tin được ghi vào spool trước, luồng ghi phát lại vào DB theo offset
+    # đã commit -> DB bận/mất hay collector bị kill không làm mất dữ liệu.
+    # None = tắt (hàng đợi trong RAM, lô ghi lỗi bị bỏ).
+    COLLECTOR_SPOOL_DIR = os.environ.get('COLLECTOR_SPOOL_DIR')
+    COLLECTOR_SPOOL_SEGMENT_MB = 64
+    # Dung lượng tồn đọng tối đa (chưa ghi DB); vượt thì bỏ bản tin mới
+    COLLECTOR_SPOOL_MAX_MB = 2048
+
+    # --- TỔNG HỢP DỮ LIỆU (ROLLUP) ---
+    # Số điểm tối đa mỗi cảm biến khi tự chọn độ phân giải cho biểu đồ
+    ROLLUP_MAX_POINTS = 1000
+    # Khoảng thời gian tối đa (giây) khi biểu đồ yêu cầu thẳng dữ liệu thô (resolution=raw)
+    ROLLUP_RAW_MAX_SECONDS = 3600
+    # Kích thước cửa sổ xử lý mỗi lần (giây), tránh ngốn RAM khi tồn đọng lớn
+    ROLLUP_WINDOW_SECONDS = 6 * 3600
+    # Thời gian giữ dữ liệu theo từng độ phân giải (ngày), None = giữ mãi
+    ROLLUP_RETENTION_DAYS = {
+        'raw': 7,
+        '1m': 30,
+        '1h': 365,
+        '1d': None,
+    }
@@ -1,133 +1,140 @@
-import socket
-import sqlite3
+import asyncio
+import errno
 import os
 import time
 from datetime import datetime
-import socketio # Thư viện client
+from collector.modbus import decode_registers, FrameScanner
+from collector.sqlite_store import SQLiteStore
+from collector.spool import SegmentSpool
+from config import Config
 
 # --- CẤU HÌNH ---
 HOST = "0.0.0.0"
 PORT = 8899
 DB_PATH = r"E:\TIEN_TT\web-python\app.db"
-WEB_SERVER_URL = 'http://127.0.0.1:5000' # Địa chỉ Web Flask
+# Frame của gateway chỉ có IP, không gắn với user nào: không gửi realtime lên Web
+# (Web chỉ phát sensor_data_update tới room của user_id).
 
-# --- KHỞI TẠO SOCKETIO CLIENT ---
-# logger=True để hiện log chi tiết khi debug
-sio = socketio.Client(logger=False, engineio_logger=False)
+# Đóng kết nối gateway nếu không nhận được dữ liệu trong IDLE_TIMEOUT giây
+IDLE_TIMEOUT = 120
+# Hàng đợi chung giữa các kết nối và task ghi DB
+WRITE_QUEUE_SIZE = 20000
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 0.5
+# Luồng commit nền của SQLiteStore: commit mỗi N dòng hoặc mỗi T mili-giây
+DB_COMMIT_ROWS = 1000
+DB_COMMIT_MS = 500
+# Spool trên đĩa (ghi trước, phát lại vào DB theo offset đã commit); None = tắt
+SPOOL_DIR = os.path.join(Config.COLLECTOR_SPOOL_DIR, "iot") if Config.COLLECTOR_SPOOL_DIR else None
 
-def connect_to_web_server():
-    """Thử kết nối đến Web Server"""
-    if not sio.connected:
-        try:
-            # Thêm transports và wait_timeout để kết nối ổn định hơn
-            sio.connect(WEB_SERVER_URL, transports=['websocket', 'polling'], wait_timeout=5)
-            print(f"✅ [SIO] Đã kết nối thành công tới {WEB_SERVER_URL}")
-        except Exception as e:
-            # Chỉ in lỗi ngắn gọn để không làm rối màn hình
-            print(f"⚠️ [SIO] Chưa kết nối được Web Server (Sẽ thử lại khi có dữ liệu)...")
-
-# --- HÀM LƯU DATABASE & GỬI SOCKET ---
-def save_to_database(ip_address, temp, hum):
-    try:
-        # 1. Lưu vào Database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        current_time = datetime.now()
-        
-        sql = "INSERT INTO sensor_data (tem, hum, time, ip_address) VALUES (?, ?, ?, ?)"
-        cursor.execute(sql, (temp, hum, current_time, ip_address))
-        conn.commit()
-        print(f"[DB] ✅ Saved: IP={ip_address} | T={temp} | H={hum}")
-        conn.close()
-
-        # 2. Gửi tín hiệu lên Web qua SocketIO
-        # Nếu chưa kết nối thì thử kết nối lại
-        if not sio.connected:
-            connect_to_web_server()
-            
-        if sio.connected:
-            data_payload = {
-                'ip': ip_address,
-                'tem': temp,
-                'hum': hum,
-                'time': current_time.strftime('%d/%m/%Y %H:%M:%S') # Format đẹp cho Web
-            }
-            sio.emit('sensor_data_update', data_payload)
-            print(f"[SIO] 📡 Đã gửi dữ liệu lên Web")
-
-    except sqlite3.Error as e:
-        print(f"[DB] ❌ Error: {e}")
-    except Exception as e:
-        print(f"[SIO] ❌ Lỗi gửi socket: {e}")
+INSERT_SQL = "INSERT INTO sensor_data (tem, hum, time, ip_address) VALUES (?, ?, ?, ?)"
 
 # --- CÁC HÀM XỬ LÝ MODBUS ---
-def crc_ok(data: bytes):
-    if len(data) < 4: return False
-    crc_calc = 0xFFFF
-    for pos in data[:-2]:
-        crc_calc ^= pos
-        for _ in range(8):
-            if (crc_calc & 0x0001) != 0:
-                crc_calc >>= 1
-                crc_calc ^= 0xA001
-            else:
-                crc_calc >>= 1
-    crc_recv = data[-2] | (data[-1] << 8)
-    return crc_calc == crc_recv
-
 def decode_modbus(data: bytes):
     if len(data) < 9: return None
-    temp_raw = int.from_bytes(data[3:5], byteorder='big', signed=False)
-    hum_raw = int.from_bytes(data[5:7], byteorder='big', signed=False)
+    temp_raw, hum_raw = decode_registers(data, 2)
     return temp_raw / 10.0, hum_raw / 10.0
 
+# --- TASK GHI DB DÙNG CHUNG ---
+async def db_writer(write_queue, store):
+    """
+    Task duy nhất nhận frame từ mọi kết nối: gom thành lô (đủ WRITE_BATCH_SIZE
+    hoặc sau WRITE_FLUSH_INTERVAL giây) rồi chuyển cho SQLiteStore (không chặn,
+    luồng nền của store tự commit).
+    """
+    while True:
+        rows = [await write_queue.get()]
+        deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+        while len(rows) < WRITE_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0: break
+            try:
+                rows.append(await asyncio.wait_for(write_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        store.add_many(rows)
+        for _ in rows: write_queue.task_done()
+
+# --- XỬ LÝ TỪNG GATEWAY ---
+async def handle_gateway(reader, writer, write_queue):
+    peer = writer.get_extra_info('peername')
+    client_ip = peer[0] if peer else "unknown"
+    print(f"🔌 Connected: {client_ip}")
+    # Mỗi kết nối có trạng thái tách frame riêng
+    scanner = FrameScanner(frame_len=9)
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(reader.read(4096), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"⏱️ {client_ip} không gửi dữ liệu sau {IDLE_TIMEOUT}s, đóng kết nối.")
+                break
+            if not chunk: break
+            for frame in scanner.feed(chunk):
+                result = decode_modbus(frame)
+                if result:
+                    # Hàng đợi đầy -> await sẽ tạm dừng đọc socket (TCP backpressure)
+                    await write_queue.put((*result, datetime.now(), client_ip))
+    except (ConnectionError, OSError) as e:
+        print(f"Error {client_ip}: {e}")
+    finally:
+        writer.close()
+        try: await writer.wait_closed()
+        except Exception: pass
+        print(f"🔌 Disconnected: {client_ip} ({scanner.frames} frames)")
+
+async def run_collector(host=HOST, port=PORT, db_path=DB_PATH, started=None, spool_dir=SPOOL_DIR):
+    write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    spool = None
+    if spool_dir:
+        spool = SegmentSpool(spool_dir, segment_bytes=Config.COLLECTOR_SPOOL_SEGMENT_MB * 2**20,
+                             max_bytes=Config.COLLECTOR_SPOOL_MAX_MB * 2**20)
+    store = SQLiteStore(db_path, INSERT_SQL, commit_rows=DB_COMMIT_ROWS, commit_ms=DB_COMMIT_MS, spool=spool)
+    writer_task = asyncio.create_task(db_writer(write_queue, store))
+
+    server = await asyncio.start_server(
+        lambda r, w: handle_gateway(r, w, write_queue),
+        host, port, reuse_address=True, backlog=1024
+    )
+    print(f"🚀 Collector đang lắng nghe tại {host}:{port}")
+    if started is not None: started.set()
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Ghi nốt các frame còn trong hàng đợi trước khi thoát; task ghi DB đã
+        # dừng (lỗi) thì không còn ai lấy hàng đợi nên không chờ join() mãi
+        if not writer_task.done():
+            drained = asyncio.ensure_future(write_queue.join())
+            await asyncio.wait({drained, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+            drained.cancel()
+        if writer_task.done() and not writer_task.cancelled() and writer_task.exception():
+            print(f"[DB] ❌ Task ghi DB đã dừng vì lỗi: {writer_task.exception()!r} "
+                  f"({write_queue.qsize()} frame chưa ghi)")
+        writer_task.cancel()
+        await asyncio.to_thread(store.close)
+        print(f"[DB] ✅ {store.stats()}")
+        if spool is not None: spool.close()
+
 # --- MAIN ---
 def main():
     if not os.path.exists(DB_PATH):
         print(f"⚠️ Không tìm thấy DB tại: {DB_PATH}")
         return
 
-    # Kết nối Web Server lần đầu
     print("--- BẮT ĐẦU COLLECTOR ---")
-    connect_to_web_server()
 
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
     try:
-        server.bind((HOST, PORT))
-    except OSError:
+        asyncio.run(run_collector())
+    except OSError as e:
+        # Windows báo WSAEADDRINUSE thay vì EADDRINUSE
+        if e.errno not in (errno.EADDRINUSE, getattr(errno, 'WSAEADDRINUSE', None)):
+            raise
         print(f"❌ Cổng {PORT} đang bận. Hãy tắt chương trình cũ.")
-        return
-
-    server.listen(1)
-    print(f"🚀 Collector đang lắng nghe tại {HOST}:{PORT}")
-
-    while True:
-        print("Waiting for module...")
-        try:
-            conn, addr = server.accept()
-            client_ip = addr[0]
-            print(f"🔌 Connected: {client_ip}")
-            buffer = b""
-            
-            while True:
-                chunk = conn.recv(1024)
-                if not chunk: break
-                buffer += chunk
-                while len(buffer) >= 9:
-                    if crc_ok(buffer[:9]):
-                        result = decode_modbus(buffer[:9])
-                        if result:
-                            save_to_database(client_ip, *result)
-                        buffer = buffer[9:]
-                    else:
-                        buffer = buffer[1:]
-        except Exception as e:
-            print(f"Error: {e}")
-        finally:
-            try: conn.close()
-            except: pass
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,22 +1,33 @@
 import time
 import sys
+import os
+import uuid
+import signal
+import argparse
+import threading
 import paho.mqtt.client as mqtt
-import json
+from sqlalchemy import event
 from datetime import datetime
-import socketio
 
 # ============================
 # 1. LOAD FLASK + DATABASE
 # ============================
 from app import create_app, db
-from app.models.user_model import Users
-from app.models.sensor_model import DataReadings, SensorConfig
+from app.models.sensor_model import DataReadings, DataFrames
 from app.models.alert_model import AlertEvent # <--- Import Model Cảnh báo
-
-app = create_app()
-app.app_context().push()
-
-print("✅ Flask app & DB context loaded")
+from collector.ingest_writer import IngestWriter
+from collector.spool import SegmentSpool
+from collector.modbus import parse_read_response
+from collector.alert_engine import AlertEngine
+from collector.alert_episodes import EpisodeTracker
+from collector.event_bus import create_bus
+from collector.live_sequence import LiveSequencer
+from collector.sharding import HashRing, shared_filter
+from collector.supervisor import Supervisor
+from app.services.topic_routes import TopicRouter
+from app.services.frame_store import frame_row, STORAGE_MODES
+from app.services.partitions import reading_partitions
+from collector.topic_trie import batched
 
 # ============================
 # 2. CẤU HÌNH
@@ -24,53 +35,205 @@ print("✅ Flask app & DB context loaded")
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_KEEPALIVE = 60
-WEB_SERVER_URL = "http://127.0.0.1:1404" 
+# Chu kỳ kiểm tra version cấu hình (topic/ngưỡng) do user_controller cập nhật
+CONFIG_POLL_SECONDS = 2.0
+# Số filter tối đa trong một gói SUBSCRIBE/UNSUBSCRIBE
+MQTT_SUBSCRIBE_BATCH = 100
 
-# ============================
-# 3. KẾT NỐI SOCKETIO VỚI WEB SERVER
-# ============================
-sio = socketio.Client(logger=False, engineio_logger=False)
+# Ghi DB theo lô: flush khi đủ INGEST_BATCH_SIZE dòng hoặc sau INGEST_FLUSH_INTERVAL giây
+INGEST_BATCH_SIZE = 500
+INGEST_FLUSH_INTERVAL = 0.5
+INGEST_MAX_QUEUE = 10000
 
-def connect_socketio():
-    try:
-        if not sio.connected:
-            sio.connect(WEB_SERVER_URL, transports=['websocket', 'polling'], wait_timeout=10)
-            print(f"✅ [SocketIO] Đã kết nối tới Web Server: {WEB_SERVER_URL}")
-    except Exception as e:
-        # In lỗi gọn hơn
-        # print(f"⚠️ [SocketIO] Chưa kết nối được Web Server ({WEB_SERVER_URL}). Lỗi: {e}")
-        pass
+# Chế độ nhiều tiến trình (--workers N):
+#   hash : mỗi worker chỉ nhận các sub_topic mà consistent hash gán cho nó
+#   share: mọi worker subscribe $share/<nhóm>/<filter> (MQTT v5), broker chia tải
+#          (mẫu của một cảm biến có thể tới các worker khác nhau nên trạng thái
+#          hysteresis/debounce/đợt cảnh báo chỉ chính xác ở chế độ hash)
+SHARD_MODES = ('hash', 'share')
+SHARE_GROUP = "sensor-collector"
+# Chu kỳ worker gửi số liệu về supervisor (giây)
+WORKER_STATS_INTERVAL = 5.0
+# Nhiều worker cùng ghi một file SQLite: chờ khóa ghi thay vì lỗi "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = 30000
 
-# Kết nối lần đầu
-connect_socketio()
+# Trạng thái của tiến trình hiện tại, khởi tạo trong init_worker()
+app = None
+ingest_writer = None
+event_bus = None
+# Bus riêng tới dịch vụ email (reportByEmail.py), None nếu không cấu hình
+notify_bus = None
+router = None
+# Ghi dữ liệu thô dạng dòng / frame (READINGS_STORAGE trong config.py)
+store_rows = True
+store_frames = False
+# Trạng thái hysteresis/debounce/tốc độ của từng user (chỉ luồng paho dùng)
+alert_engine = AlertEngine()
+# Đợt cảnh báo đang mở: chỉ ghi DB/phát realtime khi mở và khi đóng đợt
+episode_tracker = EpisodeTracker()
+# Số thứ tự theo user của sự kiện realtime (trình duyệt kết nối lại chỉ lấy phần bị lỡ)
+live_sequencer = LiveSequencer()
+worker_id = 0
+share_group = None
+# In chi tiết từng message (tắt khi chạy tải cao: --quiet)
+VERBOSE = True
+# Bộ đếm của worker (chỉ luồng paho ghi, luồng báo cáo chỉ đọc)
+counters = {'messages': 0, 'matched': 0, 'unmatched': 0, 'invalid': 0, 'errors': 0, 'handle_ms_max': 0.0}
 
-# ============================
-# 4. LOAD USER TOPICS & CONFIGS
-# ============================
-def load_user_topics():
+def init_worker(owns=None):
+    """
+    Khởi tạo Flask app, luồng ghi DB, bus sự kiện và bảng định tuyến cho
+    tiến trình hiện tại. Mỗi worker có IngestWriter riêng.
+    """
+    global app, ingest_writer, event_bus, notify_bus, router, store_rows, store_frames
+
+    app = create_app()
+    app.app_context().push()
+    print("✅ Flask app & DB context loaded")
+
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', _sqlite_pragmas)
+
+    storage = app.config['READINGS_STORAGE']
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"READINGS_STORAGE không hợp lệ: {storage}")
+    store_rows = storage in ('rows', 'both')
+    store_frames = storage in ('frames', 'both')
+    print(f"✅ Lưu dữ liệu thô dạng: {storage}")
+    if reading_partitions.enabled:
+        print(f"✅ Phân vùng dữ liệu thô: {reading_partitions.directory} ({reading_partitions.months} tháng/file)")
+
+    # ============================
+    # 2b. LUỒNG GHI DATABASE (WRITE-BEHIND)
+    # ============================
+    spool = None
+    if app.config['COLLECTOR_SPOOL_DIR']:
+        spool = SegmentSpool(os.path.join(app.config['COLLECTOR_SPOOL_DIR'], f"mqtt-{worker_id}"),
+                             segment_bytes=app.config['COLLECTOR_SPOOL_SEGMENT_MB'] * 2**20,
+                             max_bytes=app.config['COLLECTOR_SPOOL_MAX_MB'] * 2**20)
+        print(f"✅ Spool ghi DB: {spool.directory} ({spool.stats()})")
+    ingest_writer = IngestWriter(
+        db.engine,
+        DataReadings.__table__,
+        AlertEvent.__table__,
+        batch_size=INGEST_BATCH_SIZE,
+        flush_interval=INGEST_FLUSH_INTERVAL,
+        max_queue=INGEST_MAX_QUEUE,
+        on_commit=notify_committed_alerts,
+        frames_table=DataFrames.__table__,
+        partitions=reading_partitions if reading_partitions.enabled else None,
+        spool=spool,
+    ).start()
+
+    # ============================
+    # 3. BUS SỰ KIỆN TỚI WEB SERVER
+    # ============================
+    # publish() không chặn: nếu Web Server chậm/khởi động lại, sự kiện nằm trong
+    # buffer có giới hạn và được gửi lại sau, on_message không bao giờ phải chờ.
+    event_bus = create_bus(app.config['EVENT_BUS_URL'],
+                           token=app.config['COLLECTOR_TOKEN'],
+                           max_buffer=app.config['EVENT_BUS_BUFFER'])
+    print(f"✅ [Bus] Gửi sự kiện tới Web Server qua {app.config['EVENT_BUS_URL']}")
+    if app.config.get('NOTIFIER_BUS_URL'):
+        notify_bus = create_bus(app.config['NOTIFIER_BUS_URL'],
+                                token=app.config['COLLECTOR_TOKEN'],
+                                max_buffer=app.config['EVENT_BUS_BUFFER'])
+        print(f"✅ [Bus] Báo cảnh báo mới cho dịch vụ email qua {app.config['NOTIFIER_BUS_URL']}")
+
+    # ============================
+    # 4. BẢNG ĐỊNH TUYẾN TOPIC -> USER & NGƯỠNG
+    # ============================
+    router = TopicRouter(owns=owns)
+    reload_routes(force=True)
+    log_routes(router.snapshot)
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.close()
+
+def shutdown_worker():
+    """Ghi nốt hàng đợi DB, msync/đóng spool và gửi nốt sự kiện còn trong buffer."""
+    if ingest_writer is not None:
+        stopped = ingest_writer.close()
+        spool = ingest_writer.spool
+        if spool is not None:
+            # Luồng ghi chưa dừng (hết timeout) vẫn đọc segment: chỉ msync, không unmap
+            if stopped: spool.close()
+            else: spool.sync()
+    if event_bus is not None: event_bus.close()
+    if notify_bus is not None: notify_bus.close()
+
+def worker_stats():
+    s = ingest_writer.stats()
+    return dict(counters,
+                pid=os.getpid(),
+                time=time.time(),
+                routes=len(router.snapshot.routes),
+                subscriptions=len(router.snapshot.subscriptions()),
+                queue_depth=s['queue_depth'],
+                rows_written=s['rows_written'],
+                dropped=s['dropped'],
+                last_lag_ms=s['last_lag_ms'],
+                max_lag_ms=s['max_lag_ms'],
+                bus_buffered=event_bus.stats()['buffered'])
+
+def report_stats(stats_queue, interval=WORKER_STATS_INTERVAL):
+    """Luồng nền của worker: gửi số liệu về supervisor định kỳ."""
+    while True:
+        time.sleep(interval)
+        try:
+            stats_queue.put((worker_id, worker_stats()))
+        except Exception:
+            return
+
+def log_routes(snapshot):
+    for topic, route in snapshot.routes.items():
+        print(f"👤 User {route.username} | Topic: {topic} | Sensors: {route.sensor_count}")
+    print(f"📋 {len(snapshot.routes)} topic -> {len(snapshot.subscriptions())} filter cần subscribe")
+
+def to_subscription(topic_filter):
+    return shared_filter(share_group, topic_filter) if share_group else topic_filter
+
+def subscribe_filters(client, filters):
+    """SUBSCRIBE theo lô MQTT_SUBSCRIBE_BATCH filter mỗi gói thay vì từng topic."""
+    for batch in batched(sorted(filters), MQTT_SUBSCRIBE_BATCH):
+        client.subscribe([(to_subscription(topic_filter), 0) for topic_filter in batch])
+    for topic_filter in sorted(filters): print(f"📡 Subscribed: {to_subscription(topic_filter)}")
+
+def unsubscribe_filters(client, filters):
+    for batch in batched(sorted(filters), MQTT_SUBSCRIBE_BATCH):
+        client.unsubscribe([to_subscription(topic_filter) for topic_filter in batch])
+    for topic_filter in sorted(filters): print(f"🔕 Unsubscribed: {to_subscription(topic_filter)}")
+
+def reload_routes(client=None, force=False):
+    """
+    Nạp lại bảng định tuyến nếu version cấu hình đổi, rồi subscribe/unsubscribe
+    các topic mới/bị bỏ ngay trên kết nối hiện tại (không cần reconnect).
+    """
     try:
-        users = Users.query.filter(Users.sub_topic.isnot(None)).all()
-        topic_map = {}
-        for user in users:
-            if not user.sub_topic or user.sensor_count <= 0: continue
-
-            # Lấy cấu hình chi tiết để check Min/Max
-            configs = SensorConfig.query.filter_by(user_id=user.id_user).all()
-            config_map = {c.sensor_index: c for c in configs}
-
-            topic_map[user.sub_topic] = {
-                "user_id": user.id_user,
-                "username": user.username,
-                "sensor_count": user.sensor_count,
-                "configs": config_map
-            }
-            print(f"👤 User {user.username} | Topic: {user.sub_topic} | Sensors: {user.sensor_count}")
-        return topic_map
+        diff = router.refresh(force=force)
     except Exception as e:
+        db.session.rollback()
         print(f"❌ Lỗi DB: {e}")
-        return {}
+        return
+    if diff is None: return
 
-TOPIC_USER_MAP = load_user_topics()
+    added, removed = diff
+    print(f"🔄 Cấu hình version {router.snapshot.version}: +{len(added)} / -{len(removed)} filter")
+    if client is None or not client.is_connected(): return
+    # Subscribe filter mới trước rồi mới bỏ filter cũ để không lỡ message ở giữa
+    if added: subscribe_filters(client, added)
+    if removed: unsubscribe_filters(client, removed)
+
+def watch_config(client):
+    """Luồng nền: so version cấu hình định kỳ và áp dụng thay đổi ngay."""
+    while True:
+        time.sleep(CONFIG_POLL_SECONDS)
+        with app.app_context():
+            reload_routes(client)
+            db.session.remove()
 
 # ============================
 # 5. MQTT CALLBACKS
@@ -78,147 +241,324 @@ TOPIC_USER_MAP = load_user_topics()
 def on_connect(client, userdata, flags, reason_code, properties=None):
     if reason_code == 0:
         print("✅ [MQTT] Kết nối thành công tới Broker")
-        global TOPIC_USER_MAP
-        TOPIC_USER_MAP = load_user_topics() 
-        if TOPIC_USER_MAP:
-            for topic in TOPIC_USER_MAP.keys():
-                client.subscribe(topic)
-                print(f"📡 Subscribed: {topic}")
+        reload_routes()
+        filters = router.snapshot.subscriptions()
+        if filters:
+            subscribe_filters(client, filters)
     else:
         print(f"❌ MQTT connect failed: {reason_code}")
 
 def on_message(client, userdata, msg):
+    started = time.perf_counter()
+    counters['messages'] += 1
     try:
         topic = msg.topic
         payload_raw = msg.payload
-        hex_string = payload_raw.hex().upper()
 
-        if topic not in TOPIC_USER_MAP: return
+        # Topic cụ thể có thể khớp nhiều filter (chính xác + '+'/'#') của nhiều user
+        routes = router.snapshot.match(topic)
+        if not routes:
+            counters['unmatched'] += 1
+            return
+
+        # Giải mã MỘT lần trực tiếp trên bytes (slave 1, function 0x03) và kiểm tra CRC
+        registers = parse_read_response(payload_raw, slave=1)
+        if registers is None:
+            counters['invalid'] += 1
+            return
 
-        user_info = TOPIC_USER_MAP[topic]
-        user_id = user_info["user_id"]
-        sensor_count = user_info["sensor_count"]
-        configs = user_info["configs"]
+        counters['matched'] += 1
+        if VERBOSE: print("MSG ..........")
+        current_time = datetime.now()
+        for route in routes:
+            if len(registers) >= route.sensor_count:
+                process_route(route, topic, payload_raw, registers, current_time)
 
-        if not hex_string.startswith("0103"): return
+    except Exception as e:
+        counters['errors'] += 1
+        print(f"❌ Lỗi xử lý: {e}")
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms > counters['handle_ms_max']:
+            counters['handle_ms_max'] = round(elapsed_ms, 2)
 
-        try:
-            byte_count = int(hex_string[4:6], 16)
-        except: return
 
-        if byte_count < sensor_count * 2: return
+def process_route(route, topic, payload_raw, registers, current_time):
+    """Lưu, kiểm tra ngưỡng và phát realtime cho một user nhận message này."""
+    user_id = route.user_id
+    sensor_count = route.sensor_count
+    configs = route.configs
 
-        print("MSG ..........")
-        
-        data_start_idx = 6
-        readings_list = []
-        current_time = datetime.now()
+    # Đánh giá ngưỡng cho cả frame trong một lượt vector hóa
+    values = [raw_val / 10.0 for raw_val in registers[:sensor_count]]
+    _, alert_sensors, alert_kinds, alert_rates = alert_engine.evaluate(
+        user_id, route.rules, values, current_time.timestamp())
+    alerts = {
+        int(s) + 1: (int(k), route.rules.message(int(k), int(s), float(r)))
+        for s, k, r in zip(alert_sensors, alert_kinds, alert_rates)
+    }
+
+    readings_list = []
+    reading_rows = []
 
-        for i in range(sensor_count):
-            segment = hex_string[data_start_idx + i*4 : data_start_idx + (i+1)*4]
-            if len(segment) < 4: break
-            
-            raw_val = int(segment, 16)
-            real_val = raw_val / 10.0 
-            sensor_idx = i + 1
-            
-            # Lấy tên cảm biến
+    for i in range(sensor_count):
+        real_val = values[i]
+        sensor_idx = i + 1
+        
+        # In log chi tiết
+        if VERBOSE:
             config = configs.get(sensor_idx)
             sensor_name = config.name if config else f"Sensor {sensor_idx}"
-            
-            # In log chi tiết
-            print(f" {user_info['username']}|{topic} | {sensor_name} | {real_val}")
-
-            # 1. Lưu DataReadings (Lịch sử)
-            new_reading = DataReadings(
-                user_id=user_id,
-                sensor_index=sensor_idx,
-                value=real_val,
-                timestamp=current_time
-            )
-            db.session.add(new_reading)
-            
-            # 2. Kiểm tra Cảnh báo & Lưu AlertEvent
-            if config:
-                alert_msg = None
-                if config.min_val is not None and real_val < config.min_val:
-                    alert_msg = f"Thấp hơn Min ({config.min_val})"
-                elif config.max_val is not None and real_val > config.max_val:
-                    alert_msg = f"Cao hơn Max ({config.max_val})"
-                
-                if alert_msg:
-                    print(f"   ⚠️ ALERT: {sensor_name} - {alert_msg}")
-                    
-                    # Lưu vào DB
-                    new_alert = AlertEvent(
-                        user_id=user_id,
-                        sensor_index=sensor_idx,
-                        value=real_val,
-                        created_at=datetime.utcnow(),
-                        sent=False # Chưa gửi email
-                    )
-                    db.session.add(new_alert)
-                    
-                    # Gửi socket alert ngay lập tức (Real-time Alert)
-                    if not sio.connected: connect_socketio()
-                    if sio.connected:
-                        sio.emit('new_alert', {
-                            'user_id': user_id, 
-                            'sensor_index': sensor_idx, 
-                            'value': real_val, 
-                            'msg': alert_msg,
-                            'timestamp': current_time.strftime('%H:%M:%S'), 
-                            'sent': False
-                        })
-
-            # Chuẩn bị dữ liệu gửi realtime
-            readings_list.append({
-                'index': sensor_idx,
-                'value': real_val
-            })
+            print(f" {route.username}|{topic} | {sensor_name} | {real_val}")
 
-        db.session.commit()
-        print(f"💾 Đã lưu {len(readings_list)} giá trị.")
-        print("______________________________________")
-
-        # 3. Gửi SocketIO Update (Dữ liệu thường)
-        if not sio.connected: connect_socketio()
-            
-        if sio.connected:
-            socket_payload = {
+        # 1. Lưu DataReadings (Lịch sử) - ghi theo lô ở luồng ghi riêng
+        if store_rows:
+            reading_rows.append({
                 'user_id': user_id,
-                'topic': topic,
-                'device_id': topic, 
-                'time': current_time.strftime('%d/%m/%Y %H:%M:%S'),
-                'data': readings_list,
-                'raw_hex': hex_string
-            }
-            sio.emit('sensor_data_update', socket_payload)
-        
-        # print("Nghỉ 5 giây\n")
-        # time.sleep(5)
-        
+                'sensor_index': sensor_idx,
+                'value': real_val,
+                'timestamp': current_time
+            })
+
+        # Chuẩn bị dữ liệu gửi realtime
+        readings_list.append({
+            'index': sensor_idx,
+            'value': real_val
+        })
+
+    # 2. Đợt cảnh báo: chỉ mở/đóng đợt mới ghi AlertEvent và phát realtime,
+    #    các mẫu vượt ngưỡng ở giữa chỉ cập nhật đỉnh/số mẫu trong bộ nhớ
+    opened, closed = episode_tracker.update(user_id, values, alerts, current_time)
+    alert_rows = [open_episode(route, episode) for episode in opened]
+    alert_updates = [close_episode(route, episode, recovery, current_time) for episode, recovery in closed]
+
+    # Hoặc cả frame trong một dòng DataFrames (thanh ghi uint16 thô)
+    frame_rows = [frame_row(user_id, current_time, registers=registers[:sensor_count])] if store_frames else ()
+
+    if ingest_writer.submit(reading_rows, alert_rows, alert_updates, frame_rows):
+        if VERBOSE: print(f"💾 Đã đưa {len(readings_list)} giá trị vào hàng đợi ghi.")
+    else:
+        print(f"⚠️ Hàng đợi ghi đầy, bỏ {len(readings_list)} giá trị (backpressure).")
+    if VERBOSE: print("______________________________________")
+
+    # 3. Gửi SocketIO Update (Dữ liệu thường) qua bus
+    socket_payload = {
+        'user_id': user_id,
+        'topic': topic,
+        'device_id': topic, 
+        'time': current_time.strftime('%d/%m/%Y %H:%M:%S'),
+        # Thời điểm chính xác (giống cột timestamp trong DB) cho bộ đệm dữ liệu của Web
+        'ts': current_time.isoformat(),
+        'data': readings_list,
+        'raw_hex': payload_raw.hex().upper()
+    }
+    event_bus.publish('sensor_data_update', live_sequencer.stamp(socket_payload))
+
+
+def sensor_name(route, sensor_idx):
+    config = route.configs.get(sensor_idx)
+    return config.name if config else f"Sensor {sensor_idx}"
+
+def open_episode(route, episode):
+    """Mở đợt cảnh báo: một dòng AlertEvent (chờ gửi email) + sự kiện 'new_alert'."""
+    print(f"   ⚠️ ALERT: {sensor_name(route, episode.sensor_index)} - {episode.message}")
+
+    # Gửi socket alert ngay lập tức (Real-time Alert)
+    event_bus.publish('new_alert', live_sequencer.stamp({
+        'user_id': episode.user_id, 
+        'sensor_index': episode.sensor_index, 
+        'value': episode.open_value, 
+        'msg': episode.message,
+        'timestamp': episode.opened_at.strftime('%H:%M:%S'), 
+        'sent': False,
+        'episode_id': episode.episode_id,
+    }))
+
+    # Lưu vào DB (qua luồng ghi)
+    return {
+        'user_id': episode.user_id,
+        'sensor_index': episode.sensor_index,
+        'value': episode.open_value,
+        'created_at': datetime.utcnow(),
+        'timestamp': episode.opened_at,
+        'sent': False, # Chưa gửi email
+        'episode_id': episode.episode_id,
+        'peak_value': episode.peak_value,
+        'last_value': episode.last_value,
+        'sample_count': episode.count,
+    }
+
+def close_episode(route, episode, recovery, current_time):
+    """Đóng đợt cảnh báo: cập nhật dòng AlertEvent đã mở + sự kiện 'alert_closed'."""
+    print(f"   ✅ RECOVERED: {sensor_name(route, episode.sensor_index)} = {recovery} "
+          f"(đỉnh {episode.peak_value}, {episode.count} mẫu)")
+
+    event_bus.publish('alert_closed', live_sequencer.stamp({
+        'user_id': episode.user_id,
+        'sensor_index': episode.sensor_index,
+        'episode_id': episode.episode_id,
+        'value': recovery,
+        'peak_value': episode.peak_value,
+        'sample_count': episode.count,
+        'timestamp': current_time.strftime('%H:%M:%S'),
+        'duration': round((current_time - episode.opened_at).total_seconds(), 1),
+    }))
+
+    return {
+        '_key': episode.episode_id,
+        'closed_at': current_time,
+        'peak_value': episode.peak_value,
+        'last_value': episode.last_value,
+        'sample_count': episode.count,
+    }
 
+def notify_committed_alerts(_readings, alerts, _updates):
+    """
+    Hook của IngestWriter (luồng ghi, sau commit): báo dịch vụ email từng đợt
+    cảnh báo mới. Gửi sau commit nên dịch vụ email luôn thấy dòng AlertEvent.
+    """
+    if notify_bus is None: return
+    for alert in alerts:
+        notify_bus.publish('alert_committed', {
+            'episode_id': alert['episode_id'],
+            'user_id': alert['user_id'],
+            'sensor_index': alert['sensor_index'],
+            'value': alert['value'],
+            'timestamp': alert['timestamp'].isoformat(),
+        })
+
+def close_orphaned_episodes(user_ids):
+    """
+    Đợt cảnh báo còn mở trong DB từ lần chạy trước (collector bị dừng giữa đợt)
+    không còn trạng thái trong bộ nhớ: đóng lại để giao diện không hiển thị mãi.
+    """
+    if not user_ids: return
+    try:
+        closed = AlertEvent.query.filter(AlertEvent.episode_id.isnot(None),
+                                         AlertEvent.closed_at.is_(None),
+                                         AlertEvent.user_id.in_(user_ids))\
+            .update({AlertEvent.closed_at: datetime.now()}, synchronize_session=False)
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Lỗi xử lý: {e}")
+        print(f"❌ Lỗi DB: {e}")
+        return
+    if closed: print(f"🧹 Đóng {closed} đợt cảnh báo còn mở từ lần chạy trước")
     
 
 # ============================
 # 6. MAIN LOOP
 # ============================
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
+def make_client(client_id, protocol=mqtt.MQTTv311):
+    """paho 2.x bắt buộc chọn callback API; paho 1.x không có tham số này."""
+    api = getattr(mqtt, 'CallbackAPIVersion', None)
+    if api is not None:
+        return mqtt.Client(api.VERSION2, client_id=client_id, protocol=protocol)
+    return mqtt.Client(client_id=client_id, protocol=protocol)
+
+def run_worker(index=0, workers=1, stats_queue=None, mode='hash',
+               broker=MQTT_BROKER, port=MQTT_PORT, group=SHARE_GROUP, quiet=False,
+               stats_interval=WORKER_STATS_INTERVAL):
+    """
+    Một collector hoàn chỉnh (kết nối MQTT + ghi DB riêng). Chạy trực tiếp khi
+    workers == 1, hoặc là target của Supervisor trong tiến trình con.
+    """
+    global worker_id, share_group, VERBOSE
+    worker_id = index
+    VERBOSE = not quiet
+    # SIGTERM từ supervisor -> thoát bình thường để ghi nốt hàng đợi
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    owns = None
+    protocol = mqtt.MQTTv311
+    if workers > 1 and mode == 'hash':
+        owns = HashRing(range(workers)).owner(index)
+    elif workers > 1 and mode == 'share':
+        share_group = group
+        protocol = mqtt.MQTTv5
+        # Một user được nhiều worker phát: không có thứ tự chung
+        live_sequencer.enabled = False
+    init_worker(owns)
+    if share_group is None:
+        close_orphaned_episodes([route.user_id for route in router.snapshot.routes.values()])
+
+    client = make_client(f"sensor-collector-{index}-{uuid.uuid4().hex[:8]}", protocol)
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    threading.Thread(target=watch_config, args=(client,), name="config-watch", daemon=True).start()
+    if stats_queue is not None:
+        threading.Thread(target=report_stats, args=(stats_queue, stats_interval), name="stats-report", daemon=True).start()
 
-print("\n🚀 MQTT COLLECTOR RUNNING...")
-while True:
+    print(f"\n🚀 MQTT COLLECTOR RUNNING... (worker {index + 1}/{workers}, {broker}:{port})")
     try:
-        client.connect(MQTT_BROKER, MQTT_PORT, MQTT_KEEPALIVE)
-        client.loop_forever()
+        while True:
+            try:
+                client.connect(broker, port, MQTT_KEEPALIVE)
+                client.loop_forever()
+            except KeyboardInterrupt:
+                print("\n🛑 Stopped.")
+                return
+            except Exception as e:
+                print(f"⚠️ Mất kết nối: {e}. Thử lại sau 5s...")
+                time.sleep(5)
+    finally:
+        shutdown_worker()
+        if stats_queue is not None:
+            stats_queue.put((worker_id, worker_stats()))
+
+def replay_dead_letters():
+    """
+    Ghi lại các bản tin trong file dead-letter của mọi spool mqtt-* dưới
+    COLLECTOR_SPOOL_DIR (chạy sau khi đã sửa nguyên nhân lỗi).
+    """
+    app = create_app()
+    with app.app_context():
+        root = app.config['COLLECTOR_SPOOL_DIR']
+        if not root or not os.path.isdir(root):
+            print("⚠️ Không có COLLECTOR_SPOOL_DIR, không có gì để phát lại")
+            return
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _sqlite_pragmas)
+        writer = IngestWriter(db.engine, DataReadings.__table__, AlertEvent.__table__,
+                              frames_table=DataFrames.__table__,
+                              partitions=reading_partitions if reading_partitions.enabled else None)
+        for name in sorted(os.listdir(root)):
+            if name.startswith('mqtt-'):
+                written, failed = writer.replay_dead_letter(os.path.join(root, name))
+                if written or failed:
+                    print(f"☠️ [Spool] {name}: ghi lại {written} bản tin, {failed} vẫn lỗi")
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT collector")
+    parser.add_argument('--workers', type=int, default=1, help="số tiến trình worker")
+    parser.add_argument('--mode', choices=SHARD_MODES, default='hash',
+                        help="chia tải theo consistent hash của sub_topic hoặc $share (MQTT v5)")
+    parser.add_argument('--broker', default=MQTT_BROKER)
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    parser.add_argument('--group', default=SHARE_GROUP, help="tên nhóm shared subscription")
+    parser.add_argument('--quiet', action='store_true', help="không in log từng message")
+    parser.add_argument('--replay-dead-letter', action='store_true',
+                        help="ghi lại các bản tin trong file dead-letter của spool rồi thoát")
+    args = parser.parse_args()
+
+    if args.replay_dead_letter:
+        replay_dead_letters()
+        return
+
+    worker_kwargs = dict(mode=args.mode, broker=args.broker, port=args.port,
+                         group=args.group, quiet=args.quiet)
+    if args.workers <= 1:
+        run_worker(**worker_kwargs)
+        return
+
+    print(f"🚀 Supervisor: {args.workers} worker, chế độ {args.mode}")
+    supervisor = Supervisor(run_worker, args.workers, worker_kwargs).start()
+    try:
+        supervisor.run_forever()
     except KeyboardInterrupt:
         print("\n🛑 Stopped.")
-        sys.exit(0)
-    except Exception as e:
-        print(f"⚠️ Mất kết nối: {e}. Thử lại sau 5s...")
-        time.sleep(5)
\ No newline at end of file
+    supervisor.log_stats()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 # File: run.py
+import os
 import socket
 from app import app, socketio
+from app.services.bus_listener import start_bus_listener
 
 def get_ip_address():
     """Lấy địa chỉ IP nội bộ của máy tính"""
@@ -25,5 +27,11 @@ if __name__ == "__main__":
     print(f" * Running on http://{host_ip}:{port}")
     print("="*50 + "\n")
 
+    # Nhận sự kiện từ collector qua bus nội bộ (Unix socket / Redis).
+    # Khi debug, chỉ chạy trong tiến trình con của reloader.
+    debug = True
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_bus_listener(app)
+
     # allow_unsafe_werkzeug=True để tránh lỗi trên môi trường dev
-    socketio.run(app, host='0.0.0.0', port=port, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=port, debug=debug, allow_unsafe_werkzeug=True)
\ No newline at end of file